@@ -3,10 +3,12 @@
 from datetime import datetime
 from typing import Literal
 
+import click
 from flask import Flask, flash, redirect, request, session
 from flask_babel import Babel
 from flask_mail import Mail
 
+from blueprints.api.api import api_bp
 from blueprints.auth.auth import auth_bp
 from blueprints.cat.cat import cat_bp
 from blueprints.guide.guide import guide_bp
@@ -16,7 +18,8 @@ from blueprints.prod.prod import prod_bp
 from blueprints.sch.sch import sch_bp
 from blueprints.sup.sup import sup_bp
 from blueprints.users.users import users_bp
-from helpers import logger
+from database import ProductsImport, close_request_session
+from helpers import logger, password_hasher
 from messages import Message
 
 LANGUAGES = ("ro", "en")
@@ -43,6 +46,9 @@ babel = Babel(app, locale_selector=get_locale)
 mail = Mail(app)
 
 
+app.teardown_appcontext(close_request_session)
+
+
 @app.context_processor
 def inject_now():
     """Function for jinja date time"""
@@ -58,6 +64,7 @@ app.register_blueprint(sup_bp)
 app.register_blueprint(prod_bp)
 app.register_blueprint(guide_bp)
 app.register_blueprint(sch_bp)
+app.register_blueprint(api_bp)
 
 
 @app.route("/language/<language>")
@@ -73,3 +80,35 @@ def set_language(language: str = "en"):
     if request.referrer:
         return redirect(request.referrer)
     return redirect("/")
+
+
+@app.cli.command("password-benchmark")
+@click.option("--samples", default=5, show_default=True,
+              help="Number of hashes and verifications to time.")
+def password_benchmark(samples: int) -> None:
+    """Time password hashing with the configured method and cost."""
+    for _ in range(samples):
+        pwhash = password_hasher.hash("P@ssw0rd")
+        password_hasher.verify(pwhash, "P@ssw0rd")
+    click.echo(f"Method: {password_hasher.hash_prefix}")
+    for operation, timings in password_hasher.metrics().items():
+        click.echo(f"{operation}: {timings['count']} in "
+                   f"{timings['mean_ms']:.1f} ms mean, "
+                   f"{timings['max_ms']:.1f} ms max")
+
+
+@app.cli.command("import-products")
+@click.argument("file", type=click.File(encoding="utf-8-sig"))
+def import_products(file) -> None:
+    """Import products from a CSV file; nothing is imported if any row has
+    errors."""
+    try:
+        products_import = ProductsImport.from_csv(file)
+    except ValueError as error:
+        raise click.ClickException(str(error)) from error
+    for issue in products_import:
+        click.echo(f"{issue.line}: {issue.name}: {issue.message}", err=True)
+    if products_import.failed:
+        raise click.ClickException(
+            str(Message.Product.Import.Failed(products_import.failed)))
+    click.echo(Message.Product.Import.Imported(products_import.inserted))
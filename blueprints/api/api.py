@@ -0,0 +1,196 @@
+"""JSON API blueprint."""
+
+from datetime import date
+from functools import wraps
+from typing import Any
+
+from flask import (Blueprint, Response, current_app, jsonify, make_response,
+                   request, session, url_for)
+from itsdangerous import URLSafeSerializer
+from sqlalchemy import select
+
+from constants import Constant
+from database import (Category, Product, Schedule, Supplier, User,
+                      apply_scans, data_version, dbSession)
+from helpers import logger, password_hasher
+from messages import Message
+
+api_bp = Blueprint(
+    "api",
+    __name__,
+    url_prefix="/api")
+
+
+def _basic_auth_admin() -> bool:
+    """The request has the HTTP basic credentials of an admin."""
+    if not (auth := request.authorization) or auth.type != "basic":
+        return False
+    with dbSession() as db_session:
+        user = db_session.scalar(select(User).filter_by(name=auth.username))
+    if not user or not password_hasher.verify(user.password, auth.password):
+        logger.warning("Bad API credentials for user '%s'", auth.username)
+        return False
+    return (user.admin and not user.reg_req
+            and (user.in_use or user.name == "Admin"))
+
+
+def api_admin_required(f):
+    """Decorate API routes to require an admin logged in or the HTTP basic
+    credentials of an admin."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not session.get("admin") and not _basic_auth_admin():
+            return ({"error": str(Message.UI.Auth.AdminReq())},
+                    401,
+                    {"WWW-Authenticate": 'Basic realm="api"'})
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _data_etag(version: int) -> str:
+    """`ETag` of the data version, signed: only the clients that read the
+    data with valid credentials can send it back."""
+    return URLSafeSerializer(current_app.secret_key,
+                             salt="api-data-version").dumps(version)
+
+
+def api_not_modified(f):
+    """Decorate API read routes to use the signed data version as `ETag`: a
+    request with a matching `If-None-Match` gets a `304` before the
+    credentials check (no password hashing) and without reading the rows."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # read before the rows: a concurrent change gives a stale version
+        # (an extra refresh) instead of a stale page
+        with dbSession() as db_session:
+            version = data_version(db_session)
+        if version is None:
+            return f(*args, **kwargs)
+        etag = _data_etag(version)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        return response
+    return decorated_function
+
+
+# region: inventory scans
+@api_bp.route("/inventory/scans", methods=["POST"])
+@api_admin_required
+def inventory_scans():
+    """Apply a batch of scanned products observations.
+
+    The body is a JSON object with the `observations` list
+    (`{"code": <product code>, "to_order": <true | false>}`) and an optional
+    `complete` flag that ends the inventory check of the scanned products
+    responsibles. The whole batch is saved in one transaction; the response
+    has a result for each observation.
+    """
+    body = request.get_json(silent=True)
+    if (not isinstance(body, dict)
+            or not isinstance(observations := body.get("observations"), list)):
+        logger.warning("Inventory scans error(s)")
+        return {"error": str(Message.UI.Api.Body())}, 400
+    if len(observations) > Constant.Basic.scan_batch_size:
+        logger.warning("Inventory scans error(s)")
+        return ({"error": str(Message.UI.Api.TooMany(
+                    Constant.Basic.scan_batch_size))},
+                413)
+    with dbSession() as db_session:
+        results = apply_scans(db_session, observations,
+                              complete=body.get("complete") is True)
+        db_session.commit()
+    statuses = [result.status for result in results]
+    logger.info("Inventory scans: %d updated, %d errors",
+                statuses.count("updated"), statuses.count("error"))
+    return {"updated": statuses.count("updated"),
+            "unchanged": statuses.count("unchanged"),
+            "errors": statuses.count("error"),
+            "results": [result._asdict() for result in results]}
+# endregion
+
+
+# region: read-only listings
+# resource -> (model, exposed columns, rows criteria)
+PRODUCT_COLUMNS = ("id", "name", "description", "responsible_id",
+                   "category_id", "supplier_id", "meas_unit", "min_stock",
+                   "ord_qty", "to_order", "critical", "in_use")
+API_RESOURCES = {
+    "products": (Product, PRODUCT_COLUMNS, ()),
+    "products-to-order": (Product, PRODUCT_COLUMNS,
+                          (Product.to_order, Product.in_use)),
+    "users": (User,
+              ("id", "name", "admin", "in_use", "done_inv", "req_inv",
+               "reg_req", "sat_group"),
+              (User.name != "Admin",)),
+    "categories": (Category, ("id", "name", "in_use", "details"), ()),
+    "suppliers": (Supplier, ("id", "name", "in_use", "details"), ()),
+    "schedules": (Schedule,
+                  ("id", "name", "type", "elem_id", "next_date",
+                   "update_date", "update_interval"),
+                  ()),
+}
+
+
+def _json_value(value: Any) -> Any:
+    """JSON serializable column value (ISO dates)."""
+    return value.isoformat() if isinstance(value, date) else value
+
+
+@api_bp.route(
+    "/<any(" + ", ".join(map(repr, API_RESOURCES)) + "):resource>")
+@api_not_modified
+@api_admin_required
+def elements(resource):
+    """Read-only listing of `resource` ordered by id.
+
+    Query string: `fields` - comma separated columns (`id` is always
+    included), `limit` - page size, `after` - id of the previous page last
+    element (see the `next` url). The `ETag` is the signed data version
+    (`api_not_modified`).
+    """
+    model, columns, criteria = API_RESOURCES[resource]
+    fields = list(columns)
+    if request.args.get("fields"):
+        fields = list(dict.fromkeys(
+            ["id", *request.args["fields"].split(",")]))
+        if unknown := [field for field in fields if field not in columns]:
+            return {"error": str(Message.UI.Api.Fields(
+                ", ".join(unknown)))}, 400
+    limit = request.args.get("limit", type=int)
+    if "limit" not in request.args:
+        limit = Constant.Basic.api_page_size
+    if limit is None or not 0 < limit <= Constant.Basic.api_max_page_size:
+        return {"error": str(Message.UI.Api.Limit(
+            Constant.Basic.api_max_page_size))}, 400
+    after = request.args.get("after", type=int)
+    if "after" in request.args and after is None:
+        return {"error": str(Message.UI.Api.Cursor())}, 400
+    with dbSession() as db_session:
+        statement = (
+            select(*(getattr(model, field) for field in fields))
+            .filter(*criteria)
+            .order_by(model.id)
+            .limit(limit + 1))
+        if after is not None:
+            statement = statement.filter(model.id > after)
+        rows = db_session.execute(statement).all()
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_url = url_for(".elements",
+                           resource=resource,
+                           **{name: value
+                              for name, value in request.args.items()
+                              if name != "after"},
+                           after=rows[-1].id)
+    return jsonify(
+        data=[{field: _json_value(value)
+               for field, value in zip(fields, row)}
+              for row in rows],
+        next=next_url)
+# endregion
@@ -5,14 +5,13 @@ from flask import (Blueprint, flash, redirect, render_template, request,
 from flask_babel import lazy_gettext
 from flask_wtf import FlaskForm
 from sqlalchemy import select
-from werkzeug.security import check_password_hash
 from wtforms import EmailField, PasswordField, StringField, SubmitField
 from wtforms.validators import (Email, EqualTo, InputRequired, Length,
                                 Optional, Regexp)
 
 from constants import Constant
 from database import User, dbSession
-from helpers import flash_errors, logger, login_required
+from helpers import flash_errors, logger, login_required, password_hasher
 from messages import Message
 
 auth_bp = Blueprint("auth",
@@ -163,6 +162,19 @@ def clear_session():
         session["language"] = language
 
 
+def rehash_password(user_id: int, password: str) -> None:
+    """Store the password hashed with the current method and cost.
+
+    :param user_id: id of the user that just logged in
+    :param password: the verified password
+    """
+    with dbSession() as db_session:
+        user = db_session.get(User, user_id)
+        user.password = password
+        db_session.commit()
+        logger.info("Password rehashed")
+
+
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login():
     """Login user if conditions are met."""
@@ -172,10 +184,12 @@ def login():
         with dbSession() as db_session:
             user = db_session.scalar(
                 select(User).filter_by(name=login_form.name.data))
-        if user and check_password_hash(
+        if user and password_hasher.verify(
                 user.password, login_form.password.data):
             if user.in_use or user.name == "Admin":
                 if not user.reg_req:
+                    if password_hasher.needs_rehash(user.password):
+                        rehash_password(user.id, login_form.password.data)
                     clear_session()
                     session["user_id"] = user.id
                     session["admin"] = user.admin
@@ -258,7 +272,7 @@ def change_password():
         with dbSession() as db_session:
             user = db_session.get(User, session["user_id"])
 
-            if check_password_hash(
+            if password_hasher.verify(
                     user.password, chg_pass_form.old_password.data):
                 chg_pass_form.populate_obj(user)
                 db_session.commit()
@@ -13,7 +13,9 @@ from wtforms import (BooleanField, IntegerField, SelectField, StringField,
 from wtforms.validators import InputRequired, Length
 
 from constants import Constant
-from database import Category, Product, Supplier, User, dbSession
+from database import (Category, Product, Supplier, User, dbSession,
+                      global_stats, load_products_counters, merge_into,
+                      reassign_responsible, reference_choices)
 from helpers import admin_required, flash_errors, logger
 from messages import Message
 
@@ -94,6 +96,19 @@ class ReassignCatForm(FlaskForm):
                 })
 
 
+class MergeCatForm(FlaskForm):
+    """Merge category form."""
+    merge = SubmitField(
+        label=lazy_gettext("Merge"),
+        render_kw={"class": "btn btn-danger"})
+    target_id = SelectField(
+        label=lazy_gettext("Merge into"),
+        coerce=int,
+        render_kw={
+                "class": "form-select",
+                })
+
+
 @cat_bp.route("/categories")
 def categories():
     """All categories page."""
@@ -103,15 +118,10 @@ def categories():
         cats = db_session.scalars(
                 select(Category).
                 order_by(Category.in_use.desc(), func.lower(Category.name)).
-                options(joinedload(Category.products), raiseload("*"))
-                ).unique().all()
-        stats = {
-                "all_categories": db_session.scalar(
-                        select(func.count(Category.id))),
-                "in_use_categories": db_session.scalar(
-                        select(func.count(Category.id))
-                        .filter_by(in_use=True)),
-        }
+                options(raiseload("*"))
+                ).all()
+        load_products_counters(db_session, cats)
+        stats = global_stats(db_session)
     return render_template(
         "cat/categories.html",
         categories=cats,
@@ -209,16 +219,15 @@ def reassign_category(category):
     logger.info("Reassign products category '%s' page", category)
     reassign_cat_form: ReassignCatForm = ReassignCatForm()
 
-    with dbSession() as db_session:
-        users = db_session.execute(
-            select(User.id, User.name)
-            .filter_by(in_use=True, reg_req=False)
-            .order_by(func.lower(User.name))
-            ).all()
     reassign_cat_form.responsible_id.choices = [
         (0, Message.Category.Responsible.Default())]
-    reassign_cat_form.responsible_id.choices.extend(
-        [(user.id, user.name) for user in users])
+    reassign_cat_form.responsible_id.choices.extend(reference_choices(User))
+    merge_cat_form: MergeCatForm = MergeCatForm()
+    merge_cat_form.target_id.choices = [
+        (0, Message.Category.Merge.Default())]
+    merge_cat_form.target_id.choices.extend(
+        choice for choice in reference_choices(Category)
+        if choice[1] != category)
 
     if reassign_cat_form.validate_on_submit():
         if reassign_cat_form.responsible_id.data:
@@ -226,16 +235,21 @@ def reassign_category(category):
                 cat = db_session.scalar(
                     select(Category)
                     .filter_by(name=escape(category)))
-                products = db_session.scalars(
-                    select(Product)
-                    .filter_by(category_id=cat.id)
-                    ).all()
-                for product in products:
-                    product.responsible_id = (reassign_cat_form
-                                              .responsible_id.data)
-                db_session.commit()
-                logger.debug("Category '%s' responsible updated", cat.name)
-                flash(**Message.Category.Responsible.Updated.flash(cat.name))
+                if not cat:
+                    flash(**Message.Category.NotExists.flash(category))
+                    return redirect(url_for(".categories"))
+                try:
+                    reassign_responsible(
+                        db_session,
+                        reassign_cat_form.responsible_id.data,
+                        Product.category_id == cat.id)
+                except ValueError as error:
+                    flash(str(error), "error")
+                else:
+                    db_session.commit()
+                    logger.debug("Category '%s' responsible updated", cat.name)
+                    flash(**Message.Category.Responsible.Updated
+                          .flash(cat.name))
         else:
             flash(**Message.Category.Responsible.Invalid.flash())
         return redirect(url_for(".reassign_category", category=category))
@@ -268,5 +282,41 @@ def reassign_category(category):
 
     return render_template("cat/reassign_category.html",
                            form=reassign_cat_form,
+                           merge_form=merge_cat_form,
                            products=products,
                            Message=Message)
+
+
+@cat_bp.route("/merge/<path:category>", methods=["POST"])
+def merge_category(category):
+    """Move all products of the category to another category and delete it."""
+    logger.info("Merge category '%s'", category)
+    merge_cat_form: MergeCatForm = MergeCatForm()
+    merge_cat_form.target_id.choices = [
+        (0, Message.Category.Merge.Default())]
+    merge_cat_form.target_id.choices.extend(reference_choices(Category))
+    if not merge_cat_form.validate_on_submit():
+        logger.warning("Category merge error(s)")
+        flash_errors(merge_cat_form.errors)
+        return redirect(url_for(".reassign_category", category=category))
+    if not merge_cat_form.target_id.data:
+        flash(**Message.Category.Merge.Invalid.flash())
+        return redirect(url_for(".reassign_category", category=category))
+    with dbSession() as db_session:
+        if not (cat := db_session.scalar(
+                select(Category)
+                .filter_by(name=escape(category)))):
+            flash(**Message.Category.NotExists.flash(category))
+            return redirect(url_for(".categories"))
+        try:
+            merge_into(db_session, Category, cat.id,
+                       merge_cat_form.target_id.data)
+        except ValueError as error:
+            flash(str(error), "error")
+            return redirect(url_for(".reassign_category", category=category))
+        target = db_session.get(Category, merge_cat_form.target_id.data)
+        names = (cat.name, target.name)
+        db_session.commit()
+    logger.debug("Category '%s' merged into '%s'", *names)
+    flash(**Message.Category.Merge.Merged.flash(*names))
+    return redirect(url_for(".categories"))
@@ -2,47 +2,110 @@
 
 from flask import (Blueprint, flash, redirect, render_template, request,
                    session, url_for)
+from flask_babel import gettext
 from flask_wtf import FlaskForm
 from markupsafe import escape
 from sqlalchemy import select
+from sqlalchemy.orm import Session
 
-from database import Product, User, dbSession
-from helpers import admin_required, flash_errors, logger, login_required
+from constants import Constant
+from database import (Category, Product, User, dbSession, search_products,
+                      search_query, stream_rows, submit_inventory)
+from helpers import (admin_required, export_response, flash_errors, logger,
+                     login_required)
 from messages import Message
 
 inv_bp = Blueprint(
     "inv",
     __name__,
-    template_folder="templates")
+    template_folder="templates",
+    static_folder="static",
+    static_url_path="/inventory-static")
 
 
 class InventoryForm(FlaskForm):
     """Flask-WTF form used just for csrf token."""
 
 
+def _search_text() -> str:
+    """Inventory page search text (`search` query string value; `""` if it
+    has no words)."""
+    search = request.args.get("search", "").strip()[
+        :Constant.Product.Listing.search_max_length]
+    return search if search_query(search) else ""
+
+
+def _inventory_products(user_id: int, search: str) -> list[Product]:
+    """Products listed on the inventory page: the user's products in use
+    or, when searching, the matching ones ranked by relevance.
+
+    :param user_id: the inventorying user
+    :param search: search text
+    """
+    statement = (select(Product)
+                 .filter_by(responsible_id=user_id, in_use=True)
+                 .order_by(Product.category_id, Product.name))
+    if search:
+        statement = search_products(search, statement)
+    with dbSession() as db_session:
+        return db_session.scalars(statement).all()
+
+
+def _inventory_changes(db_session: Session, user_id: int) -> dict[int, bool]:
+    """Products `to_order` changes of the submitted inventory.
+
+    The inventory page script sends only the changed products (`changed`
+    values `<product id>:<0|1>`); without it all the checked products are
+    sent and compared with the stored state (only the listed ones when the
+    page was searched).
+
+    :param db_session: session of the transaction
+    :param user_id: the inventorying user
+    """
+    if request.form.get("delta"):
+        changes = {}
+        for change in request.form.getlist("changed"):
+            product_id, _, to_order = change.partition(":")
+            if not product_id.isdecimal() or to_order not in {"0", "1"}:
+                raise ValueError(Message.UI.Inv.Invalid())
+            changes[int(product_id)] = to_order == "1"
+        return changes
+    statement = (select(Product.id, Product.to_order)
+                 .filter_by(responsible_id=user_id, in_use=True))
+    if search := _search_text():
+        statement = search_products(search, statement)
+    return {product_id: not to_order
+            for product_id, to_order in db_session.execute(statement)
+            if to_order != (str(product_id) in request.form)}
+
+
 @inv_bp.route("/inventory", methods=["GET", "POST"])
 @login_required
 def inventory():
     """Inventory check page."""
     logger.info("Inventory check page")
-    session["last_url"] = url_for(".inventory")
+    search = _search_text()
+    session["last_url"] = url_for(".inventory", search=search or None)
     inv_form: InventoryForm = InventoryForm()
     with dbSession() as db_session:
         user = db_session.get(User, session.get("user_id"))
     if inv_form.validate_on_submit() and not user.done_inv:
         with dbSession() as db_session:
-            products = db_session.scalars(
-                select(Product)
-                .filter_by(responsible_id=user.id, in_use=True)
-                ).all()
-            for product in products:
-                if str(product.id) in request.form:
-                    product.to_order = True
-                else:
-                    product.to_order = False
-            db_session.get(User, user.id).done_inv = True
+            try:
+                changed = submit_inventory(
+                    db_session, user.id,
+                    _inventory_changes(db_session, user.id),
+                    done=not search)
+            except ValueError as error:
+                flash(str(error), "error")
+                return redirect(session["last_url"])
             db_session.commit()
-        logger.debug("Inventory submitted")
+        if search:
+            # only the searched products were listed
+            logger.debug("Inventory changes saved (%d changes)", changed)
+            flash(**Message.UI.Inv.Saved.flash())
+            return redirect(session["last_url"])
+        logger.debug("Inventory submitted (%d changes)", changed)
         flash(**Message.UI.Inv.Submitted.flash())
         return redirect(url_for("main.index"))
     elif inv_form.errors:
@@ -52,16 +115,13 @@ def inventory():
         logger.info("Inventory check not required")
         flash(**Message.UI.Inv.NotReq.flash())
 
-    with dbSession() as db_session:
-        products = db_session.scalars(
-            select(Product)
-            .filter_by(responsible_id=user.id, in_use=True)
-            .order_by(Product.category_id, Product.name)
-            ).all()
-
     return render_template(
         "inv/inventory.html",
-        products=products, form=inv_form, user=user, Message=Message)
+        products=_inventory_products(user.id, search),
+        search=search,
+        form=inv_form,
+        user=user,
+        Message=Message)
 
 
 @inv_bp.route("/inventory/<path:username>", methods=["GET", "POST"])
@@ -69,7 +129,10 @@ def inventory():
 def inventory_user(username):
     """Inventory check page for other users."""
     logger.info("Inventory check page for user '%s'", username)
-    session["last_url"] = url_for(".inventory_user", username=username)
+    search = _search_text()
+    session["last_url"] = url_for(".inventory_user",
+                                  username=username,
+                                  search=search or None)
     inv_form: InventoryForm = InventoryForm()
     with dbSession() as db_session:
         user = db_session.scalar(select(User).filter_by(name=escape(username)))
@@ -86,18 +149,23 @@ def inventory_user(username):
 
     if inv_form.validate_on_submit() and not user.done_inv:
         with dbSession() as db_session:
-            products = db_session.scalars(
-                select(Product)
-                .filter_by(responsible_id=user.id, in_use=True)
-                ).all()
-            for product in products:
-                if str(product.id) in request.form:
-                    product.to_order = True
-                else:
-                    product.to_order = False
-            db_session.get(User, user.id).done_inv = True
+            try:
+                changed = submit_inventory(
+                    db_session, user.id,
+                    _inventory_changes(db_session, user.id),
+                    done=not search)
+            except ValueError as error:
+                flash(str(error), "error")
+                return redirect(session["last_url"])
             db_session.commit()
-        logger.debug("Inventory has been submitted for user '%s'", username)
+        if search:
+            # only the searched products were listed
+            logger.debug("Inventory changes saved for user '%s' "
+                         "(%d changes)", username, changed)
+            flash(**Message.UI.Inv.Saved.flash())
+            return redirect(session["last_url"])
+        logger.debug("Inventory has been submitted for user '%s' "
+                     "(%d changes)", username, changed)
         flash(**Message.UI.Inv.Submitted.flash())
         return redirect(url_for("main.index"))
     elif inv_form.errors:
@@ -108,16 +176,13 @@ def inventory_user(username):
                      username)
         flash(**Message.UI.Inv.NotReq.flash())
 
-    with dbSession() as db_session:
-        products = db_session.scalars(
-            select(Product)
-            .filter_by(responsible_id=user.id, in_use=True)
-            .order_by(Product.category_id, Product.name)
-            ).all()
-
     return render_template(
         "inv/inventory.html",
-        products=products, form=inv_form, user=user, Message=Message)
+        products=_inventory_products(user.id, search),
+        search=search,
+        form=inv_form,
+        user=user,
+        Message=Message)
 
 
 @inv_bp.route("/inventory/request")
@@ -139,3 +204,45 @@ def inventory_request():
                 return redirect(url_for(".inventory"))
 
     return redirect(url_for("main.index"))
+
+
+# region: exports
+def _inventory_export(user_id: int, file_name: str, file_format: str):
+    """Inventory list download of a user's products in use."""
+    header = [gettext("Category"), gettext("Code"), gettext("Description"),
+              gettext("Measuring unit"), gettext("Minimum stock"),
+              gettext("Order quantity"), gettext("Critical product"),
+              gettext("To order")]
+    rows = stream_rows(
+        select(Category.name, Product.name, Product.description,
+               Product.meas_unit, Product.min_stock, Product.ord_qty,
+               Product.critical, Product.to_order)
+        .join(Product.category)
+        .filter(Product.responsible_id == user_id,
+                Product.in_use.is_(True))
+        .order_by(Product.category_id, Product.name))
+    return export_response(file_name, file_format, header, rows)
+
+
+@inv_bp.route("/inventory/export.<any(csv, xlsx):file_format>")
+@login_required
+def export_inventory(file_format):
+    """Inventory list download."""
+    logger.info("Inventory export")
+    return _inventory_export(session["user_id"], "inventory", file_format)
+
+
+@inv_bp.route(
+    "/inventory/export/<path:username>.<any(csv, xlsx):file_format>")
+@admin_required
+def export_inventory_user(username, file_format):
+    """Inventory list download for other users."""
+    logger.info("Inventory export for user '%s'", username)
+    with dbSession() as db_session:
+        user = db_session.scalar(select(User).filter_by(name=escape(username)))
+    if not user:
+        flash(**Message.User.NotExists.flash(username))
+        logger.warning("Inventory export for user '%s' error(s)", username)
+        return redirect(url_for("main.index"))
+    return _inventory_export(user.id, f"inventory_{user.name}", file_format)
+# endregion
@@ -0,0 +1,30 @@
+addEventListener("DOMContentLoaded", (event) => {
+    const form = document.getElementById("inventory-form");
+    if (!form) {
+        return;
+    }
+    // send only the products whose "to order" switch was changed
+    form.addEventListener("submit", () => {
+        form.querySelectorAll(".to-order").forEach((product) => {
+            if (product.checked !== product.defaultChecked) {
+                const change = document.createElement("input");
+                change.type = "hidden";
+                change.name = "changed";
+                change.value = `${product.name}:${product.checked ? 1 : 0}`;
+                form.appendChild(change);
+            }
+            product.disabled = true;
+        });
+        const delta = document.createElement("input");
+        delta.type = "hidden";
+        delta.name = "delta";
+        delta.value = "1";
+        form.appendChild(delta);
+    });
+    // the switches are disabled on submit; restore them on back navigation
+    addEventListener("pageshow", () => {
+        form.querySelectorAll(".to-order").forEach((product) => {
+            product.disabled = form.dataset.doneInv === "true";
+        });
+    });
+});
@@ -1,21 +1,30 @@
 """Products blueprint."""
 
-from typing import Callable
+from io import TextIOWrapper
+from typing import Callable, Optional
 
-from flask import (Blueprint, flash, redirect, render_template, request,
-                   session, url_for)
-from flask_babel import lazy_gettext
+from flask import (Blueprint, Response, current_app, flash, redirect,
+                   render_template, request, session, stream_template,
+                   stream_with_context, url_for)
+from flask_babel import gettext, lazy_gettext
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField, FileRequired
+from itsdangerous import BadSignature, URLSafeSerializer
 from markupsafe import escape
-from sqlalchemy import func, select
-from sqlalchemy.orm import defer, joinedload, raiseload
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.orm import contains_eager, defer, joinedload, raiseload
 from wtforms import (BooleanField, IntegerField, SelectField, StringField,
                      SubmitField)
 from wtforms.validators import InputRequired, Length, NumberRange
+from wtforms.validators import Optional as InputOptional
 
 from constants import Constant
-from database import Category, Product, Supplier, User, dbSession
-from helpers import admin_required, flash_errors, logger
+from database import (BULK_EDIT_COLUMNS, IMPORT_COLUMNS, Category, Product,
+                      ProductsImport, Supplier, User, bulk_edit_products,
+                      clear_order_list, dbSession, global_stats,
+                      reference_choices, search_products, search_query,
+                      stream_rows)
+from helpers import admin_required, export_response, flash_errors, logger
 from messages import Message
 
 func: Callable
@@ -154,111 +163,330 @@ class ProdToOrderForm(FlaskForm):
     """Flask-WTF form used just for csrf token."""
 
 
+class ProdFilterForm(FlaskForm):
+    """Products page filters form (query string)."""
+    class Meta:
+        """Filters are read from GET requests."""
+        csrf = False
+
+    in_use = SelectField(
+        label=lazy_gettext("In use"),
+        default="",
+        choices=[("", lazy_gettext("All")),
+                 ("1", lazy_gettext("Yes")),
+                 ("0", lazy_gettext("No"))],
+        render_kw={
+                "class": "form-select form-select-sm",
+                })
+    critical = SelectField(
+        label=lazy_gettext("Critical product"),
+        default="",
+        choices=[("", lazy_gettext("All")),
+                 ("1", lazy_gettext("Yes")),
+                 ("0", lazy_gettext("No"))],
+        render_kw={
+                "class": "form-select form-select-sm",
+                })
+    responsible = SelectField(
+        label=lazy_gettext("Responsible"),
+        default="",
+        render_kw={
+                "class": "form-select form-select-sm",
+                })
+    category = SelectField(
+        label=lazy_gettext("Category"),
+        default="",
+        render_kw={
+                "class": "form-select form-select-sm",
+                })
+    supplier = SelectField(
+        label=lazy_gettext("Supplier"),
+        default="",
+        render_kw={
+                "class": "form-select form-select-sm",
+                })
+    search = StringField(
+        label=lazy_gettext("Search"),
+        default="",
+        validators=[
+            Length(max=Constant.Product.Listing.search_max_length)],
+        filters=[lambda value: value.strip() if value else ""],
+        render_kw={
+            "class": "form-control form-control-sm",
+            "type": "search",
+            "placeholder": lazy_gettext("Code, description, category..."),
+            "autocomplete": "off",
+            })
+
+
+class BulkEditProdForm(FlaskForm):
+    """Selected products edit form (empty fields are not changed)."""
+    meas_unit = StringField(
+        label=lazy_gettext("Measuring unit"),
+        validators=[InputOptional()],
+        render_kw={
+            "class": "form-control form-control-sm",
+            "autocomplete": "off",
+            })
+    min_stock = IntegerField(
+        label=lazy_gettext("Minimum stock"),
+        validators=[
+            InputOptional(),
+            NumberRange(
+                min=Constant.Product.MinStock.min_value,
+                max=Constant.SQLite.Int.max_value,
+                message=Message.Product.MinStock.Invalid())],
+        render_kw={
+            "class": "form-control form-control-sm",
+            "autocomplete": "off",
+            })
+    ord_qty = IntegerField(
+        label=lazy_gettext("Order quantity"),
+        validators=[
+            InputOptional(),
+            NumberRange(
+                min=Constant.Product.OrdQty.min_value,
+                max=Constant.SQLite.Int.max_value,
+                message=Message.Product.OrdQty.Invalid())],
+        render_kw={
+            "class": "form-control form-control-sm",
+            "autocomplete": "off",
+            })
+    critical = SelectField(
+        label=lazy_gettext("Critical product"),
+        default="",
+        choices=[("", lazy_gettext("Unchanged")),
+                 ("1", lazy_gettext("Yes")),
+                 ("0", lazy_gettext("No"))],
+        render_kw={
+                "class": "form-select form-select-sm",
+                })
+    in_use = SelectField(
+        label=lazy_gettext("In use"),
+        default="",
+        choices=[("", lazy_gettext("Unchanged")),
+                 ("1", lazy_gettext("Yes")),
+                 ("0", lazy_gettext("No"))],
+        render_kw={
+                "class": "form-select form-select-sm",
+                })
+    submit = SubmitField(
+        label=lazy_gettext("Update selected"),
+        render_kw={"class": "btn btn-primary btn-sm px-3"})
+
+
+# region: products listing
+# products page sorting column (`None` - by code only)
+PRODUCTS_SORT_KEYS = {
+    "code": None,
+    "responsible": User.name,
+    "category": Category.name,
+    "supplier": Supplier.name,
+}
+# products page filters and their columns
+PRODUCTS_FILTERS = {
+    "in_use": Product.in_use,
+    "critical": Product.critical,
+    "responsible": Product.responsible_id,
+    "category": Product.category_id,
+    "supplier": Product.supplier_id,
+}
+
+
+def products_query(ordered_by: str,
+                   filters: dict[str, str],
+                   after: Optional[list] = None,
+                   limit: int = Constant.Product.Listing.page_size,
+                   search: str = ""
+                   ) -> Select:
+    """Products page query: products with their responsible, category and
+    supplier names, followed by their sorting (keyset) values.
+
+    :param ordered_by: sorting key (see `PRODUCTS_SORT_KEYS`)
+    :param filters: filters values (see `PRODUCTS_FILTERS`)
+    :param after: sorting values of the previous page last product
+    :param limit: maximum number of products
+    :param search: search text; the matching products are ranked by
+        relevance instead of `ordered_by`
+    """
+    sort_column = PRODUCTS_SORT_KEYS[ordered_by]
+    keys = [func.lower(Product.name), Product.id]
+    if sort_column is not None:
+        keys.insert(0, func.lower(sort_column))
+    statement = (
+        select(Product, *keys)
+        .join(Product.responsible)
+        .join(Product.category)
+        .join(Product.supplier)
+        .options(
+            defer(Product.to_order, raiseload=True),
+            contains_eager(Product.responsible).load_only(User.name),
+            contains_eager(Product.category).load_only(Category.name),
+            contains_eager(Product.supplier).load_only(Supplier.name),
+            raiseload("*"))
+        .order_by(*keys)
+        .limit(limit))
+    for name, value in filters.items():
+        column = PRODUCTS_FILTERS[name]
+        if name in {"in_use", "critical"}:
+            statement = statement.filter(column.is_(value == "1"))
+        else:
+            statement = statement.filter(column == int(value))
+    if after is not None:
+        statement = statement.filter(tuple_(*keys) > tuple_(*after))
+    if search:
+        statement = search_products(search, statement)
+    return statement
+
+
+def _page_serializer() -> URLSafeSerializer:
+    """Signer of the products page cursors."""
+    return URLSafeSerializer(current_app.secret_key, salt="products-page")
+
+
+def _page_cursor(ordered_by: str, after: list) -> str:
+    """Signed cursor of the page following the product with the sorting
+    values `after`.
+
+    :param ordered_by: sorting key of the page
+    :param after: sorting values of the page last product
+    """
+    return _page_serializer().dumps({"ordered_by": ordered_by,
+                                     "after": after})
+
+
+def _page_after(ordered_by: str, cursor: str) -> list:
+    """Sorting values of a signed page `cursor`.
+
+    :param ordered_by: sorting key of the requested page
+    :param cursor: signed page cursor
+    :raise BadSignature: invalid cursor or cursor of another sorting
+    """
+    data = _page_serializer().loads(cursor)
+    keys = 2 if PRODUCTS_SORT_KEYS[ordered_by] is None else 3
+    if (not isinstance(data, dict)
+            or data.get("ordered_by") != ordered_by
+            or not isinstance(after := data.get("after"), list)
+            or len(after) != keys):
+        raise BadSignature("Cursor of another products sorting")
+    return after
+
+
 @prod_bp.route("/products-sorted-by-<ordered_by>")
 def products(ordered_by):
-    """All products page."""
+    """All products page (paginated)."""
     logger.info("All products page")
-    session["last_url"] = url_for(".products", ordered_by=ordered_by)
+    if ordered_by not in PRODUCTS_SORT_KEYS:
+        logger.warning("Products sorting error(s)")
+        flash(**Message.Product.NoSort.flash(ordered_by))
+        return redirect(url_for(".products", ordered_by="code"))
+    filter_form: ProdFilterForm = ProdFilterForm(formdata=request.args)
+    filter_form.responsible.choices = [("", lazy_gettext("All"))] + \
+        [(str(elem_id), name) for elem_id, name in reference_choices(User)]
+    filter_form.category.choices = [("", lazy_gettext("All"))] + \
+        [(str(elem_id), name)
+         for elem_id, name in reference_choices(Category)]
+    filter_form.supplier.choices = [("", lazy_gettext("All"))] + \
+        [(str(elem_id), name)
+         for elem_id, name in reference_choices(Supplier)]
+    if not filter_form.validate():
+        logger.warning("Products filtering error(s)")
+        flash_errors(filter_form.errors)
+        return redirect(url_for(".products", ordered_by=ordered_by))
+    filters = {name: value for name, value in filter_form.data.items()
+               if name in PRODUCTS_FILTERS and value}
+    # a search without words lists the products as usual
+    search = filter_form.search.data
+    if not search_query(search):
+        search = ""
+    after = None
+    # search results are ranked by relevance, without further pages
+    if (cursor := request.args.get("after")) and not search:
+        try:
+            after = _page_after(ordered_by, cursor)
+        except BadSignature:
+            logger.warning("Products page error(s)")
+            flash(**Message.Product.NoPage.flash())
+            return redirect(url_for(".products",
+                                    ordered_by=ordered_by,
+                                    **filters))
+    session["last_url"] = url_for(".products",
+                                  ordered_by=ordered_by,
+                                  **filters,
+                                  **({"search": search} if search else {}),
+                                  **({"after": cursor}
+                                     if after is not None else {}))
+    page_size = Constant.Product.Listing.page_size
     with dbSession() as db_session:
-        if ordered_by == "code":
-            prods = db_session.scalars(
-                select(Product)
-                .options(
-                    defer(Product.to_order, raiseload=True),
-                    joinedload(Product.responsible).load_only(User.name),
-                    joinedload(Product.category).load_only(Category.name),
-                    joinedload(Product.supplier).load_only(Supplier.name),
-                    raiseload("*"))
-                .order_by(func.lower(Product.name))
-            ).unique().all()
-        elif ordered_by == "responsible":
-            prods = db_session.scalars(
-                select(Product)
-                .join(Product.responsible)
-                .options(
-                    defer(Product.to_order, raiseload=True),
-                    joinedload(Product.responsible).load_only(User.name),
-                    joinedload(Product.category).load_only(Category.name),
-                    joinedload(Product.supplier).load_only(Supplier.name),
-                    raiseload("*"))
-                .order_by(func.lower(User.name), func.lower(Product.name))
-            ).unique().all()
-        elif ordered_by == "category":
-            prods = db_session.scalars(
-                select(Product)
-                .join(Product.category)
-                .options(
-                    defer(Product.to_order, raiseload=True),
-                    joinedload(Product.responsible).load_only(User.name),
-                    joinedload(Product.category).load_only(Category.name),
-                    joinedload(Product.supplier).load_only(Supplier.name),
-                    raiseload("*"))
-                .order_by(func.lower(Category.name), func.lower(Product.name))
-            ).unique().all()
-        elif ordered_by == "supplier":
-            prods = db_session.scalars(
-                select(Product)
-                .join(Product.supplier)
-                .options(
-                    defer(Product.to_order, raiseload=True),
-                    joinedload(Product.responsible).load_only(User.name),
-                    joinedload(Product.category).load_only(Category.name),
-                    joinedload(Product.supplier).load_only(Supplier.name),
-                    raiseload("*"))
-                .order_by(func.lower(Supplier.name), func.lower(Product.name))
-            ).unique().all()
-        else:
-            logger.warning("Products sorting error(s)")
-            flash(**Message.Product.NoSort.flash(ordered_by))
-            return redirect(url_for(".products", ordered_by="code"))
-        stats = {
-                "all_products": db_session.scalar(
-                    select(func.count(Product.id))),
-                "in_use_products": db_session.scalar(
-                    select(func.count(Product.id))
-                    .filter_by(in_use=True)),
-                "critical_products": db_session.scalar(
-                    select(func.count(Product.id))
-                    .filter_by(critical=True)),
-                "in_use_critical_products": db_session.scalar(
-                    select(func.count(Product.id))
-                    .filter_by(in_use=True, critical=True)),
-        }
+        rows = db_session.execute(products_query(
+            ordered_by, filters, after, page_size + 1, search)).all()
+        stats = global_stats(db_session)
+    next_url = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        if not search:
+            next_url = url_for(
+                ".products",
+                ordered_by=ordered_by,
+                **filters,
+                after=_page_cursor(ordered_by, list(rows[-1][1:])))
     return render_template(
         "prod/products.html",
-        products=prods,
+        products=[row[0] for row in rows],
+        filters=filters,
+        search=search,
+        filter_form=filter_form,
+        bulk_edit_form=BulkEditProdForm(formdata=None),
+        first_url=(url_for(".products", ordered_by=ordered_by, **filters)
+                   if after is not None else None),
+        next_url=next_url,
         stats=stats,
         Message=Message)
 
 
+@prod_bp.route("/bulk-edit", methods=["POST"])
+def edit_products():
+    """Edit the products selected on the products page at once."""
+    logger.info("Bulk edit products")
+    bulk_edit_form: BulkEditProdForm = BulkEditProdForm()
+    if not bulk_edit_form.validate_on_submit():
+        logger.warning("Products bulk editing error(s)")
+        flash_errors(bulk_edit_form.errors)
+        return redirect(session["last_url"])
+    if not (product_ids := request.form.getlist("product_id", type=int)):
+        flash(**Message.Product.BulkEdit.NoSelection.flash())
+        return redirect(session["last_url"])
+    values = {column: bulk_edit_form[column].data
+              for column in BULK_EDIT_COLUMNS
+              if bulk_edit_form[column].data not in (None, "")}
+    if not values:
+        flash(**Message.Product.BulkEdit.NoChanges.flash())
+        return redirect(session["last_url"])
+    for column in ("critical", "in_use"):
+        if column in values:
+            values[column] = values[column] == "1"
+    with dbSession() as db_session:
+        try:
+            updated = bulk_edit_products(db_session, product_ids, values)
+        except ValueError as error:
+            flash(str(error), "error")
+        else:
+            db_session.commit()
+            logger.debug("%d product(s) updated", updated)
+            flash(**Message.Product.BulkEdit.Updated.flash(updated))
+    return redirect(session["last_url"])
+# endregion
+
+
 @prod_bp.route("/new", methods=["GET", "POST"])
 def new_product():
     """Create a new product."""
     logger.info("New product page")
     new_prod_form: CreateProdForm = CreateProdForm()
 
-    with dbSession() as db_session:
-        users = db_session.execute(
-            select(User.id, User.name)
-            .filter_by(in_use=True, reg_req=False)
-            .order_by(func.lower(User.name))
-            ).all()
-        categories = db_session.execute(
-            select(Category.id, Category.name)
-            .filter_by(in_use=True)
-            .order_by(func.lower(Category.name))
-            ).all()
-        suppliers = db_session.execute(
-            select(Supplier.id, Supplier.name)
-            .filter_by(in_use=True)
-            .order_by(func.lower(Supplier.name))
-            ).all()
-    new_prod_form.responsible_id.choices = [
-        (user.id, user.name) for user in users]
-    new_prod_form.category_id.choices = [
-        (category.id, category.name) for category in categories]
-    new_prod_form.supplier_id.choices = [
-        (supplier.id, supplier.name) for supplier in suppliers]
+    new_prod_form.responsible_id.choices = reference_choices(User)
+    new_prod_form.category_id.choices = reference_choices(Category)
+    new_prod_form.supplier_id.choices = reference_choices(Supplier)
 
     if new_prod_form.validate_on_submit():
         with dbSession() as db_session:
@@ -293,34 +521,59 @@ def new_product():
                            Message=Message)
 
 
+class ImportProdForm(FlaskForm):
+    """Import products form."""
+    file = FileField(
+        label=lazy_gettext("CSV file"),
+        validators=[
+            FileRequired(Message.Product.Import.File()),
+            FileAllowed(["csv"], Message.Product.Import.File())],
+        render_kw={
+            "class": "form-control",
+            "accept": ".csv,text/csv",
+            })
+    submit = SubmitField(
+        label=lazy_gettext("Import products"),
+        render_kw={"class": "btn btn-primary px-4"})
+
+
+@prod_bp.route("/import", methods=["GET", "POST"])
+def import_products():
+    """Import products from a CSV file; the errors report is streamed while
+    the file is checked."""
+    logger.info("Import products page")
+    import_form: ImportProdForm = ImportProdForm()
+    if import_form.validate_on_submit():
+        try:
+            products_import = ProductsImport.from_csv(TextIOWrapper(
+                import_form.file.data.stream, encoding="utf-8-sig"))
+        except ValueError as error:
+            logger.warning("Products import error(s)")
+            flash(str(error), "error")
+        else:
+            return Response(stream_with_context(stream_template(
+                "prod/import_report.html",
+                products_import=products_import,
+                Message=Message)))
+    elif import_form.errors:
+        logger.warning("Products import error(s)")
+        flash_errors(import_form.errors)
+
+    return render_template("prod/import_products.html",
+                           form=import_form,
+                           columns=IMPORT_COLUMNS,
+                           Message=Message)
+
+
 @prod_bp.route("/edit/<path:product>", methods=["GET", "POST"])
 def edit_product(product):
     """Edit product."""
     logger.info("Edit product '%s' page", product)
     edit_prod_form: EditProdForm = EditProdForm()
 
-    with dbSession() as db_session:
-        users = db_session.execute(
-            select(User.id, User.name)
-            .filter_by(in_use=True, reg_req=False)
-            .order_by(func.lower(User.name))
-            ).all()
-        categories = db_session.execute(
-            select(Category.id, Category.name)
-            .filter_by(in_use=True)
-            .order_by(func.lower(Category.name))
-            ).all()
-        suppliers = db_session.execute(
-            select(Supplier.id, Supplier.name)
-            .filter_by(in_use=True)
-            .order_by(func.lower(Supplier.name))
-            ).all()
-    edit_prod_form.responsible_id.choices = [
-        (user.id, user.name) for user in users]
-    edit_prod_form.category_id.choices = [
-        (category.id, category.name) for category in categories]
-    edit_prod_form.supplier_id.choices = [
-        (supplier.id, supplier.name) for supplier in suppliers]
+    edit_prod_form.responsible_id.choices = reference_choices(User)
+    edit_prod_form.category_id.choices = reference_choices(Category)
+    edit_prod_form.supplier_id.choices = reference_choices(Supplier)
 
     if edit_prod_form.validate_on_submit():
         with dbSession() as db_session:
@@ -346,10 +599,15 @@ def edit_product(product):
                     prod.to_order = edit_prod_form.to_order.data
                     prod.critical = edit_prod_form.critical.data
                     prod.in_use = edit_prod_form.in_use.data
+                    modified = db_session.is_modified(
+                        prod, include_collections=False)
+                    # the responsible, category and supplier are checked on
+                    # flush
+                    db_session.flush()
                 except ValueError as error:
                     flash(str(error), "error")
                 else:
-                    if db_session.is_modified(prod, include_collections=False):
+                    if modified:
                         logger.debug("Product updated")
                         flash(**Message.Product.Updated.flash(prod.name))
                         db_session.commit()
@@ -364,12 +622,9 @@ def edit_product(product):
                 select(Product)
                 .filter_by(name=escape(product)))):
             edit_prod_form = EditProdForm(obj=prod)
-            edit_prod_form.responsible_id.choices = [
-                (user.id, user.name) for user in users]
-            edit_prod_form.category_id.choices = [
-                (category.id, category.name) for category in categories]
-            edit_prod_form.supplier_id.choices = [
-                (supplier.id, supplier.name) for supplier in suppliers]
+            edit_prod_form.responsible_id.choices = reference_choices(User)
+            edit_prod_form.category_id.choices = reference_choices(Category)
+            edit_prod_form.supplier_id.choices = reference_choices(Supplier)
         else:
             flash(**Message.Product.NotExists.flash(product))
             return redirect(url_for(".products", ordered_by="code"))
@@ -443,12 +698,52 @@ def products_to_order():
 def all_products_ordered():
     """All products ordered flag."""
     with dbSession() as db_session:
-        prods = db_session.scalars(
-            select(Product).filter_by(to_order=True)
-            ).all()
-        for product in prods:
-            product.to_order = False
+        ordered = clear_order_list(db_session)
         db_session.commit()
-    logger.debug("All products ordered")
+    logger.debug("All products ordered (%d products)", ordered)
     flash(**Message.Product.AllOrdered.flash())
     return redirect(url_for("main.index"))
+
+
+# region: exports
+@prod_bp.route("/export/products.<any(csv, xlsx):file_format>")
+def export_products(file_format):
+    """Product catalog download."""
+    logger.info("Products export")
+    header = [gettext("Code"), gettext("Description"),
+              gettext("Responsible"), gettext("Category"),
+              gettext("Supplier"), gettext("Measuring unit"),
+              gettext("Minimum stock"), gettext("Order quantity"),
+              gettext("To order"), gettext("Critical product"),
+              gettext("In use")]
+    rows = stream_rows(
+        select(Product.name, Product.description, User.name, Category.name,
+               Supplier.name, Product.meas_unit, Product.min_stock,
+               Product.ord_qty, Product.to_order, Product.critical,
+               Product.in_use)
+        .join(Product.responsible)
+        .join(Product.category)
+        .join(Product.supplier)
+        .order_by(func.lower(Product.name)))
+    return export_response("products", file_format, header, rows)
+
+
+@prod_bp.route("/export/products-to-order.<any(csv, xlsx):file_format>")
+def export_products_to_order(file_format):
+    """Products to order download, grouped by supplier."""
+    logger.info("Products to order export")
+    header = [gettext("Supplier"), gettext("Code"), gettext("Description"),
+              gettext("Quantity"), gettext("Measuring unit"),
+              gettext("Responsible"), gettext("Category"),
+              gettext("Critical product")]
+    rows = stream_rows(
+        select(Supplier.name, Product.name, Product.description,
+               Product.ord_qty, Product.meas_unit, User.name, Category.name,
+               Product.critical)
+        .join(Product.responsible)
+        .join(Product.category)
+        .join(Product.supplier)
+        .filter(Product.to_order.is_(True))
+        .order_by(func.lower(Supplier.name), func.lower(Product.name)))
+    return export_response("products_to_order", file_format, header, rows)
+# endregion
@@ -22,6 +22,9 @@ class ScheduleInfo(NamedTuple):
     :param sch_day: day of the week when the schedule starts
     :param sch_day_update: day of the week when the schedule updates
     :param switch_interval: switching time interval (weeks)
+    :param user_attr: group schedules - user attribute holding the group
+    :param num_groups: group schedules - number of groups
+    :param first_group: group schedules - first group to be scheduled
     """
     type: str
     en_name: str
@@ -31,6 +34,9 @@ class ScheduleInfo(NamedTuple):
     sch_day: int
     sch_day_update: int
     switch_interval: int
+    user_attr: str = ""
+    num_groups: int = 2
+    first_group: int = 1
 
 
 sat_sch_info = ScheduleInfo(
@@ -41,7 +47,10 @@ sat_sch_info = ScheduleInfo(
     negative=lazy_gettext("You're not choosing the movie this saturday"),
     sch_day=6,
     sch_day_update=7,
-    switch_interval=1
+    switch_interval=1,
+    user_attr="sat_group",
+    num_groups=2,
+    first_group=1
 )
 
 clean_sch_info = ScheduleInfo(
@@ -54,4 +63,7 @@ clean_sch_info = ScheduleInfo(
     sch_day_update=6,
     switch_interval=1
 )
+
+# app schedules (see `ScheduleRegistry`)
+SCHEDULES = (sat_sch_info, clean_sch_info)
 # endregion
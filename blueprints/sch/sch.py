@@ -1,15 +1,30 @@
 """Schedules blueprint."""
 
-from dataclasses import dataclass
-from datetime import date, timedelta
-from typing import Callable
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from hashlib import sha1
+from heapq import merge
+from itertools import groupby
+from operator import attrgetter
+from typing import (Callable, Iterable, Iterator, NamedTuple, Optional,
+                    Sequence)
 
-from flask import Blueprint, render_template, session, url_for
-from sqlalchemy import func, select
+from flask import (Blueprint, Response, abort, current_app, flash, redirect,
+                   render_template, request, session, stream_with_context,
+                   url_for)
+from flask_wtf import FlaskForm
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import (ColumnElement, Integer, Row, and_, case, cast,
+                        delete, func, or_, select, tuple_, update)
+from sqlalchemy.orm import Session, aliased
 
-from blueprints.sch import clean_sch_info, sat_sch_info
-from database import Schedule, User, dbSession
-from helpers import logger, login_required
+from blueprints.sch import (SCHEDULES, ScheduleInfo, clean_sch_info,
+                            sat_sch_info)
+from constants import Constant
+from database import (Schedule, User, dbSession, request_session,
+                      unique_by_constraint)
+from helpers import flash_errors, logger, login_required
+from messages import Message
 
 func: Callable
 
@@ -21,48 +36,123 @@ sch_bp = Blueprint(
 
 
 def update_schedules() -> None:
-    """Check update_date in schedules and update if necessary."""
+    """Check update_date in schedules and update if necessary.
+
+    All the due schedules are advanced by one UPDATE statement: each due row
+    jumps over as many whole cycles (`update_interval` times the number of
+    rows of the schedule) as needed to bring its update date in the future.
+    """
+    today = date.today()
+    same_schedule = aliased(Schedule)
+    cycle = Schedule.update_interval * (
+        select(func.count(same_schedule.id))
+        .filter(same_schedule.name == Schedule.name,
+                same_schedule.type == Schedule.type)
+        .scalar_subquery())
+    shift = (cast(func.julianday(today) -
+                  func.julianday(Schedule.update_date), Integer)
+             // cycle + 1) * cycle
     with dbSession() as db_session:
-        all_schedules = db_session.scalars(
-            select(Schedule)
-            .filter(Schedule.update_date <= date.today())
+        updated = db_session.execute(
+            update(Schedule)
+            .filter(Schedule.update_date <= today)
+            .values(
+                next_date=func.date(
+                    func.julianday(Schedule.next_date) + shift),
+                update_date=func.date(
+                    func.julianday(Schedule.update_date) + shift))
+            .returning(Schedule.name, Schedule.type, Schedule.elem_id)
+            .execution_options(synchronize_session=False)
         ).all()
-        if not all_schedules:
+        if not updated:
             logger.info("No need to update schedules")
             return
-        for schedule in all_schedules:
-            # count all the schedules with this name and type
-            sch_count = db_session.scalar(
-                select(func.count(Schedule.id))
-                .filter_by(type=schedule.type, name=schedule.name))
-            sch_increment = timedelta(
-                days=schedule.update_interval * sch_count)
-            # increment dates until update date is in the future
-            next_date = schedule.next_date
-            update_date = schedule.update_date
-            while update_date <= date.today():
-                next_date += sch_increment
-                update_date += sch_increment
-            schedule.next_date = next_date
-            schedule.update_date = update_date
-            if schedule.type == "group":
-                logger.debug("Schedule '%s' group '%d' will be updated",
-                            schedule.name, schedule.elem_id)
-            else:
-                logger.debug("Schedule '%s' user '%s' will be updated",
-                            schedule.name,
-                            db_session.get(User, schedule.elem_id).name)
+        user_names = dict(db_session.execute(
+            select(User.id, User.name)
+            .filter(User.id.in_([schedule.elem_id for schedule in updated
+                                 if schedule.type != "group"])))
+            .tuples().all())
         db_session.commit()
-        if len(all_schedules) == 1:
-            logger.info("1 schedule updated")
+    for schedule in updated:
+        if schedule.type == "group":
+            logger.debug("Schedule '%s' group '%d' will be updated",
+                        schedule.name, schedule.elem_id)
         else:
-            logger.info("%d schedules updated", len(all_schedules))
+            logger.debug("Schedule '%s' user '%s' will be updated",
+                        schedule.name,
+                        user_names.get(schedule.elem_id, schedule.elem_id))
+    if len(updated) == 1:
+        logger.info("1 schedule updated")
+    else:
+        logger.info("%d schedules updated", len(updated))
 
 
 @sch_bp.before_request
-@login_required
 def user_logged_in():
-    """Require user logged in for all routes."""
+    """Require user logged in for all routes (except the calendar feed,
+    authenticated by its token)."""
+    if request.endpoint != "sch.calendar_feed":
+        return login_required(lambda: None)()
+    return None
+
+
+# region: projection
+class Occurrence(NamedTuple):
+    """Scheduled date of a schedule element.
+
+    :param schedule: schedule name
+    :param elem_id: schedule element id (group number | user id)
+    :param date: scheduled date
+    """
+    schedule: str
+    elem_id: int
+    date: date
+
+
+class Projection(NamedTuple):
+    """Registered schedule element with its repeating cycle.
+
+    :param elem_id: schedule element id (group number | user id)
+    :param next_date: scheduled element date
+    :param cycle: days until the element is scheduled again
+        (`update_interval` times the number of elements)
+    """
+    elem_id: int
+    next_date: date
+    cycle: int
+
+
+def _element_occurrences(name: str,
+                         elem: Projection,
+                         start: date,
+                         end: date) -> Iterator[Occurrence]:
+    """Occurrences of a schedule element between `start` and `end`."""
+    first_cycle = -((elem.next_date - start).days // elem.cycle)
+    last_cycle = (end - elem.next_date).days // elem.cycle
+    for cycle in range(first_cycle, last_cycle + 1):
+        yield Occurrence(name,
+                         elem.elem_id,
+                         elem.next_date + timedelta(days=elem.cycle * cycle))
+
+
+def project(name: str,
+            projections: Sequence[Projection],
+            start: date,
+            end: date) -> Iterator[Occurrence]:
+    """Every occurrence between `start` and `end` (inclusive) in date order.
+
+    The first and last cycle of each element inside the range are computed
+    directly, so the cost depends only on the number of occurrences.
+
+    :param name: schedule name
+    :param projections: the schedule elements (see `BaseSchedule.projection`)
+    :param start: first date of the range
+    :param end: last date of the range
+    """
+    return merge(*(_element_occurrences(name, elem, start, end)
+                   for elem in projections),
+                 key=attrgetter("date"))
+# endregion
 
 
 @dataclass
@@ -109,18 +199,14 @@ class BaseSchedule():
     def _determine_first_date(self) -> date:
         """Figure out schedule's first start date
         based on `start_date` and `sch_day`."""
-        first_date = self.start_date
-        while first_date.isoweekday() != self.sch_day:
-            first_date += timedelta(days=1)
-        return first_date
+        return self.start_date + timedelta(
+            days=(self.sch_day - self.start_date.isoweekday()) % 7)
 
     def _determine_update_date(self, ref_date: date) -> date:
         """Return schedule specific update date based on a reference date."""
         # make sure update date is not the same day as next date
-        update_date = ref_date + timedelta(days=1)
-        while update_date.isoweekday() != self.sch_day_update:
-            update_date += timedelta(days=1)
-        return update_date
+        return ref_date + timedelta(
+            days=(self.sch_day_update - ref_date.isoweekday() - 1) % 7 + 1)
 
     def _registered_first_date(self) -> date:
         """Get schedule's registered first next date"""
@@ -178,6 +264,49 @@ class BaseSchedule():
         """Get schedule data for displaying on the schedules page."""
         raise NotImplementedError
 
+    def build_data(self, rows: Sequence[Row]) -> list[list[str]]:
+        """Schedule data for displaying on the schedules page (see `data`)
+        from its already read rows."""
+        raise NotImplementedError
+
+    def user_elem_id(self, user: User) -> int:
+        """Schedule element id of a user (group number | user id)."""
+        raise NotImplementedError
+
+    def projection(self,
+                   elem_ids: Optional[Sequence[int]] = None
+                   ) -> list[Projection]:
+        """Registered elements with their repeating cycle.
+
+        :param elem_ids: only these elements (all if `None`)
+        """
+        elements = (
+            select(Schedule.elem_id,
+                   Schedule.next_date,
+                   (Schedule.update_interval * func.count().over())
+                   .label("cycle"))
+            .filter_by(name=self.name)
+            .subquery())
+        statement = select(elements).order_by(elements.c.next_date)
+        if elem_ids is not None:
+            statement = statement.filter(elements.c.elem_id.in_(elem_ids))
+        with dbSession() as db_session:
+            return [Projection(*row) for row in db_session.execute(statement)]
+
+    def occurrences(self,
+                    start: date,
+                    end: date,
+                    elem_ids: Optional[Sequence[int]] = None
+                    ) -> Iterator[Occurrence]:
+        """Every occurrence between `start` and `end` (inclusive) in date
+        order, assuming the schedule doesn't change.
+
+        :param start: first date of the range
+        :param end: last date of the range
+        :param elem_ids: only these elements (all if `None`)
+        """
+        return project(self.name, self.projection(elem_ids), start, end)
+
 
 @dataclass
 class GroupSchedule(BaseSchedule):
@@ -204,13 +333,15 @@ class GroupSchedule(BaseSchedule):
                 self.first_group not in range(1, self.num_groups + 1)):
             raise ValueError("First group attribute is not valid")
 
+    def user_elem_id(self, user: User) -> int:
+        """Group number of a user."""
+        return getattr(user, self.user_attr)
+
     def _group_order(self) -> list[int]:
         """Order groups based on first group."""
         group_order = list(range(1, self.num_groups + 1))
-        if self.first_group != 1:
-            while group_order[0] != self.first_group:
-                group_order.append(group_order.pop(0))
-        return group_order
+        return (group_order[self.first_group - 1:] +
+                group_order[:self.first_group - 1])
 
     def register(self) -> None:
         """Register the schedule in the database."""
@@ -218,22 +349,23 @@ class GroupSchedule(BaseSchedule):
             logger.warning("Schedule '%s' (register): already exists",
                         self.name)
             return
-        schedule_records = []
         next_date = self._determine_first_date()
         update_date = self._determine_update_date(next_date)
-        for group_no in self._group_order():
-            schedule_records.append(
-                Schedule(
-                    name=self.name,
-                    type="group",
-                    elem_id=group_no,
-                    next_date=next_date,
-                    update_date=update_date,
-                    update_interval=self.switch_interval.days))
-            next_date += self.switch_interval
-            update_date += self.switch_interval
-        if schedule_records:
-            with dbSession() as db_session:
+        # uniqueness is enforced by the schedules unique constraint
+        with dbSession() as db_session, unique_by_constraint(db_session):
+            schedule_records = []
+            for group_no in self._group_order():
+                schedule_records.append(
+                    Schedule(
+                        name=self.name,
+                        type="group",
+                        elem_id=group_no,
+                        next_date=next_date,
+                        update_date=update_date,
+                        update_interval=self.switch_interval.days))
+                next_date += self.switch_interval
+                update_date += self.switch_interval
+            if schedule_records:
                 db_session.add_all(schedule_records)
                 db_session.commit()
                 logger.info("Schedule '%s' created", self.name)
@@ -257,50 +389,60 @@ class GroupSchedule(BaseSchedule):
             ...
         ]
         """
-        if not self._is_registered():
-            self.register()
+        with dbSession() as db_session:
+            if not (rows := self._data_rows(db_session)):
+                self.register()
+                rows = self._data_rows(db_session)
+        return self.build_data(rows)
+
+    def build_data(self, rows: Iterable[Row]) -> list[list[str]]:
+        """Group schedule data from its rows (`elem_id`, `next_date`,
+        `update_interval`, `name`) ordered by group and name."""
         data = []
-        for group in range(1, self.num_groups + 1):
+        for _, group_rows in groupby(rows, key=lambda row: row.elem_id):
+            group_rows = list(group_rows)
             group_data = []
-            with dbSession() as db_session:
-                # index [0] - names
-                group_names = db_session.scalars(
-                    select(User.name)
-                    .filter_by(in_use=True, reg_req=False)
-                    .filter(getattr(User, self.user_attr)==group)
-                    .order_by(func.lower(User.name))).all()
-                group_data.append(group_names)
-                # index [1] - dates
-                group_dates = []
-                group_next_date = db_session.scalar(
-                    select(Schedule.next_date)
-                    .filter_by(
-                        name = self.name,
-                        elem_id = group))
-                group_interval = db_session.scalar(
-                    select(Schedule.update_interval)
-                    .filter_by(
-                        name = self.name,
-                        elem_id = group)) * self.num_groups
-            next_date = group_next_date
-            for _ in range(3):
-                group_dates.append(next_date.strftime("%d.%m.%Y"))
-                next_date += timedelta(days=group_interval)
-            group_data.append(group_dates)
+            # index [0] - names
+            group_data.append([row.name for row in group_rows if row.name])
+            # index [1] - dates
+            group_next_date = group_rows[0].next_date
+            group_interval = group_rows[0].update_interval * self.num_groups
+            group_data.append([
+                (group_next_date + timedelta(days=group_interval * cycle))
+                .strftime("%d.%m.%Y")
+                for cycle in range(3)])
             # index [2] - flag if groups next date is this week
-            if (group_next_date.isocalendar()[1] ==
-                    date.today().isocalendar()[1]):
-                group_data.append(True)
-            else:
-                group_data.append(False)
+            group_data.append(group_next_date.isocalendar()[1] ==
+                              date.today().isocalendar()[1])
             data.append(group_data)
         return data
 
+    def _data_rows(self, db_session: Session) -> Sequence[Row]:
+        """Schedule groups joined with their members' names (one row per
+        member, a `None` name for groups without members)."""
+        return db_session.execute(
+            select(Schedule.elem_id,
+                   Schedule.next_date,
+                   Schedule.update_interval,
+                   User.name)
+            .select_from(Schedule)
+            .outerjoin(User, and_(
+                getattr(User, self.user_attr) == Schedule.elem_id,
+                User.in_use.is_(True),
+                User.reg_req.is_(False)))
+            .filter(Schedule.name == self.name)
+            .order_by(Schedule.elem_id, func.lower(User.name))
+        ).all()
+
 
 @dataclass
 class IndivSchedule(BaseSchedule):
     """Individual schedule for users."""
 
+    def user_elem_id(self, user: User) -> int:
+        """Id of a user."""
+        return user.id
+
     def current_order(self) -> list[int]:
         """Schedule user id's current order."""
         with dbSession() as db_session:
@@ -320,11 +462,44 @@ class IndivSchedule(BaseSchedule):
                 return False
         return True
 
-    def _valid_pos(self, pos: int) -> bool:
-        """Validate a new position in the list of id's"""
-        if 0 <= pos < len(self.current_order()):
-            return True
-        return False
+    def _row(self, db_session: Session, user_id: int) -> Optional[Row]:
+        """Schedule row (`id`, `next_date`, `update_date`) of a user."""
+        return db_session.execute(
+            select(Schedule.id, Schedule.next_date, Schedule.update_date)
+            .filter_by(name=self.name, elem_id=user_id)).first()
+
+    def _slot(self, db_session: Session, pos: int) -> Optional[Row]:
+        """Schedule row (`id`, `next_date`, `update_date`) at a position
+        (0 indexed)."""
+        return db_session.execute(
+            select(Schedule.id, Schedule.next_date, Schedule.update_date)
+            .filter_by(name=self.name)
+            .order_by(Schedule.next_date)
+            .offset(pos)
+            .limit(1)).first()
+
+    def _move_rows(self,
+                   db_session: Session,
+                   slots: int,
+                   *criteria: ColumnElement[bool]) -> None:
+        """Move the schedule rows matching `criteria` by a number of
+        positions (negative to move them earlier).
+
+        :param db_session: session of the reorder transaction
+        :param slots: number of positions
+        :param criteria: which rows to move (besides the schedule name)
+        """
+        shift = Schedule.update_interval * slots
+        db_session.execute(
+            update(Schedule)
+            .filter_by(name=self.name)
+            .filter(*criteria)
+            .values(
+                next_date=func.date(
+                    func.julianday(Schedule.next_date) + shift),
+                update_date=func.date(
+                    func.julianday(Schedule.update_date) + shift))
+            .execution_options(synchronize_session=False))
 
     def _reg_mod(self,
                  user_ids_order: list[int] = None,
@@ -371,37 +546,24 @@ class IndivSchedule(BaseSchedule):
 
         # register schedule
         update_date = self._determine_update_date(next_date)
-        schedule_records = []
-        for user_id in user_ids_order:
-            schedule_records.append(
-                Schedule(
-                    name=self.name,
-                    type="individual",
-                    elem_id=user_id,
-                    next_date=next_date,
-                    update_date=update_date,
-                    update_interval=self.switch_interval.days))
-            next_date += self.switch_interval
-            update_date += self.switch_interval
-        with dbSession() as db_session:
+        # uniqueness is enforced by the schedules unique constraint
+        with dbSession() as db_session, unique_by_constraint(db_session):
+            schedule_records = []
+            for user_id in user_ids_order:
+                schedule_records.append(
+                    Schedule(
+                        name=self.name,
+                        type="individual",
+                        elem_id=user_id,
+                        next_date=next_date,
+                        update_date=update_date,
+                        update_interval=self.switch_interval.days))
+                next_date += self.switch_interval
+                update_date += self.switch_interval
             db_session.add_all(schedule_records)
             db_session.commit()
             return True
 
-    def _modify(self,
-                 user_ids_order: list[int] = None,
-                 start_date: date = None
-                 ) -> None:
-        """Modify the schedule in the database.
-
-        :param user_ids_order: modification user order (list of user id's)
-        :param start_date: first next_date;
-            can be in the past but has to be this week
-        """
-        if self._reg_mod(user_ids_order, start_date, "modify"):
-            logger.info("Schedule '%s' modified",
-                        self.name)
-
     def register(self,
                  user_ids_order: list[int] = None,
                  start_date: date = None
@@ -428,25 +590,24 @@ class IndivSchedule(BaseSchedule):
             ...
         ]
         """
-        data = []
-        if not self._is_registered():
-            logger.warning("Schedule '%s' (data): is not registered",
-                           self.name)
-            return data
         with dbSession() as db_session:
             schedule_records = db_session.execute(
-                select(Schedule.elem_id, Schedule.next_date)
-                .filter_by(name=self.name)
-                .order_by(Schedule.next_date)).unique().all()
-        for record in schedule_records:
-            record_data=[]
-            # index [0] - name
-            with dbSession() as db_session:
-                record_data.append(db_session.get(User, record.elem_id).name)
-            # index [1] - date
-            record_data.append(record.next_date.strftime("%d.%m.%Y"))
-            data.append(record_data)
-        return data
+                select(User.name, Schedule.next_date)
+                .select_from(Schedule)
+                .join(User, User.id == Schedule.elem_id)
+                .filter(Schedule.name == self.name)
+                .order_by(Schedule.next_date)).all()
+        return self.build_data(schedule_records)
+
+    def build_data(self, rows: Sequence[Row]) -> list[list[str]]:
+        """Individual schedule data from its rows (`name`, `next_date`)
+        ordered by date."""
+        if not rows:
+            logger.warning("Schedule '%s' (data): is not registered",
+                           self.name)
+        # index [0] - name, index [1] - date
+        return [[row.name, row.next_date.strftime("%d.%m.%Y")]
+                for row in rows]
 
     def add_user(self, user_id: int) -> None:
         """Add a new user to the schedule.
@@ -471,7 +632,7 @@ class IndivSchedule(BaseSchedule):
 
         next_date = self._registered_last_date() + self.switch_interval
         update_date = self._registered_last_update_date() + self.switch_interval
-        with dbSession() as db_session:
+        with dbSession() as db_session, unique_by_constraint(db_session):
             db_session.add(
                 Schedule(
                     name=self.name,
@@ -500,21 +661,18 @@ class IndivSchedule(BaseSchedule):
             logger.warning("Schedule '%s' (remove_user): invalid user_id '%s'",
                            self.name, user_id)
             return
-        users_order = self.current_order()
-        if user_id not in users_order:
-            logger.warning("Schedule '%s' (remove_user): " +
-                        "user with id '%d' is not in the schedule",
-                        self.name, user_id)
-            return
-
-        # remove the user
-        users_order.pop(users_order.index(user_id))
-        # register the new order
-        first_date = self._registered_first_date()
-        self.unregister()
-        self._modify(
-            user_ids_order=users_order,
-            start_date=first_date)
+        # the following users move one position earlier
+        with dbSession() as db_session:
+            row = self._row(db_session, user_id)
+            if not row:
+                logger.warning("Schedule '%s' (remove_user): " +
+                            "user with id '%d' is not in the schedule",
+                            self.name, user_id)
+                return
+            db_session.execute(delete(Schedule).filter_by(id=row.id))
+            self._move_rows(db_session, -1,
+                            Schedule.next_date > row.next_date)
+            db_session.commit()
         logger.debug("Schedule '%s' removed user with id '%d'",
                     self.name, user_id)
 
@@ -535,74 +693,395 @@ class IndivSchedule(BaseSchedule):
             logger.warning("Schedule '%s' (change_user_pos): " +
                            "invalid user_id '%s'", self.name, user_id)
             return
-        if not isinstance(new_pos, int) or not self._valid_pos(new_pos):
-            logger.warning("Schedule '%s' (change_user_pos): " +
-                           "invalid new position '%s'", self.name, new_pos)
-            return
-        users_order = self.current_order()
-        if user_id not in users_order:
-            logger.warning("Schedule '%s' (change_user_pos): " +
-                           "user with id '%d' is not in the schedule",
-                           self.name, user_id)
-            return
-        if users_order[new_pos] == user_id:
-            logger.warning("Schedule '%s' (change_user_pos): " +
-                           "user with id '%d' is already at position %d",
-                           self.name, user_id, new_pos)
-            return
-
-        # reorder the list of user id's
-        users_order.pop(users_order.index(user_id))
-        users_order.insert(new_pos, user_id)
-        # register the new order
-        first_date = self._registered_first_date()
-        self.unregister()
-        self._modify(
-            user_ids_order=users_order,
-            start_date=first_date)
+        # only the users between the old and the new position move
+        with dbSession() as db_session:
+            target = (self._slot(db_session, new_pos)
+                      if isinstance(new_pos, int) and new_pos >= 0 else None)
+            if not target:
+                logger.warning("Schedule '%s' (change_user_pos): " +
+                               "invalid new position '%s'", self.name, new_pos)
+                return
+            row = self._row(db_session, user_id)
+            if not row:
+                logger.warning("Schedule '%s' (change_user_pos): " +
+                               "user with id '%d' is not in the schedule",
+                               self.name, user_id)
+                return
+            if target.id == row.id:
+                logger.warning("Schedule '%s' (change_user_pos): " +
+                               "user with id '%d' is already at position %d",
+                               self.name, user_id, new_pos)
+                return
+            if target.next_date < row.next_date:
+                self._move_rows(db_session, 1,
+                                Schedule.next_date >= target.next_date,
+                                Schedule.next_date < row.next_date)
+            else:
+                self._move_rows(db_session, -1,
+                                Schedule.next_date > row.next_date,
+                                Schedule.next_date <= target.next_date)
+            db_session.execute(
+                update(Schedule)
+                .filter_by(id=row.id)
+                .values(next_date=target.next_date,
+                        update_date=target.update_date)
+                .execution_options(synchronize_session=False))
+            db_session.commit()
         logger.debug("Schedule '%s' changed user with id '%d' position to '%d'",
                     self.name, user_id, new_pos)
 
 
-# region: group schedules init
-saturday_sch = GroupSchedule(
-    name=sat_sch_info.en_name,
-    user_attr=User.sat_group.name,
-    num_groups=2,
-    first_group=1,
-    sch_day=sat_sch_info.sch_day,
-    sch_day_update=sat_sch_info.sch_day_update,
-    switch_interval=timedelta(weeks=sat_sch_info.switch_interval),
-    start_date=date.today())
-# saturday_sch.register()
+# region: schedules registry
+class RegisteredSchedule(NamedTuple):
+    """Schedule registry entry.
+
+    :param info: schedule display information
+    :param schedule: the schedule
+    """
+    info: ScheduleInfo
+    schedule: BaseSchedule
+
+
+@dataclass
+class ScheduleRegistry():
+    """All the app schedules, handled together so that their number doesn't
+    change the number of queries.
+
+    :param entries: registered schedules by name
+    """
+
+    entries: dict[str, RegisteredSchedule] = field(default_factory=dict)
+
+    @classmethod
+    def from_config(cls, infos: Iterable[ScheduleInfo]) -> "ScheduleRegistry":
+        """Registry of the configured schedules.
+
+        :param infos: schedules information (see `blueprints.sch.SCHEDULES`)
+        """
+        registry = cls()
+        for info in infos:
+            registry.add(info)
+        return registry
+
+    def add(self, info: ScheduleInfo) -> BaseSchedule:
+        """Create a schedule from its information and add it to the registry.
+
+        :param info: schedule information
+        """
+        schedule = self.build(info)
+        self.entries[info.en_name] = RegisteredSchedule(info, schedule)
+        return schedule
+
+    @staticmethod
+    def build(info: ScheduleInfo) -> BaseSchedule:
+        """Create a schedule from its information.
+
+        :param info: schedule information
+        """
+        if info.type == "group":
+            return GroupSchedule(
+                name=info.en_name,
+                user_attr=info.user_attr,
+                num_groups=info.num_groups,
+                first_group=info.first_group,
+                sch_day=info.sch_day,
+                sch_day_update=info.sch_day_update,
+                switch_interval=timedelta(weeks=info.switch_interval),
+                start_date=date.today())
+        if info.type == "individual":
+            return IndivSchedule(
+                name=info.en_name,
+                sch_day=info.sch_day,
+                sch_day_update=info.sch_day_update,
+                switch_interval=timedelta(weeks=info.switch_interval),
+                start_date=date.today())
+        raise ValueError(f"Invalid schedule type '{info.type}'")
+
+    def __getitem__(self, name: str) -> BaseSchedule:
+        return self.entries[name].schedule
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __iter__(self) -> Iterator[RegisteredSchedule]:
+        return iter(self.entries.values())
+
+    @classmethod
+    def from_row(cls, name: str, sch_type: str, row: Row
+                 ) -> Optional[RegisteredSchedule]:
+        """Registry entry of a schedule found only in the database (`None`
+        if it can't be rebuilt).
+
+        Only individual schedules can be rebuilt from their rows (group
+        schedules need the user attribute holding the group).
+
+        :param name: schedule name
+        :param sch_type: schedule type
+        :param row: any row of the schedule (`next_date`, `update_date`,
+            `update_interval`)
+        """
+        if sch_type != "individual" or row.update_interval % 7:
+            logger.warning("Schedule '%s' (registry): cannot be loaded "
+                           "from the database", name)
+            return None
+        info = ScheduleInfo(
+            type=sch_type,
+            en_name=name,
+            name=name,
+            positive="",
+            negative="",
+            sch_day=row.next_date.isoweekday(),
+            sch_day_update=row.update_date.isoweekday(),
+            switch_interval=row.update_interval // 7)
+        return RegisteredSchedule(info, cls.build(info))
+
+    def _members_join(self) -> ColumnElement[bool]:
+        """Join condition of the schedules rows with their users."""
+        conditions = [
+            and_(Schedule.type == "individual", User.id == Schedule.elem_id)]
+        for entry in self:
+            if isinstance(entry.schedule, GroupSchedule):
+                conditions.append(and_(
+                    Schedule.name == entry.schedule.name,
+                    getattr(User, entry.schedule.user_attr) ==
+                    Schedule.elem_id,
+                    User.in_use.is_(True),
+                    User.reg_req.is_(False)))
+        return or_(*conditions)
+
+    def page_data(self) -> tuple[list[list], list[list]]:
+        """Group and individual schedules data for the schedules page
+        (`[name, data]` items), read with one query for all the schedules.
+
+        Individual schedules found only in the database are listed too,
+        without being added to the registry (see `from_row`).
+        """
+        with dbSession() as db_session:
+            rows = db_session.execute(
+                select(Schedule.name.label("schedule"),
+                       Schedule.type,
+                       Schedule.elem_id,
+                       Schedule.next_date,
+                       Schedule.update_date,
+                       Schedule.update_interval,
+                       User.name)
+                .select_from(Schedule)
+                .outerjoin(User, self._members_join())
+                .order_by(Schedule.name,
+                          case((Schedule.type == "group", Schedule.elem_id),
+                               else_=0),
+                          Schedule.next_date,
+                          func.lower(User.name))).all()
+        # this request's view of the registry: the registry is shared by
+        # all the requests and isn't changed here
+        entries = list(self)
+        rows_by_schedule = {}
+        for name, schedule_rows in groupby(rows,
+                                           key=attrgetter("schedule")):
+            schedule_rows = list(schedule_rows)
+            if name in self:
+                rows_by_schedule[name] = schedule_rows
+            elif entry := self.from_row(name, schedule_rows[0].type,
+                                        schedule_rows[0]):
+                entries.append(entry)
+                rows_by_schedule[name] = schedule_rows
+        group_schedules = []
+        indiv_schedules = []
+        for info, schedule in entries:
+            schedule_rows = rows_by_schedule.get(schedule.name, [])
+            if isinstance(schedule, GroupSchedule):
+                group_schedules.append(
+                    [info.name,
+                     schedule.build_data(schedule_rows)
+                     if schedule_rows else schedule.data()])
+            else:
+                indiv_schedules.append(
+                    [info.name,
+                     schedule.build_data(
+                         [row for row in schedule_rows if row.name])])
+        return group_schedules, indiv_schedules
+
+    def user_projections(self, user: User) -> dict[str, list[Projection]]:
+        """Projections of a user's elements in every schedule (by schedule
+        name), read with one query.
+
+        Individual schedules found only in the database are projected too,
+        after the registered ones (the registry isn't changed).
+
+        :param user: the user
+        """
+        elements = (
+            select(Schedule.name,
+                   Schedule.elem_id,
+                   Schedule.next_date,
+                   (Schedule.update_interval *
+                    func.count().over(partition_by=Schedule.name))
+                   .label("cycle"))
+            .filter(or_(Schedule.name.in_(self.entries),
+                        and_(Schedule.type == "individual",
+                             Schedule.update_interval % 7 == 0)))
+            .subquery())
+        user_elements = [(entry.schedule.name,
+                          entry.schedule.user_elem_id(user))
+                         for entry in self]
+        projections = {name: [] for name in self.entries}
+        with dbSession() as db_session:
+            for row in db_session.execute(
+                    select(elements)
+                    .filter(or_(tuple_(elements.c.name, elements.c.elem_id)
+                                .in_(user_elements),
+                                and_(elements.c.name.not_in(self.entries),
+                                     elements.c.elem_id == user.id)))
+                    .order_by(elements.c.name, elements.c.next_date)):
+                projections.setdefault(row.name, []).append(
+                    Projection(row.elem_id, row.next_date, row.cycle))
+        return projections
 # endregion
 
-# region: individual schedules init
-cleaning_sch = IndivSchedule(
-    name=clean_sch_info.en_name,
-    sch_day=clean_sch_info.sch_day,
-    sch_day_update=clean_sch_info.sch_day_update,
-    switch_interval=timedelta(weeks=clean_sch_info.switch_interval),
-    start_date=date.today())
-# cleaning_sch.register()
+# region: schedules init
+schedule_registry = ScheduleRegistry.from_config(SCHEDULES)
+saturday_sch: GroupSchedule = schedule_registry[sat_sch_info.en_name]
+cleaning_sch: IndivSchedule = schedule_registry[clean_sch_info.en_name]
 # endregion
 
 
-@sch_bp.route("")
+class FeedForm(FlaskForm):
+    """Flask-WTF form used just for csrf token."""
+
+
+@sch_bp.route("", methods=["GET", "POST"])
 def schedules():
     """Schedules page."""
     logger.info("Schedules page")
     session["last_url"] = url_for(".schedules")
+    feed_form: FeedForm = FeedForm()
+    if feed_form.validate_on_submit():
+        reset_feed(session["user_id"])
+        flash(**Message.Schedule.FeedReset.flash())
+        return redirect(url_for(".schedules"))
+    elif feed_form.errors:
+        logger.warning("Calendar feed reset error(s)")
+        flash_errors(feed_form.errors)
 
-    # schedule view registration
-    group_schedules = []
-    group_schedules.append(
-        [sat_sch_info.name, saturday_sch.data()])
-
-    indiv_schedules = []
-    indiv_schedules.append(
-        [clean_sch_info.name, cleaning_sch.data()])
+    group_schedules, indiv_schedules = schedule_registry.page_data()
+    with dbSession() as db_session:
+        user = db_session.get(User, session["user_id"])
 
     return render_template("sch/schedules.html",
                            group_schedules=group_schedules,
-                           indiv_schedules=indiv_schedules)
+                           indiv_schedules=indiv_schedules,
+                           form=feed_form,
+                           feed_url=url_for(
+                               ".calendar_feed",
+                               token=feed_token(user),
+                               _external=True))
+
+
+# region: calendar feed
+def _feed_serializer() -> URLSafeSerializer:
+    """Signer of the calendar feed tokens."""
+    return URLSafeSerializer(current_app.secret_key, salt="schedule-feed")
+
+
+def feed_token(user: User) -> str:
+    """Token of a user's calendar feed url (user id and feed version)."""
+    return _feed_serializer().dumps([user.id, user.feed_version])
+
+
+def reset_feed(user_id: int) -> None:
+    """Revoke a user's calendar feed url: the tokens of the previous feed
+    version are no longer valid.
+
+    :param user_id: id of the user
+    """
+    with dbSession() as db_session:
+        db_session.execute(
+            update(User)
+            .filter_by(id=user_id)
+            .values(feed_version=User.feed_version + 1))
+        db_session.commit()
+    logger.debug("Calendar feed reset")
+
+
+def _ics_text(value: str) -> str:
+    """Escape an iCalendar text value."""
+    return (value.replace("\\", "\\\\")
+            .replace(";", "\\;")
+            .replace(",", "\\,")
+            .replace("\n", "\\n"))
+
+
+def ics_lines(occurrences: Iterable[Occurrence],
+              summaries: dict[str, str],
+              stamp: datetime) -> Iterator[str]:
+    """iCalendar document of all day events, line by line.
+
+    :param occurrences: the events
+    :param summaries: events title by schedule name
+    :param stamp: generation time (UTC) of the document (`DTSTAMP`)
+    """
+    stamp_text = stamp.strftime("%Y%m%dT%H%M%SZ")
+    yield "BEGIN:VCALENDAR\r\n"
+    yield "VERSION:2.0\r\n"
+    yield "PRODID:-//Inventory//Schedules//EN\r\n"
+    yield "CALSCALE:GREGORIAN\r\n"
+    yield "METHOD:PUBLISH\r\n"
+    for occurrence in occurrences:
+        day = occurrence.date.strftime("%Y%m%d")
+        uid = "-".join(occurrence.schedule.lower().split())
+        yield ("BEGIN:VEVENT\r\n"
+               f"UID:{uid}-{occurrence.elem_id}-{day}@inventory\r\n"
+               f"DTSTAMP:{stamp_text}\r\n"
+               f"DTSTART;VALUE=DATE:{day}\r\n"
+               "DTEND;VALUE=DATE:"
+               f"{(occurrence.date + timedelta(days=1)).strftime('%Y%m%d')}"
+               "\r\n"
+               f"SUMMARY:{_ics_text(summaries[occurrence.schedule])}\r\n"
+               "END:VEVENT\r\n")
+    yield "END:VCALENDAR\r\n"
+
+
+@sch_bp.route("/feed/<token>.ics")
+def calendar_feed(token: str):
+    """User's schedules calendar feed (iCalendar)."""
+    try:
+        payload = _feed_serializer().loads(token)
+    except BadSignature:
+        abort(404)
+    if not isinstance(payload, list) or len(payload) != 2:
+        abort(404)
+    user_id, feed_version = payload
+    user = request_session().get(User, user_id)
+    if (not user or not user.in_use or user.reg_req or
+            user.feed_version != feed_version):
+        abort(404)
+    logger.info("Calendar feed")
+    start = date.today() - timedelta(weeks=Constant.Schedule.Feed.past_weeks)
+    end = date.today() + timedelta(weeks=Constant.Schedule.Feed.future_weeks)
+    projections = schedule_registry.user_projections(user)
+    # schedules found only in the database are titled by their name
+    titles = {schedule.name: str(info.name)
+              for info, schedule in schedule_registry}
+    feeds = [(titles.get(name, name), name, elements)
+             for name, elements in projections.items()]
+    # the feed events are fully determined by the range and the projections
+    # (DTSTAMP is the generation time)
+    etag = sha1(repr((start, end, feeds)).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        occurrences = merge(*(project(name, projections, start, end)
+                              for _, name, projections in feeds),
+                            key=attrgetter("date"))
+        summaries = {name: summary for summary, name, _ in feeds}
+        response = Response(
+            stream_with_context(ics_lines(occurrences, summaries,
+                                          datetime.now(timezone.utc))),
+            mimetype="text/calendar")
+        response.headers["Content-Disposition"] = \
+            "inline; filename=schedules.ics"
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+# endregion
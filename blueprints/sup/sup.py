@@ -13,7 +13,9 @@ from wtforms import (BooleanField, IntegerField, SelectField, StringField,
 from wtforms.validators import InputRequired, Length
 
 from constants import Constant
-from database import Category, Product, Supplier, User, dbSession
+from database import (Category, Product, Supplier, User, dbSession,
+                      global_stats, load_products_counters, merge_into,
+                      reassign_responsible, reference_choices)
 from helpers import admin_required, flash_errors, logger
 from messages import Message
 
@@ -94,6 +96,19 @@ class ReassignSupForm(FlaskForm):
                 })
 
 
+class MergeSupForm(FlaskForm):
+    """Merge supplier form."""
+    merge = SubmitField(
+        label=lazy_gettext("Merge"),
+        render_kw={"class": "btn btn-danger"})
+    target_id = SelectField(
+        label=lazy_gettext("Merge into"),
+        coerce=int,
+        render_kw={
+                "class": "form-select",
+                })
+
+
 @sup_bp.route("/suppliers")
 def suppliers():
     """All suppliers page."""
@@ -103,15 +118,10 @@ def suppliers():
         supps = db_session.scalars(
                 select(Supplier).
                 order_by(Supplier.in_use.desc(), func.lower(Supplier.name)).
-                options(joinedload(Supplier.products), raiseload("*"))
-                ).unique().all()
-        stats = {
-            "all_suppliers": db_session.scalar(
-                select(func.count(Supplier.id))),
-            "in_use_suppliers": db_session.scalar(
-                select(func.count(Supplier.id))
-                .filter_by(in_use=True)),
-        }
+                options(raiseload("*"))
+                ).all()
+        load_products_counters(db_session, supps)
+        stats = global_stats(db_session)
     return render_template(
         "sup/suppliers.html",
         suppliers=supps,
@@ -209,16 +219,15 @@ def reassign_supplier(supplier):
     logger.info("Reassign products supplier '%s' page", supplier)
     reassign_sup_form: ReassignSupForm = ReassignSupForm()
 
-    with dbSession() as db_session:
-        users = db_session.execute(
-            select(User.id, User.name)
-            .filter_by(in_use=True, reg_req=False)
-            .order_by(func.lower(User.name))
-            ).all()
     reassign_sup_form.responsible_id.choices = [
         (0, Message.Supplier.Responsible.Default())]
-    reassign_sup_form.responsible_id.choices.extend(
-        [(user.id, user.name) for user in users])
+    reassign_sup_form.responsible_id.choices.extend(reference_choices(User))
+    merge_sup_form: MergeSupForm = MergeSupForm()
+    merge_sup_form.target_id.choices = [
+        (0, Message.Supplier.Merge.Default())]
+    merge_sup_form.target_id.choices.extend(
+        choice for choice in reference_choices(Supplier)
+        if choice[1] != supplier)
 
     if reassign_sup_form.validate_on_submit():
         if reassign_sup_form.responsible_id.data:
@@ -226,16 +235,21 @@ def reassign_supplier(supplier):
                 sup = db_session.scalar(
                     select(Supplier)
                     .filter_by(name=escape(supplier)))
-                products = db_session.scalars(
-                    select(Product)
-                    .filter_by(supplier_id=sup.id)
-                    ).all()
-                for product in products:
-                    product.responsible_id = (reassign_sup_form
-                                              .responsible_id.data)
-                db_session.commit()
-                logger.debug("Supplier '%s' responsible updated", sup.name)
-                flash(**Message.Supplier.Responsible.Updated.flash(sup.name))
+                if not sup:
+                    flash(**Message.Supplier.NotExists.flash(supplier))
+                    return redirect(url_for(".suppliers"))
+                try:
+                    reassign_responsible(
+                        db_session,
+                        reassign_sup_form.responsible_id.data,
+                        Product.supplier_id == sup.id)
+                except ValueError as error:
+                    flash(str(error), "error")
+                else:
+                    db_session.commit()
+                    logger.debug("Supplier '%s' responsible updated", sup.name)
+                    flash(**Message.Supplier.Responsible.Updated
+                          .flash(sup.name))
         else:
             flash(**Message.Supplier.Responsible.Invalid.flash())
         return redirect(url_for(".reassign_supplier", supplier=supplier))
@@ -268,5 +282,41 @@ def reassign_supplier(supplier):
 
     return render_template("sup/reassign_supplier.html",
                            form=reassign_sup_form,
+                           merge_form=merge_sup_form,
                            products=products,
                            Message=Message)
+
+
+@sup_bp.route("/merge/<path:supplier>", methods=["POST"])
+def merge_supplier(supplier):
+    """Move all products of the supplier to another supplier and delete it."""
+    logger.info("Merge supplier '%s'", supplier)
+    merge_sup_form: MergeSupForm = MergeSupForm()
+    merge_sup_form.target_id.choices = [
+        (0, Message.Supplier.Merge.Default())]
+    merge_sup_form.target_id.choices.extend(reference_choices(Supplier))
+    if not merge_sup_form.validate_on_submit():
+        logger.warning("Supplier merge error(s)")
+        flash_errors(merge_sup_form.errors)
+        return redirect(url_for(".reassign_supplier", supplier=supplier))
+    if not merge_sup_form.target_id.data:
+        flash(**Message.Supplier.Merge.Invalid.flash())
+        return redirect(url_for(".reassign_supplier", supplier=supplier))
+    with dbSession() as db_session:
+        if not (sup := db_session.scalar(
+                select(Supplier)
+                .filter_by(name=escape(supplier)))):
+            flash(**Message.Supplier.NotExists.flash(supplier))
+            return redirect(url_for(".suppliers"))
+        try:
+            merge_into(db_session, Supplier, sup.id,
+                       merge_sup_form.target_id.data)
+        except ValueError as error:
+            flash(str(error), "error")
+            return redirect(url_for(".reassign_supplier", supplier=supplier))
+        target = db_session.get(Supplier, merge_sup_form.target_id.data)
+        names = (sup.name, target.name)
+        db_session.commit()
+    logger.debug("Supplier '%s' merged into '%s'", *names)
+    flash(**Message.Supplier.Merge.Merged.flash(*names))
+    return redirect(url_for(".suppliers"))
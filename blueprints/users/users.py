@@ -16,7 +16,8 @@ from wtforms.validators import (Email, InputRequired, Length, NumberRange,
 from blueprints.sch import clean_sch_info, sat_sch_info
 from blueprints.sch.sch import cleaning_sch
 from constants import Constant
-from database import User, dbSession
+from database import (User, dbSession, request_session,
+                      start_inventory_check)
 from helpers import admin_required, flash_errors, logger
 from messages import Message
 
@@ -207,13 +208,9 @@ def approve_check_inv(username):
 def approve_check_inv_all():
     """Approve inventory check for all eligible users."""
     with dbSession() as db_session:
-        users = db_session.scalars(
-            select(User).filter_by(in_use=True, reg_req=False)).all()
-        for user in users:
-            if user.in_use_products:
-                user.done_inv = False
+        started = start_inventory_check(db_session)
         db_session.commit()
-        logger.debug("Approved inventory check for all")
+        logger.debug("Approved inventory check for all (%d users)", started)
 
     return redirect(url_for("main.index"))
 
@@ -255,11 +252,11 @@ def edit_user(username):
     """Edit user."""
     logger.info("Edit user '%s' page", username)
     edit_user_form: EditUserForm = EditUserForm()
+    db_session = request_session()
 
-    with dbSession() as db_session:
-        user_len = db_session.scalar(
-            select(func.count(User.id))
-            .filter_by(reg_req=False, in_use=True))
+    user_len = db_session.scalar(
+        select(func.count(User.id))
+        .filter_by(reg_req=False, in_use=True))
     clean_order_choices = (
         [(0, gettext("This week"))] +
         [(ind, gettext("In") + f" {ind} " + ngettext("week", "weeks", ind))
@@ -267,87 +264,91 @@ def edit_user(username):
     edit_user_form.clean_order.choices = clean_order_choices
 
     if edit_user_form.validate_on_submit():
-        with dbSession() as db_session:
-            # join load products to prevent flushing
-            user = db_session.scalar(
-                select(User)
-                .filter_by(name=escape(username))
-                .options(joinedload(User.products), raiseload("*")))
-            if edit_user_form.delete.data:
-                if user.all_products:
-                    flash(**Message.User.NoDelete.flash())
-                else:
-                    db_session.delete(user)
+        # join load products to prevent flushing
+        user = db_session.scalar(
+            select(User)
+            .filter_by(name=escape(username))
+            .options(joinedload(User.products), raiseload("*")))
+        if edit_user_form.delete.data:
+            if user.all_products:
+                flash(**Message.User.NoDelete.flash())
+            else:
+                db_session.delete(user)
+                db_session.commit()
+                logger.debug("User '%s' has been deleted", username)
+                cleaning_sch.remove_user(user.id)
+                flash(**Message.User.Deleted.flash(user.name))
+                if user.id == session.get("user_id"):
+                    return redirect(url_for("auth.logout"))
+                return redirect(session["last_url"])
+        else:
+            initial_in_use = user.in_use
+            schedule_updated_flag = False
+            try:
+                user.name = edit_user_form.name.data
+                if edit_user_form.password.data:
+                    user.password = edit_user_form.password.data
+                user.email = edit_user_form.email.data
+                user.sat_group = edit_user_form.sat_group.data
+                # cleaning schedule
+                if user.in_use and not user.reg_req:
+                    curr_pos = cleaning_sch.current_order()\
+                                            .index(user.id)
+                    if int(edit_user_form.clean_order.data) != curr_pos:
+                        cleaning_sch.change_user_pos(
+                            user.id,
+                            edit_user_form.clean_order.data)
+                        flash(**Message.Schedule.Updated.flash())
+                        schedule_updated_flag = True
+                user.details = edit_user_form.details.data
+                user.admin = edit_user_form.admin.data
+                user.done_inv = not edit_user_form.check_inv.data
+                user.in_use = edit_user_form.in_use.data
+                modified = db_session.is_modified(
+                    user, include_collections=False)
+                # the last admin is checked on flush
+                db_session.flush()
+            except TypeError:
+                db_session.rollback()
+                flash(**Message.Schedule.InvalidChoice.flash())
+            except ValueError as error:
+                db_session.rollback()
+                flash(str(error), "error")
+            else:
+                if modified:
+                    logger.debug("User updated")
+                    flash(**Message.User.Updated.flash(user.name))
                     db_session.commit()
-                    logger.debug("User '%s' has been deleted", username)
-                    cleaning_sch.remove_user(user.id)
-                    flash(**Message.User.Deleted.flash(user.name))
+                    if  user.in_use is not initial_in_use:
+                        # add or remove from schedule
+                        if user.in_use:
+                            cleaning_sch.add_user(user.id)
+                        else:
+                            cleaning_sch.remove_user(user.id)
                     if user.id == session.get("user_id"):
-                        return redirect(url_for("auth.logout"))
+                        session["user_name"] = user.name
+                        if not user.admin:
+                            session["admin"] = False
+                            return redirect(url_for("main.index"))
+                    return redirect(session["last_url"])
+                if schedule_updated_flag:
                     return redirect(session["last_url"])
-            else:
-                initial_in_use = user.in_use
-                schedule_updated_flag = False
-                try:
-                    user.name = edit_user_form.name.data
-                    if edit_user_form.password.data:
-                        user.password = edit_user_form.password.data
-                    user.email = edit_user_form.email.data
-                    user.sat_group = edit_user_form.sat_group.data
-                    # cleaning schedule
-                    if user.in_use and not user.reg_req:
-                        curr_pos = cleaning_sch.current_order()\
-                                                .index(user.id)
-                        if int(edit_user_form.clean_order.data) != curr_pos:
-                            cleaning_sch.change_user_pos(
-                                user.id,
-                                edit_user_form.clean_order.data)
-                            flash(**Message.Schedule.Updated.flash())
-                            schedule_updated_flag = True
-                    user.details = edit_user_form.details.data
-                    user.admin = edit_user_form.admin.data
-                    user.done_inv = not edit_user_form.check_inv.data
-                    user.in_use = edit_user_form.in_use.data
-                except TypeError:
-                    flash(**Message.Schedule.InvalidChoice.flash())
-                except ValueError as error:
-                    flash(str(error), "error")
-                else:
-                    if db_session.is_modified(user, include_collections=False):
-                        logger.debug("User updated")
-                        flash(**Message.User.Updated.flash(user.name))
-                        db_session.commit()
-                        if  user.in_use is not initial_in_use:
-                            # add or remove from schedule
-                            if user.in_use:
-                                cleaning_sch.add_user(user.id)
-                            else:
-                                cleaning_sch.remove_user(user.id)
-                        if user.id == session.get("user_id"):
-                            session["user_name"] = user.name
-                            if not user.admin:
-                                session["admin"] = False
-                                return redirect(url_for("main.index"))
-                        return redirect(session["last_url"])
-                    if schedule_updated_flag:
-                        return redirect(session["last_url"])
     elif edit_user_form.errors:
         logger.warning("User editing error(s)")
         flash_errors(edit_user_form.errors)
 
-    with dbSession() as db_session:
-        if (user := db_session.scalar(
-                select(User)
-                .filter(User.name==escape(username),
-                        User.name!="Admin"))):
-            edit_user_form = EditUserForm(obj=user)
-            if user.in_use and not user.reg_req:
-                edit_user_form.clean_order.choices = clean_order_choices
-                edit_user_form.clean_order.data = \
-                    cleaning_sch.current_order().index(user.id)
-        else:
-            flash(**Message.User.NotExists.flash(username))
-            return redirect(url_for("main.index"))
+    if (user := db_session.scalar(
+            select(User)
+            .filter(User.name==escape(username),
+                    User.name!="Admin"))):
+        edit_user_form = EditUserForm(obj=user)
+        if user.in_use and not user.reg_req:
+            edit_user_form.clean_order.choices = clean_order_choices
+            edit_user_form.clean_order.data = \
+                cleaning_sch.current_order().index(user.id)
+    else:
+        flash(**Message.User.NotExists.flash(username))
+        return redirect(url_for("main.index"))
 
     return render_template("users/edit_user.html",
                            form=edit_user_form,
@@ -10,6 +10,15 @@ class Constant:
         """Basic constants"""
         current_dir = path.dirname(path.realpath(__file__))
         db_name = "inventory.db"
+        # seconds before cached select fields choices are reloaded
+        reference_cache_ttl = 300
+        # rows fetched from the database at a time by the exports
+        export_batch_size = 1000
+        # maximum observations in a scanner inventory batch
+        scan_batch_size = 1000
+        # JSON API listings default and maximum page size
+        api_page_size = 100
+        api_max_page_size = 1000
     class User:
         """User related constants"""
         class Name:
@@ -21,6 +30,18 @@ class Constant:
             min_length = 8
             regex = re.compile(r"(?=.*\d)(?=.*[A-Z])(?=.*[!@#$%^&*_=+]).{8,}")
             symbols = "!@#$%^&*_=+"
+            class Hash:
+                """Password hashing service.
+
+                Override with `FLASK_PASSWORD_HASH_<SETTING>` environment
+                variables (ex: FLASK_PASSWORD_HASH_METHOD=scrypt:32768:8:1).
+                """
+                # werkzeug method with its cost
+                method = "pbkdf2:sha256:600000"
+                # maximum concurrent verifications
+                workers = 2
+                # seconds to wait for a verification
+                timeout = 10
     class Category:
         """Category related constants"""
         class Name:
@@ -47,8 +68,38 @@ class Constant:
         class OrdQty:
             """Product order quantity constants"""
             min_value = 1
+        class Listing:
+            """Products page constants"""
+            page_size = 50
+            # products search text
+            search_max_length = 100
+        class Import:
+            """Products import constants"""
+            # rows inserted by one `executemany`
+            batch_size = 500
+    class Schedule:
+        """Schedule related constants"""
+        class Feed:
+            """Calendar feed projected range"""
+            past_weeks = 4
+            future_weeks = 52
     class SQLite:
         """Database constants"""
         class Int:
             """Integer limits"""
             max_value = 9223372036854775807
+        class Pragma:
+            """Engine profile applied on every new connection.
+
+            Override with `FLASK_SQLITE_<PRAGMA>` environment variables
+            (ex: FLASK_SQLITE_BUSY_TIMEOUT=10000); `null` skips the pragma.
+            """
+            journal_mode = "WAL"
+            synchronous = "NORMAL"
+            # milliseconds
+            busy_timeout = 5000
+            # bytes (256 MiB)
+            mmap_size = 268435456
+            # negative values are KiB (64 MiB)
+            cache_size = -65536
+            temp_store = "MEMORY"
@@ -14,7 +14,9 @@ from sqlalchemy import select
 from app import app, mail
 from blueprints.sch.sch import update_schedules
 from constants import Constant
-from database import Product, User, dbSession
+from database import (Product, User, clear_reference_cache, dbSession,
+                      migrate_columns, migrate_indexes, migrate_search,
+                      migrate_stats)
 from helpers import logger
 
 
@@ -22,6 +24,7 @@ def main() -> None:
     """Run daily tasks."""
     db_backup()
     db_reinit()
+    db_migrate()
     update_schedules()
     send_users_notif()
     send_admins_notif()
@@ -87,6 +90,7 @@ def db_reinit() -> None:
             with source, dest:
                 source.backup(dest)
                 logger.info("Database reinitialised")
+            clear_reference_cache()
             source.close()
             dest.close()
         except Exception as err:
@@ -96,6 +100,25 @@ def db_reinit() -> None:
         logger.debug("This app doesn't need database reinit")
 
 
+def db_migrate() -> None:
+    """Add the missing columns, create missing and drop obsolete indexes of
+    the database, create or update the global statistics summary table and
+    the products search index."""
+    target_engine = dbSession.kw["bind"] # pylint: disable=no-member
+    for objects, migrate in (("columns", migrate_columns),
+                             ("indexes", migrate_indexes),
+                             ("stats", migrate_stats),
+                             ("search tables", migrate_search)):
+        try:
+            if migrate(target_engine):
+                logger.info("Database %s migrated", objects)
+            else:
+                logger.debug("Database %s are up to date", objects)
+        except Exception as err:
+            logger.warning("Database %s could not be migrated", objects)
+            logger.debug(err)
+
+
 def send_users_notif() -> None:
     """Check users status and, if required, send a notification email."""
     if date.today().isocalendar().weekday in {6, 7}:
@@ -2,20 +2,36 @@
 
 from __future__ import annotations
 
-from datetime import date
+import csv
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import date, timedelta
 from os import path
-from typing import Callable, List, Optional
+from threading import Lock
+from time import monotonic
+from typing import (Any, Callable, Iterable, Iterator, List, NamedTuple,
+                    Optional, Sequence, TextIO)
 
 from dotenv import load_dotenv
-from sqlalchemy import (URL, ForeignKey, Index, UniqueConstraint,
-                        create_engine, func, select)
+from flask import Config, g, has_request_context
+from sqlalchemy import (URL, ColumnElement, Connection, Engine, Executable,
+                        ForeignKey, Index, Row, Select, UniqueConstraint,
+                        and_, case, column, create_engine, delete, event,
+                        func, insert, inspect, literal_column, or_, select,
+                        table, text, true, update)
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import (DeclarativeBase, Mapped, MappedAsDataclass,
+                            ORMExecuteState, Session, column_property,
                             declared_attr, mapped_column, relationship,
                             sessionmaker, synonym, validates)
-from werkzeug.security import generate_password_hash
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.schema import CreateColumn
 
 from blueprints.sch import clean_sch_info, sat_sch_info
 from constants import Constant
+from helpers import logger, password_hasher
 from messages import Message
 
 func: Callable
@@ -28,10 +44,152 @@ DB_URL = URL.create(
 # factory for creating new database connections objects
 engine = create_engine(url=DB_URL, echo=False)
 
+
+# region: sqlite engine profile
+SQLITE_PRAGMAS = {
+    "journal_mode": {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+    "synchronous": {"OFF", "NORMAL", "FULL", "EXTRA"},
+    "busy_timeout": int,
+    "mmap_size": int,
+    "cache_size": int,
+    "temp_store": {"DEFAULT", "FILE", "MEMORY"},
+}
+
+
+def sqlite_profile() -> dict[str, str | int]:
+    """SQLite pragmas from `Constant.SQLite.Pragma` overridden by the
+    `FLASK_SQLITE_*` prefixed environment config (the one `app.py` loads).
+
+    Pragmas with a `null` value are skipped."""
+    env_config = Config(Constant.Basic.current_dir)
+    env_config.from_prefixed_env()
+    profile = {}
+    for pragma, valid_values in SQLITE_PRAGMAS.items():
+        value = env_config.get(f"SQLITE_{pragma.upper()}",
+                               getattr(Constant.SQLite.Pragma, pragma))
+        if value is None:
+            continue
+        if valid_values is int:
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError(f"Invalid SQLite pragma {pragma} '{value}'")
+        else:
+            value = str(value).upper()
+            if value not in valid_values:
+                raise ValueError(f"Invalid SQLite pragma {pragma} '{value}'")
+        profile[pragma] = value
+    return profile
+
+
+def register_sqlite_profile(target_engine: Engine,
+                            profile: dict[str, str | int]) -> None:
+    """Apply the `profile` pragmas on every new `target_engine` connection
+    and log the settings in effect on the first connection."""
+
+    def apply_profile(dbapi_connection, connection_record) -> None:
+        """Set the pragmas on a new DBAPI connection."""
+        # pylint: disable=unused-argument
+        cursor = dbapi_connection.cursor()
+        for pragma, value in profile.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+
+    def report_profile(dbapi_connection, connection_record) -> None:
+        """Log the pragmas in effect (not all are honored everywhere,
+        ex: in-memory databases don't use WAL)."""
+        apply_profile(dbapi_connection, connection_record)
+        cursor = dbapi_connection.cursor()
+        applied = {pragma: cursor.execute(f"PRAGMA {pragma}").fetchone()[0]
+                   for pragma in profile}
+        cursor.close()
+        logger.info("SQLite engine profile: %s",
+                    ", ".join(f"{pragma}={value}"
+                              for pragma, value in applied.items()))
+
+    event.listen(target_engine, "first_connect", report_profile)
+    event.listen(target_engine, "connect", apply_profile)
+
+
+register_sqlite_profile(engine, sqlite_profile())
+# endregion
+
 # factory for Session objects
 dbSession = sessionmaker(bind=engine)
 
 
+# region: request scoped session
+def request_session() -> Session:
+    """Session bound to the current request lifetime.
+
+    Created lazily on first use and closed on app context teardown by
+    `close_request_session`."""
+    if "db_session" not in g:
+        g.db_session = dbSession()
+    return g.db_session
+
+
+def close_request_session(exception: Optional[BaseException] = None) -> None:
+    """Close the request session (if it was created)."""
+    # pylint: disable=unused-argument
+    if (db_session := g.pop("db_session", None)) is not None:
+        db_session.close()
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Shared request session inside a request, otherwise a new session
+    closed on exit.
+
+    Models and validators read through this so that a request has a single
+    identity map; autoflush is disabled to never flush half-built objects
+    while validating them."""
+    if has_request_context():
+        db_session = request_session()
+        with db_session.no_autoflush:
+            yield db_session
+    else:
+        with dbSession() as db_session:
+            yield db_session
+
+
+def memo_scalar(db_session: Session, statement: Executable) -> Any:
+    """`db_session.scalar(statement)` memoized for identical statements.
+
+    The memo is cleared on every flush, commit or rollback."""
+    compiled = statement.compile()
+    key = (str(compiled), tuple(compiled.params.items()))
+    memo = db_session.info.setdefault("memo", {})
+    if key not in memo:
+        memo[key] = db_session.scalar(statement)
+    return memo[key]
+
+
+def stream_rows(statement: Executable,
+                batch_size: int = Constant.Basic.export_batch_size
+                ) -> Iterator[Row]:
+    """Rows of `statement` fetched `batch_size` at a time (`yield_per`)
+    through a session open only while they are consumed.
+
+    :param statement: the select statement
+    :param batch_size: rows buffered from the cursor at a time
+    """
+    with dbSession() as db_session:
+        yield from db_session.execute(
+            statement.execution_options(yield_per=batch_size))
+
+
+@event.listens_for(dbSession, "after_flush")
+@event.listens_for(dbSession, "after_commit")
+@event.listens_for(dbSession, "after_soft_rollback")
+def clear_memo(db_session: Session, *args) -> None:
+    """Drop memoized reads after a write. A commit from any other session
+    of the same request also invalidates the request session memo."""
+    # pylint: disable=unused-argument
+    db_session.info.pop("memo", None)
+    if has_request_context() and "db_session" in g:
+        g.db_session.info.pop("memo", None)
+# endregion
+
+
 class Base(MappedAsDataclass, DeclarativeBase):
     """Base class for SQLAlchemy Declarative Mapping"""
 
@@ -59,6 +217,8 @@ class User(Base):
     :param in_use_products: number of `in_use` products for user
     :param all_products: number of total products for user, \
         including not `in_use`
+    :param in_use_products_count: deferred loadable `in_use_products` counter
+    :param all_products_count: deferred loadable `all_products` counter
     :param admin: user has administrator rights
     :param in_use: user can still be used; not obsolete
     :param done_inv: user has sent the inventory
@@ -68,6 +228,8 @@ class User(Base):
     :param details: user details, extra info
     :param email: user email address
     :param sat_group: saturday group
+    :param feed_version: calendar feed url version; incremented to revoke \
+        the user's feed url
     :param sat_group_this_week: check if saturday group is this week
     :param clean_this_week: check if user is scheduled for cleaning
 
@@ -219,10 +381,14 @@ class User(Base):
     details: Mapped[Optional[str]] = mapped_column(default="", repr=False)
     email: Mapped[Optional[str]] = mapped_column(default="", repr=False)
     sat_group: Mapped[int] = mapped_column(default=1)
+    feed_version: Mapped[int] = mapped_column(
+        default=0, server_default="0", repr=False)
 
     __table_args__ = (
         Index('idx_user_name', 'name'),
-        Index('idx_user_in_use', 'in_use'),
+        Index('idx_user_lower_name', text('lower(name)')),
+        Index('idx_user_in_use_reg_req',
+              'in_use', 'reg_req', text('lower(name)')),
     )
 
     username = synonym("name")
@@ -230,16 +396,22 @@ class User(Base):
     @property
     def in_use_products(self) -> int:
         """Number of `in_use` products for user."""
-        with dbSession() as db_session:
-            return db_session.scalar(
+        if (count := self.__dict__.get("in_use_products_count")) is not None:
+            return count
+        with session_scope() as db_session:
+            return memo_scalar(
+                db_session,
                 select(func.count(Product.id))
                 .filter_by(responsible_id=self.id, in_use=True))
 
     @property
     def all_products(self) -> int:
         """Number of total products for user, including not `in_use`."""
-        with dbSession() as db_session:
-            return db_session.scalar(
+        if (count := self.__dict__.get("all_products_count")) is not None:
+            return count
+        with session_scope() as db_session:
+            return memo_scalar(
+                db_session,
                 select(func.count(Product.id))
                 .filter_by(responsible_id=self.id))
 
@@ -251,28 +423,12 @@ class User(Base):
     @property
     def sat_group_this_week(self) -> bool:
         """Check if sat_group this week."""
-        with dbSession() as db_session:
-            if (user_sat_group_date := db_session.scalar(
-                    select(Schedule.next_date)
-                    .filter_by(
-                        name=sat_sch_info.en_name,
-                        elem_id=self.sat_group))):
-                return (user_sat_group_date.isocalendar().week ==
-                        date.today().isocalendar().week)
-        return False
+        return (sat_sch_info.en_name, self.sat_group) in schedule_status()
 
     @property
     def clean_this_week(self) -> bool:
         """Check if user is scheduled for cleaning."""
-        with dbSession() as db_session:
-            if (user_cleaning_date := db_session.scalar(
-                    select(Schedule.next_date)
-                    .filter_by(
-                        name=clean_sch_info.en_name,
-                        elem_id=self.id))):
-                return (user_cleaning_date.isocalendar().week ==
-                        date.today().isocalendar().week)
-        return False
+        return (clean_sch_info.en_name, self.id) in schedule_status()
 
     @validates("name")
     def validate_name(self, key: str, value: str) -> Optional[str]:
@@ -281,8 +437,8 @@ class User(Base):
         if not value or not value.strip():
             raise ValueError(Message.User.Name.Required())
         value = value.strip()
-        if value != self.name:
-            with dbSession() as db_session:
+        if value != self.name and not _defer_unique(User, value):
+            with session_scope() as db_session:
                 if db_session.scalar(select(User).filter_by(name=value)):
                     raise ValueError(Message.User.Name.Exists(value))
         return value
@@ -294,7 +450,7 @@ class User(Base):
         # pylint: disable=unused-argument
         if not value:
             raise ValueError(Message.User.Password.Required())
-        return generate_password_hash(value)
+        return password_hasher.hash(value)
 
     @validates("products")
     def validate_products(self,
@@ -319,19 +475,13 @@ class User(Base):
         """
         - A user who requested registration cannot be admin
         - Check inventory cannot be triggered for an admin
+        The last admin is checked on flush (`check_interlocks`).
         """
         # pylint: disable=unused-argument
         if value:
             if self.reg_req:
                 raise ValueError(Message.User.Admin.PendReg())
             self.req_inv = False
-        if not value:
-            with dbSession() as db_session:
-                admins = db_session.scalars(
-                    select(User)
-                    .filter_by(admin=True, in_use=True)).all()
-                if len(admins) == 1 and admins[0].id == self.id:
-                    raise ValueError(Message.User.Admin.LastAdmin())
         return value
 
     @validates("in_use")
@@ -434,6 +584,11 @@ class Category(Base):
     :param id: category id
     :param name: category name
     :param products: list of products belonging to this category
+    :param in_use_products: number of `in_use` products for category
+    :param all_products: number of total products for category, \
+        including not `in_use`
+    :param in_use_products_count: deferred loadable `in_use_products` counter
+    :param all_products_count: deferred loadable `all_products` counter
     :param in_use: category can still be used; not obsolete
     :param details: category details, extra info
     """
@@ -446,22 +601,29 @@ class Category(Base):
 
     __table_args__ = (
         Index('idx_category_name', 'name'),
-        Index('idx_category_in_use', 'in_use'),
+        Index('idx_category_in_use_lower_name',
+              text('in_use DESC'), text('lower(name)')),
     )
 
     @property
     def in_use_products(self) -> int:
         """Number of `in_use` products for category."""
-        with dbSession() as db_session:
-            return db_session.scalar(
+        if (count := self.__dict__.get("in_use_products_count")) is not None:
+            return count
+        with session_scope() as db_session:
+            return memo_scalar(
+                db_session,
                 select(func.count(Product.id))
                 .filter_by(category_id=self.id, in_use=True))
 
     @property
     def all_products(self) -> int:
         """Number of total products for category, including not `in_use`."""
-        with dbSession() as db_session:
-            return db_session.scalar(
+        if (count := self.__dict__.get("all_products_count")) is not None:
+            return count
+        with session_scope() as db_session:
+            return memo_scalar(
+                db_session,
                 select(func.count(Product.id))
                 .filter_by(category_id=self.id))
 
@@ -472,8 +634,8 @@ class Category(Base):
         if not value or not value.strip():
             raise ValueError(Message.Category.Name.Required())
         value = value.strip()
-        if value != self.name:
-            with dbSession() as db_session:
+        if value != self.name and not _defer_unique(Category, value):
+            with session_scope() as db_session:
                 if db_session.scalar(select(Category).filter_by(name=value)):
                     raise ValueError(
                         Message.Category.Name.Exists(value))
@@ -506,6 +668,11 @@ class Supplier(Base):
     :param id: supplier id
     :param name: supplier name
     :param products: list of products belonging to this supplier
+    :param in_use_products: number of `in_use` products for supplier
+    :param all_products: number of total products for supplier, \
+        including not `in_use`
+    :param in_use_products_count: deferred loadable `in_use_products` counter
+    :param all_products_count: deferred loadable `all_products` counter
     :param in_use: supplier can still be used; not obsolete
     :param details: supplier details, extra info
     """
@@ -518,22 +685,29 @@ class Supplier(Base):
 
     __table_args__ = (
         Index('idx_supplier_name', 'name'),
-        Index('idx_supplier_in_use', 'in_use'),
+        Index('idx_supplier_in_use_lower_name',
+              text('in_use DESC'), text('lower(name)')),
     )
 
     @property
     def in_use_products(self) -> int:
         """Number of `in_use` products for supplier."""
-        with dbSession() as db_session:
-            return db_session.scalar(
+        if (count := self.__dict__.get("in_use_products_count")) is not None:
+            return count
+        with session_scope() as db_session:
+            return memo_scalar(
+                db_session,
                 select(func.count(Product.id))
                 .filter_by(supplier_id=self.id, in_use=True))
 
     @property
     def all_products(self) -> int:
         """Number of total products for supplier, including not `in_use`."""
-        with dbSession() as db_session:
-            return db_session.scalar(
+        if (count := self.__dict__.get("all_products_count")) is not None:
+            return count
+        with session_scope() as db_session:
+            return memo_scalar(
+                db_session,
                 select(func.count(Product.id))
                 .filter_by(supplier_id=self.id))
 
@@ -544,8 +718,8 @@ class Supplier(Base):
         if not value or not value.strip():
             raise ValueError(Message.Supplier.Name.Required())
         value = value.strip()
-        if value != self.name:
-            with dbSession() as db_session:
+        if value != self.name and not _defer_unique(Supplier, value):
+            with session_scope() as db_session:
                 if db_session.scalar(select(Supplier).filter_by(name=value)):
                     raise ValueError(
                         Message.Supplier.Name.Exists(value))
@@ -614,8 +788,16 @@ class Product(Base):
 
     __table_args__ = (
         Index('idx_product_name', 'name'),
-        Index('idx_product_to_order', 'to_order'),
-        Index('idx_product_in_use', 'in_use'),
+        Index('idx_product_lower_name', text('lower(name)')),
+        Index('idx_product_to_order_in_use', 'to_order', 'in_use'),
+        Index('idx_product_in_use_critical', 'in_use', 'critical'),
+        Index('idx_product_responsible_id', 'responsible_id', 'in_use'),
+        Index('idx_product_category_id', 'category_id'),
+        Index('idx_product_supplier_id', 'supplier_id'),
+        # inventory: user products in use ordered by category and name
+        Index('idx_product_inventory',
+              'responsible_id', 'category_id', 'name',
+              sqlite_where=text('in_use = 1')),
     )
 
     code = synonym("name")
@@ -627,8 +809,8 @@ class Product(Base):
         if not value or not value.strip():
             raise ValueError(Message.Product.Name.Required())
         value = value.strip()
-        if value != self.name:
-            with dbSession() as db_session:
+        if value != self.name and not _defer_unique(Product, value):
+            with session_scope() as db_session:
                 if db_session.scalar(select(Product).filter_by(name=value)):
                     raise ValueError(
                         Message.Product.Name.Exists(value))
@@ -644,25 +826,12 @@ class Product(Base):
 
     @validates("responsible_id")
     def validate_responsible_id(self, key: str, user_id: int) -> Optional[int]:
-        """Check for empty, not existing, not in use and last product."""
+        """Check for empty; not existing or not in use responsible and the
+        last product of the previous one are checked on flush
+        (`check_interlocks`)."""
         # pylint: disable=unused-argument
         if not isinstance(user_id, int):
             raise ValueError(Message.Product.Responsible.Delete())
-        with dbSession() as db_session:
-            user = db_session.get(User, user_id)
-            if not user:
-                raise ValueError(Message.User.NotExists(""))
-            if not user.in_use:
-                raise ValueError(Message.User.Products.Retired())
-            if user.reg_req:
-                raise ValueError(Message.User.Products.PendReg())
-            if self.responsible_id:
-                prev_user = db_session.get(User, self.responsible_id)
-                # if it's the last product of previous responsible
-                if prev_user.in_use_products == 1:
-                    prev_user.done_inv = True
-                    prev_user.req_inv = False
-                    db_session.commit()
         return user_id
 
     @validates("responsible")
@@ -670,7 +839,8 @@ class Product(Base):
                              key: User,
                              user: Optional[User]
                              ) -> Optional[User]:
-        """Check for empty, not existing, not in use and last product."""
+        """Check for empty or not in use; the last product of the previous
+        responsible is checked on flush (`check_interlocks`)."""
         # pylint: disable=unused-argument
         if not user:
             raise ValueError(Message.User.NotExists(""))
@@ -678,14 +848,6 @@ class Product(Base):
             raise ValueError(Message.User.Products.Retired())
         if user.reg_req:
             raise ValueError(Message.User.Products.PendReg())
-        with dbSession() as db_session:
-            if self.responsible:
-                prev_user = self.responsible
-                # if it's the last product of previous responsible
-                if prev_user.in_use_products == 1:
-                    prev_user.done_inv = True
-                    prev_user.req_inv = False
-                    db_session.commit()
         return user
 
     @validates("category_id")
@@ -693,16 +855,11 @@ class Product(Base):
                              key: str,
                              category_id: int
                              ) -> Optional[int]:
-        """Check for empty, not existing or not in use."""
+        """Check for empty; not existing or not in use are checked on flush
+        (`check_interlocks`)."""
         # pylint: disable=unused-argument
         if not isinstance(category_id, int):
             raise ValueError(Message.Product.Category.Delete())
-        with dbSession() as db_session:
-            category = db_session.get(Category, category_id)
-            if not category:
-                raise ValueError(Message.Category.NotExists(""))
-            if not category.in_use:
-                raise ValueError(Message.Category.Products.Disabled())
         return category_id
 
     @validates("category")
@@ -723,16 +880,11 @@ class Product(Base):
                              key: str,
                              supplier_id: int
                              ) -> Optional[int]:
-        """Check for empty, not existing or not in use."""
+        """Check for empty; not existing or not in use are checked on flush
+        (`check_interlocks`)."""
         # pylint: disable=unused-argument
         if not isinstance(supplier_id, int):
             raise ValueError(Message.Product.Supplier.Delete())
-        with dbSession() as db_session:
-            supplier = db_session.get(Supplier, supplier_id)
-            if not supplier:
-                raise ValueError(Message.Supplier.NotExists(""))
-            if not supplier.in_use:
-                raise ValueError(Message.Supplier.Products.Disabled())
         return supplier_id
 
     @validates("supplier")
@@ -827,7 +979,7 @@ class Schedule(Base):
     update_interval: Mapped[int]
     __table_args__ = (
         UniqueConstraint('name', 'elem_id', name='uq_schedule_name_elem_id'),
-        Index('idx_schedule_name', 'name'),
+        Index('idx_schedule_name_next_date', 'name', 'next_date'),
         Index('idx_schedule_elem_id', 'elem_id'),
         Index('idx_schedule_update_date', 'update_date'),
     )
@@ -859,10 +1011,13 @@ class Schedule(Base):
         if not isinstance(value, int) or value < 1:
             raise ValueError("Schedule elem_id is invalid")
 
-        with dbSession() as db_session:
-            if db_session.scalar(select(Schedule)
-                                 .filter_by(name=self.name, elem_id=value)):
-                raise ValueError("Name-Elem_id combination must be unique")
+        if not _defer_unique(Schedule, value):
+            with session_scope() as db_session:
+                if db_session.scalar(select(Schedule)
+                                     .filter_by(name=self.name,
+                                                elem_id=value)):
+                    raise ValueError(
+                        "Name-Elem_id combination must be unique")
         return value
 
     @validates("next_date")
@@ -903,6 +1058,1288 @@ class Schedule(Base):
         return value
 
 
+class Stat(Base):
+    """Global statistics summary table mappings.
+
+    :param name: counter name (key of `STATS_COUNTERS`)
+    :param value: counter value
+    The rows are maintained by SQLite triggers on the counted tables (see
+    `create_stats`), they shouldn't be written by the app.
+    """
+    name: Mapped[str] = mapped_column(unique=True)
+    value: Mapped[int] = mapped_column(default=0)
+
+
+# region: products counters
+# deferred correlated counters; `undefer` them for single elements or use
+# `load_products_counters` for listings (one GROUP BY query)
+User.in_use_products_count = column_property(
+    select(func.count(Product.id))
+    .where(Product.responsible_id == User.id, Product.in_use)
+    .correlate_except(Product)
+    .scalar_subquery(),
+    deferred=True)
+User.all_products_count = column_property(
+    select(func.count(Product.id))
+    .where(Product.responsible_id == User.id)
+    .correlate_except(Product)
+    .scalar_subquery(),
+    deferred=True)
+Category.in_use_products_count = column_property(
+    select(func.count(Product.id))
+    .where(Product.category_id == Category.id, Product.in_use)
+    .correlate_except(Product)
+    .scalar_subquery(),
+    deferred=True)
+Category.all_products_count = column_property(
+    select(func.count(Product.id))
+    .where(Product.category_id == Category.id)
+    .correlate_except(Product)
+    .scalar_subquery(),
+    deferred=True)
+Supplier.in_use_products_count = column_property(
+    select(func.count(Product.id))
+    .where(Product.supplier_id == Supplier.id, Product.in_use)
+    .correlate_except(Product)
+    .scalar_subquery(),
+    deferred=True)
+Supplier.all_products_count = column_property(
+    select(func.count(Product.id))
+    .where(Product.supplier_id == Supplier.id)
+    .correlate_except(Product)
+    .scalar_subquery(),
+    deferred=True)
+
+PRODUCTS_FOREIGN_KEYS = {
+    User: Product.responsible_id,
+    Category: Product.category_id,
+    Supplier: Product.supplier_id,
+}
+
+
+def load_products_counters(
+        db_session: Session,
+        elements: Sequence[User | Category | Supplier]) -> None:
+    """Populate `in_use_products` and `all_products` for a listing.
+
+    All the counters are computed with one GROUP BY query instead of two
+    COUNT queries for every element.
+
+    :param db_session: session the `elements` are attached to
+    :param elements: users, categories or suppliers (same type)
+    """
+    if not elements:
+        return
+    foreign_key = PRODUCTS_FOREIGN_KEYS[type(elements[0])]
+    counters = {
+        row.elem_id: row for row in db_session.execute(
+            select(foreign_key.label("elem_id"),
+                   func.count(Product.id).label("all_products"),
+                   func.count(Product.id).filter(Product.in_use)
+                   .label("in_use_products"))
+            .filter(foreign_key.in_([element.id for element in elements]))
+            .group_by(foreign_key))}
+    for element in elements:
+        row = counters.get(element.id)
+        set_committed_value(element, "all_products_count",
+                            row.all_products if row else 0)
+        set_committed_value(element, "in_use_products_count",
+                            row.in_use_products if row else 0)
+# endregion
+
+
+# region: constraint uniqueness
+# unique constraint columns (as reported by SQLite) ->
+# (model, attribute, error message)
+UNIQUE_CONSTRAINTS: dict[str, tuple[type[Base], str, Callable[..., str]]] = {
+    "users.name": (User, "name", Message.User.Name.Exists),
+    "categories.name": (Category, "name", Message.Category.Name.Exists),
+    "suppliers.name": (Supplier, "name", Message.Supplier.Name.Exists),
+    "products.name": (Product, "name", Message.Product.Name.Exists),
+    "schedules.name, schedules.elem_id": (
+        Schedule, "elem_id",
+        lambda _: "Name-Elem_id combination must be unique"),
+}
+
+# values left to the unique constraints in the current
+# `unique_by_constraint` block
+_unique_by_constraint: ContextVar[Optional[list[tuple[type[Base], Any]]]] = \
+    ContextVar("unique_by_constraint", default=None)
+
+
+def _defer_unique(model: type[Base], value: Any) -> bool:
+    """Record `value` for the unique constraints check if inside a
+    `unique_by_constraint` block.
+
+    :param model: the validated model
+    :param value: the value that must be unique
+    """
+    if (deferred := _unique_by_constraint.get()) is None:
+        return False
+    deferred.append((model, value))
+    return True
+
+
+@contextmanager
+def unique_by_constraint(db_session: Session) -> Iterator[Session]:
+    """Leave uniqueness checks of the elements created or modified in this
+    block to the database unique constraints.
+
+    The name (and schedule elem_id) validators skip their `SELECT`; a
+    duplicate is reported at flush time as `IntegrityError`, which is rolled
+    back and raised as the same `ValueError` the validator would raise.
+
+    :param db_session: session used to flush the elements
+    """
+    deferred = []
+    token = _unique_by_constraint.set(deferred)
+    try:
+        yield db_session
+    except IntegrityError as error:
+        db_session.rollback()
+        if (violation := _unique_violation(db_session, error, deferred)):
+            logger.debug("Unique constraint violation: %s", violation)
+            raise violation from error
+        raise
+    finally:
+        _unique_by_constraint.reset(token)
+
+
+def _unique_violation(db_session: Session,
+                      error: IntegrityError,
+                      deferred: list[tuple[type[Base], Any]]
+                      ) -> Optional[ValueError]:
+    """Translate a unique constraint `IntegrityError` to `ValueError`.
+
+    :param db_session: rolled back session
+    :param error: error raised at flush time
+    :param deferred: values left to the unique constraints
+    """
+    columns = str(error.orig).removeprefix("UNIQUE constraint failed: ")
+    if columns not in UNIQUE_CONSTRAINTS:
+        return None
+    model, attr, message = UNIQUE_CONSTRAINTS[columns]
+    values = [value for cls, value in deferred if cls is model]
+    # duplicate inside the block or with an existing row
+    duplicate = next(
+        (value for value in values if values.count(value) > 1), None)
+    if duplicate is None and attr == "name":
+        duplicate = db_session.scalar(
+            select(model.name)
+            .filter(model.name.in_(values))
+            .limit(1))
+    return ValueError(message(duplicate))
+# endregion
+
+
+# region: reference lists cache
+# in use elements (id, name) for select fields choices
+REFERENCE_LISTS: dict[type[Base], Executable] = {
+    User: (select(User.id, User.name)
+           .filter_by(in_use=True, reg_req=False)
+           .order_by(func.lower(User.name))),
+    Category: (select(Category.id, Category.name)
+               .filter_by(in_use=True)
+               .order_by(func.lower(Category.name))),
+    Supplier: (select(Supplier.id, Supplier.name)
+               .filter_by(in_use=True)
+               .order_by(func.lower(Supplier.name))),
+}
+
+# models whose commits invalidate a cache (reference lists, schedule status)
+CACHED_MODELS = (*REFERENCE_LISTS, Schedule)
+
+# model -> (load time, choices)
+_reference_cache: dict[type[Base], tuple[float, list[tuple[int, str]]]] = {}
+_reference_lock = Lock()
+# incremented on every invalidation; a list loaded meanwhile isn't cached
+_reference_generation = 0 # pylint: disable=invalid-name
+
+
+def reference_choices(model: type[Base]) -> list[tuple[int, str]]:
+    """In use users (not requesting registration), categories or suppliers
+    as `(id, name)` ordered by name, for select fields choices.
+
+    Cached in this process; cleared when a commit changes any element of
+    `model` and expired after `Constant.Basic.reference_cache_ttl` seconds
+    (changes made by other processes).
+
+    :param model: `User`, `Category` or `Supplier`
+    """
+    with _reference_lock:
+        cached = _reference_cache.get(model)
+        generation = _reference_generation
+    if cached and monotonic() - cached[0] < Constant.Basic.reference_cache_ttl:
+        return list(cached[1])
+    with dbSession() as db_session:
+        choices = [(row.id, row.name)
+                   for row in db_session.execute(REFERENCE_LISTS[model])]
+    with _reference_lock:
+        if generation == _reference_generation:
+            _reference_cache[model] = (monotonic(), choices)
+    return list(choices)
+
+
+def clear_reference_cache(*models: type[Base]) -> None:
+    """Clear the cached lists of `models` (all if none given)."""
+    global _reference_generation # pylint: disable=global-statement
+    with _reference_lock:
+        _reference_generation += 1
+        for model in models or tuple(_reference_cache):
+            _reference_cache.pop(model, None)
+
+
+@event.listens_for(dbSession, "before_flush")
+def track_reference_changes(db_session: Session, *args) -> None:
+    """Remember which reference lists the flushed elements change."""
+    # pylint: disable=unused-argument
+    changed = {type(elem)
+               for elem in (*db_session.new,
+                            *db_session.dirty,
+                            *db_session.deleted)}
+    db_session.info.setdefault("reference_changes", set()).update(
+        changed.intersection(CACHED_MODELS))
+
+
+@event.listens_for(dbSession, "do_orm_execute")
+def track_reference_bulk_changes(orm_execute_state: ORMExecuteState) -> None:
+    """Remember which reference lists bulk statements change."""
+    if not (orm_execute_state.is_insert
+            or orm_execute_state.is_update
+            or orm_execute_state.is_delete):
+        return
+    if (mapper := orm_execute_state.bind_mapper) and \
+            mapper.class_ in CACHED_MODELS:
+        orm_execute_state.session.info.setdefault(
+            "reference_changes", set()).add(mapper.class_)
+
+
+@event.listens_for(dbSession, "after_commit")
+def invalidate_reference_cache(db_session: Session) -> None:
+    """Clear the reference lists (and the schedule status) changed by the
+    committed transaction."""
+    if changed := db_session.info.pop("reference_changes", None):
+        if Schedule in changed:
+            clear_schedule_status()
+        if changed := changed.intersection(REFERENCE_LISTS):
+            clear_reference_cache(*changed)
+
+
+@event.listens_for(dbSession, "after_soft_rollback")
+def discard_reference_changes(db_session: Session, *args) -> None:
+    """Forget the changes of a rolled back transaction."""
+    # pylint: disable=unused-argument
+    db_session.info.pop("reference_changes", None)
+# endregion
+
+
+# region: schedule status cache
+# (expiry date, load time, (schedule name, elem_id) scheduled this week)
+_schedule_status: Optional[tuple[date, float, frozenset[tuple[str, int]]]] \
+    = None # pylint: disable=invalid-name
+_schedule_status_lock = Lock()
+# incremented on every invalidation; a status loaded meanwhile isn't cached
+_schedule_status_generation = 0 # pylint: disable=invalid-name
+
+
+def schedule_status() -> frozenset[tuple[str, int]]:
+    """Schedule elements (schedule name, elem_id) scheduled this week.
+
+    Loaded in one query and cached in this process until the week ends or
+    the next schedules update date (daily task), cleared when a commit
+    changes any schedule and expired after
+    `Constant.Basic.reference_cache_ttl` seconds (changes made by other
+    processes).
+    """
+    global _schedule_status # pylint: disable=global-statement
+    today = date.today()
+    with _schedule_status_lock:
+        cached = _schedule_status
+        generation = _schedule_status_generation
+    if (cached and today < cached[0] and
+            monotonic() - cached[1] < Constant.Basic.reference_cache_ttl):
+        return cached[2]
+    week_start = today - timedelta(days=today.isoweekday() - 1)
+    week_end = week_start + timedelta(weeks=1)
+    next_update = (select(func.min(Schedule.update_date))
+                   .filter(Schedule.update_date > today)
+                   .scalar_subquery())
+    with dbSession() as db_session:
+        rows = db_session.execute(
+            select(Schedule.name,
+                   Schedule.elem_id,
+                   Schedule.next_date,
+                   Schedule.update_date)
+            .filter(or_(Schedule.next_date.between(
+                            week_start, week_end - timedelta(days=1)),
+                        Schedule.update_date == next_update))).all()
+    status = frozenset((row.name, row.elem_id) for row in rows
+                       if week_start <= row.next_date < week_end)
+    # overdue updates (daily task not run yet) are covered by the ttl
+    expiry = min((row.update_date for row in rows
+                  if row.update_date > today),
+                 default=week_end)
+    with _schedule_status_lock:
+        if generation == _schedule_status_generation:
+            _schedule_status = (min(expiry, week_end), monotonic(), status)
+    return status
+
+
+def clear_schedule_status() -> None:
+    """Clear the cached schedule status."""
+    global _schedule_status # pylint: disable=global-statement
+    global _schedule_status_generation # pylint: disable=global-statement
+    with _schedule_status_lock:
+        _schedule_status_generation += 1
+        _schedule_status = None
+# endregion
+
+
+# region: global stats
+# counter name -> (counted model, `filter_by` criteria)
+STATS_COUNTERS: dict[str, tuple[type[Base], dict[str, bool]]] = {
+    "all_users": (User, {}),
+    "in_use_users": (User, {"in_use": True}),
+    "all_categories": (Category, {}),
+    "in_use_categories": (Category, {"in_use": True}),
+    "all_suppliers": (Supplier, {}),
+    "in_use_suppliers": (Supplier, {"in_use": True}),
+    "all_products": (Product, {}),
+    "in_use_products": (Product, {"in_use": True}),
+    "critical_products": (Product, {"critical": True}),
+    "in_use_critical_products": (Product, {"in_use": True, "critical": True}),
+    "products_to_order": (Product, {"in_use": True, "to_order": True}),
+}
+# `stats` row counting the changes of the versioned models (API ETags)
+DATA_VERSION = "data_version"
+VERSIONED_MODELS = (User, Category, Supplier, Product, Schedule)
+
+
+def stats_aggregate() -> Executable:
+    """One row with all the `STATS_COUNTERS` (conditional aggregates,
+    one scan per counted table)."""
+    subqueries = []
+    for model in dict.fromkeys(model for model, _ in STATS_COUNTERS.values()):
+        counters = []
+        for name, (counted, criteria) in STATS_COUNTERS.items():
+            if counted is not model:
+                continue
+            counter = func.count()
+            if criteria:
+                counter = counter.filter(
+                    and_(*(getattr(model, column) == value
+                           for column, value in criteria.items())))
+            counters.append(counter.label(name))
+        subqueries.append(select(*counters).select_from(model).subquery())
+    from_clause = subqueries[0]
+    for subquery in subqueries[1:]:
+        from_clause = from_clause.join(subquery, true())
+    return select(*(column
+                    for subquery in subqueries
+                    for column in subquery.c)).select_from(from_clause)
+
+
+def global_stats(db_session: Session) -> dict[str, int]:
+    """All the `STATS_COUNTERS` values.
+
+    Read from the `stats` summary table; computed with `stats_aggregate`
+    if the database doesn't have it (not migrated yet).
+
+    :param db_session: database session
+    """
+    try:
+        stats = dict(db_session.execute(
+            select(Stat.name, Stat.value)).tuples().all())
+    except OperationalError:
+        stats = {}
+    if stats.keys() >= STATS_COUNTERS.keys():
+        return {name: stats[name] for name in STATS_COUNTERS}
+    logger.debug("Stats computed (summary table missing)")
+    return dict(db_session.execute(stats_aggregate()).one()._mapping)
+
+
+def data_version(db_session: Session) -> Optional[int]:
+    """Number of changes of the `VERSIONED_MODELS` (maintained by the
+    `stats` triggers); `None` if the database isn't migrated yet.
+
+    :param db_session: database session
+    """
+    try:
+        return db_session.scalar(
+            select(Stat.value).filter_by(name=DATA_VERSION))
+    except OperationalError:
+        return None
+
+
+def _stats_condition(row: str, criteria: dict[str, bool]) -> str:
+    """SQL condition of the trigger `row` (`NEW` | `OLD`) being counted."""
+    if not criteria:
+        return "1"
+    return "(" + " AND ".join(f"{row}.{column} = {int(value)}"
+                              for column, value in criteria.items()) + ")"
+
+
+def stats_triggers() -> dict[str, str]:
+    """`CREATE TRIGGER` statements keeping the `stats` rows up to date
+    on insert, update (of the counted columns) and delete; any change of the
+    `VERSIONED_MODELS` increments the `DATA_VERSION` row."""
+    stats_table = Stat.__tablename__
+    triggers = {}
+    for model in dict.fromkeys(model for model, _ in STATS_COUNTERS.values()):
+        table_name = model.__tablename__
+        counters = {name: criteria
+                    for name, (counted, criteria) in STATS_COUNTERS.items()
+                    if counted is model}
+        columns = sorted({column
+                          for criteria in counters.values()
+                          for column in criteria})
+        deltas = {
+            "insert": {name: _stats_condition("NEW", criteria)
+                       for name, criteria in counters.items()},
+            "delete": {name: "-" + _stats_condition("OLD", criteria)
+                       for name, criteria in counters.items()},
+            "update": {name: (_stats_condition("NEW", criteria) + " - " +
+                              _stats_condition("OLD", criteria))
+                       for name, criteria in counters.items() if criteria},
+        }
+        for action, delta in deltas.items():
+            event_clause = action.upper()
+            if action == "update":
+                event_clause += " OF " + ", ".join(columns)
+            cases = " ".join(f"WHEN '{name}' THEN {value}"
+                             for name, value in delta.items())
+            names = ", ".join(f"'{name}'" for name in delta)
+            trigger = f"trg_{stats_table}_{table_name}_{action}"
+            triggers[trigger] = (
+                f"CREATE TRIGGER {trigger} AFTER {event_clause} "
+                f"ON {table_name} BEGIN UPDATE {stats_table} "
+                f"SET value = value + CASE name {cases} END "
+                f"WHERE name IN ({names}); END")
+    for model in VERSIONED_MODELS:
+        table_name = model.__tablename__
+        for action in ("insert", "update", "delete"):
+            trigger = f"trg_{DATA_VERSION}_{table_name}_{action}"
+            triggers[trigger] = (
+                f"CREATE TRIGGER {trigger} AFTER {action.upper()} "
+                f"ON {table_name} BEGIN UPDATE {stats_table} "
+                f"SET value = value + 1 "
+                f"WHERE name = '{DATA_VERSION}'; END")
+    return triggers
+
+
+def seed_stats(connection: Connection) -> None:
+    """Recount all the `stats` rows; the `DATA_VERSION` is incremented
+    (the data could have changed without the triggers).
+
+    :param connection: connection inside a transaction
+    """
+    values = dict(connection.execute(stats_aggregate()).one()._mapping)
+    values[DATA_VERSION] = (connection.scalar(
+        select(Stat.value).filter_by(name=DATA_VERSION)) or 0) + 1
+    connection.execute(Stat.__table__.delete())
+    connection.execute(Stat.__table__.insert(),
+                       [{"name": name, "value": value}
+                        for name, value in values.items()])
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_stats(target, connection: Connection, **kw) -> None:
+    """Create the `stats` triggers and rows after db creation."""
+    # pylint: disable=unused-argument
+    if Stat.__table__ not in kw.get("tables", ()):
+        return
+    for trigger, ddl in stats_triggers().items():
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(text(ddl))
+    seed_stats(connection)
+# endregion
+
+
+# region: products search
+# FTS5 index of the products name, description, category and supplier names
+# (`rowid` = product id), kept in sync by the `search_triggers`
+SEARCH_TABLE = "products_search"
+SEARCH_COLUMNS = ("name", "description", "category", "supplier")
+# bm25 weights of `SEARCH_COLUMNS`: name matches rank first
+SEARCH_WEIGHTS = (10.0, 2.0, 1.0, 1.0)
+products_search = table(SEARCH_TABLE,
+                        column("rowid"),
+                        column(SEARCH_TABLE),
+                        *(column(name) for name in SEARCH_COLUMNS))
+
+
+def search_table_ddl() -> str:
+    """`CREATE VIRTUAL TABLE` statement of the search index."""
+    return (f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            f"{', '.join(SEARCH_COLUMNS)}, "
+            "tokenize = 'unicode61 remove_diacritics 2', "
+            "prefix = '2 3')")
+
+
+def _search_row(product: str) -> str:
+    """Search index row (`rowid` and values) of the trigger `product`
+    (`NEW` | `OLD`)."""
+    return (f"SELECT {product}.id, {product}.name, {product}.description, "
+            f"(SELECT name FROM {Category.__tablename__} "
+            f"WHERE id = {product}.category_id), "
+            f"(SELECT name FROM {Supplier.__tablename__} "
+            f"WHERE id = {product}.supplier_id)")
+
+
+def search_triggers() -> dict[str, str]:
+    """`CREATE TRIGGER` statements keeping the search index in sync with
+    the products and their category and supplier names."""
+    products = Product.__tablename__
+    insert_row = (f"INSERT INTO {SEARCH_TABLE} "
+                  f"(rowid, {', '.join(SEARCH_COLUMNS)}) "
+                  f"{_search_row('NEW')};")
+    delete_row = f"DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id;"
+    triggers = {
+        f"trg_{SEARCH_TABLE}_{products}_insert": (
+            f"AFTER INSERT ON {products} BEGIN {insert_row} END"),
+        f"trg_{SEARCH_TABLE}_{products}_update": (
+            f"AFTER UPDATE OF name, description, category_id, supplier_id "
+            f"ON {products} BEGIN {delete_row} {insert_row} END"),
+        f"trg_{SEARCH_TABLE}_{products}_delete": (
+            f"AFTER DELETE ON {products} BEGIN {delete_row} END"),
+    }
+    for model, search_column in ((Category, "category"),
+                                 (Supplier, "supplier")):
+        reference = PRODUCTS_FOREIGN_KEYS[model].key
+        triggers[f"trg_{SEARCH_TABLE}_{model.__tablename__}_update"] = (
+            f"AFTER UPDATE OF name ON {model.__tablename__} "
+            f"BEGIN UPDATE {SEARCH_TABLE} SET {search_column} = NEW.name "
+            f"WHERE rowid IN (SELECT id FROM {products} "
+            f"WHERE {reference} = NEW.id); END")
+    return {trigger: f"CREATE TRIGGER {trigger} {body}"
+            for trigger, body in triggers.items()}
+
+
+def seed_search(connection: Connection) -> None:
+    """Rebuild the search index from the products table.
+
+    :param connection: connection inside a transaction
+    """
+    connection.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    connection.execute(text(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)}) "
+        f"{_search_row(Product.__tablename__)} "
+        f"FROM {Product.__tablename__}"))
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_search(target, connection: Connection, **kw) -> None:
+    """Create the search index and its triggers after db creation."""
+    # pylint: disable=unused-argument
+    if Product.__table__ not in kw.get("tables", ()):
+        return
+    connection.execute(text(f"DROP TABLE IF EXISTS {SEARCH_TABLE}"))
+    connection.execute(text(search_table_ddl()))
+    for trigger, ddl in search_triggers().items():
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(text(ddl))
+    seed_search(connection)
+
+
+def migrate_search(target_engine: Engine) -> bool:
+    """Create the search index of an existing database and bring its
+    triggers in line with `search_triggers`; the index is rebuilt when
+    anything changed.
+
+    :param target_engine: engine of the database to migrate
+    :return: `True` if the database was migrated
+    """
+    with target_engine.begin() as connection:
+        existing = dict(connection.execute(
+            text("SELECT name, sql FROM sqlite_master "
+                 "WHERE type IN ('table', 'trigger')")).tuples().all())
+        migrated = False
+        if existing.get(SEARCH_TABLE) != search_table_ddl():
+            connection.execute(text(f"DROP TABLE IF EXISTS {SEARCH_TABLE}"))
+            connection.execute(text(search_table_ddl()))
+            logger.debug("Table '%s' created", SEARCH_TABLE)
+            migrated = True
+        for trigger, ddl in search_triggers().items():
+            if existing.get(trigger) != ddl:
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+                connection.execute(text(ddl))
+                logger.debug("Trigger '%s' created", trigger)
+                migrated = True
+        if migrated:
+            seed_search(connection)
+    return migrated
+
+
+def search_query(terms: str) -> str:
+    """FTS5 query of the user search `terms`: every word is required, as a
+    quoted prefix; words without letters or digits are left out (`""` - no
+    words).
+
+    :param terms: user search text
+    """
+    return " ".join(f'"{word}"*' for word in terms.replace('"', " ").split()
+                    if any(char.isalnum() for char in word))
+
+
+def search_products(terms: str,
+                    statement: Select,
+                    target_engine: Optional[Engine] = None) -> Select:
+    """Restrict a products `statement` to the products matching the search
+    `terms`, ranked by relevance (bm25, name matches first); `statement` is
+    returned unchanged if `terms` have no words.
+
+    Without the search index (database not migrated) every word must be
+    contained in the name, description, category or supplier name and the
+    `statement` order is kept.
+
+    :param terms: user search text
+    :param statement: products select
+    :param target_engine: engine of the searched database (default - the
+        `dbSession` one)
+    """
+    if not (query := search_query(terms)):
+        return statement
+    if target_engine is None:
+        target_engine = dbSession.kw["bind"] # pylint: disable=no-member
+    if not inspect(target_engine).has_table(SEARCH_TABLE):
+        logger.warning("Table '%s' missing: unranked search", SEARCH_TABLE)
+        for word in terms.replace('"', " ").split():
+            if any(char.isalnum() for char in word):
+                statement = statement.filter(or_(
+                    Product.name.icontains(word, autoescape=True),
+                    Product.description.icontains(word, autoescape=True),
+                    Product.category.has(
+                        Category.name.icontains(word, autoescape=True)),
+                    Product.supplier.has(
+                        Supplier.name.icontains(word, autoescape=True))))
+        return statement
+    return (statement
+            .join(products_search, products_search.c.rowid == Product.id)
+            .filter(products_search.c[SEARCH_TABLE].match(query))
+            .order_by(None)
+            .order_by(func.bm25(literal_column(SEARCH_TABLE),
+                                *SEARCH_WEIGHTS),
+                      Product.id))
+# endregion
+
+
+# region: bulk products changes
+# products column referencing each model
+PRODUCT_REFERENCES = {
+    User: Product.responsible_id,
+    Category: Product.category_id,
+    Supplier: Product.supplier_id,
+}
+
+
+def release_inventory(db_session: Session, user_ids: Iterable[int]) -> None:
+    """Cancel the inventory check and request of the users left without
+    products in use, with one `UPDATE`.
+
+    :param db_session: session of the transaction
+    :param user_ids: users that lost products
+    """
+    users = User.__table__
+    reset_ids = db_session.scalars(
+        update(users)
+        .where(users.c.id.in_(user_ids),
+               ~select(Product.id)
+               .filter(Product.responsible_id == users.c.id,
+                       Product.in_use)
+               .exists())
+        .values(done_inv=True, req_inv=False)
+        .returning(users.c.id)).all()
+    for user_id in reset_ids:
+        if (user := db_session.identity_map.get(
+                identity_key(User, user_id))) is not None:
+            set_committed_value(user, "done_inv", True)
+            set_committed_value(user, "req_inv", False)
+        logger.debug("User with id '%d' has no products in use left",
+                     user_id)
+
+
+def _check_reference(db_session: Session,
+                     model: type[Base],
+                     elem_id: int) -> None:
+    """Raise `ValueError` with the product validators messages if products
+    can't be assigned to this user, category or supplier.
+
+    :param db_session: session of the transaction
+    :param model: `User`, `Category` or `Supplier`
+    :param elem_id: the element id
+    """
+    _check_referenced(model, db_session.get(model, elem_id))
+
+
+def _check_referenced(model: type[Base], elem: Optional[Base]) -> None:
+    """Raise `ValueError` with the product validators messages if products
+    can't be assigned to this (`None` - not existing) user, category or
+    supplier.
+
+    :param model: `User`, `Category` or `Supplier`
+    :param elem: the element
+    """
+    if model is User:
+        if not elem:
+            raise ValueError(Message.User.NotExists(""))
+        if not elem.in_use:
+            raise ValueError(Message.User.Products.Retired())
+        if elem.reg_req:
+            raise ValueError(Message.User.Products.PendReg())
+    elif model is Category:
+        if not elem:
+            raise ValueError(Message.Category.NotExists(""))
+        if not elem.in_use:
+            raise ValueError(Message.Category.Products.Disabled())
+    else:
+        if not elem:
+            raise ValueError(Message.Supplier.NotExists(""))
+        if not elem.in_use:
+            raise ValueError(Message.Supplier.Products.Disabled())
+
+
+def reassign_responsible(db_session: Session,
+                         user_id: int,
+                         *criteria: ColumnElement[bool]) -> int:
+    """Make a user responsible for the products matching `criteria` with
+    one `UPDATE`; the previous responsibles left without products in use
+    have the inventory check and request cancelled. Returns the number of
+    reassigned products (not committed).
+
+    :param db_session: session of the transaction
+    :param user_id: the new responsible
+    :param criteria: products filter
+    """
+    _check_reference(db_session, User, user_id)
+    moved = and_(*criteria, Product.responsible_id != user_id)
+    prev_ids = db_session.scalars(
+        select(Product.responsible_id).filter(moved).distinct()).all()
+    reassigned = db_session.execute(
+        update(Product)
+        .filter(moved)
+        .values(responsible_id=user_id)
+        .execution_options(synchronize_session=False)).rowcount
+    if prev_ids:
+        release_inventory(db_session, prev_ids)
+    return reassigned
+
+
+def merge_into(db_session: Session,
+               model: type[Base],
+               source_id: int,
+               target_id: int) -> int:
+    """Move all the products of a category or supplier to another one with
+    one `UPDATE` and delete it. Returns the number of moved products (not
+    committed).
+
+    :param db_session: session of the transaction
+    :param model: `Category` or `Supplier`
+    :param source_id: merged (deleted) element
+    :param target_id: element receiving the products
+    """
+    if source_id == target_id:
+        raise ValueError(Message.Category.Merge.Same()
+                         if model is Category
+                         else Message.Supplier.Merge.Same())
+    _check_reference(db_session, model, target_id)
+    product_column = PRODUCT_REFERENCES[model]
+    moved = db_session.execute(
+        update(Product)
+        .filter(product_column == source_id)
+        .values({product_column.key: target_id})
+        .execution_options(synchronize_session=False)).rowcount
+    db_session.execute(
+        delete(model)
+        .filter_by(id=source_id)
+        .execution_options(synchronize_session=False))
+    return moved
+
+
+# products columns that can be changed for many products at once
+BULK_EDIT_COLUMNS = ("meas_unit", "min_stock", "ord_qty", "critical", "in_use")
+
+
+def _bulk_edit_values(values: dict[str, Any]) -> dict[str, Any]:
+    """Validate the bulk edit `values` like the `Product` validators do.
+
+    :param values: new values of `BULK_EDIT_COLUMNS`
+    """
+    if not values:
+        raise ValueError(Message.Product.BulkEdit.NoChanges())
+    values = dict(values)
+    if "meas_unit" in values:
+        if not values["meas_unit"] or not values["meas_unit"].strip():
+            raise ValueError(Message.Product.MeasUnit.Required())
+        values["meas_unit"] = values["meas_unit"].strip()
+    for key, min_value, message in (
+            ("min_stock", Constant.Product.MinStock.min_value,
+             Message.Product.MinStock.Invalid),
+            ("ord_qty", Constant.Product.OrdQty.min_value,
+             Message.Product.OrdQty.Invalid)):
+        if key in values and not (
+                isinstance(values[key], int)
+                and min_value <= values[key]
+                <= Constant.SQLite.Int.max_value):
+            raise ValueError(message())
+    for key in ("critical", "in_use"):
+        if key in values:
+            values[key] = bool(values[key])
+    return values
+
+
+def bulk_edit_products(db_session: Session,
+                       product_ids: Iterable[int],
+                       values: dict[str, Any]) -> int:
+    """Change the same columns of many products with one validated
+    `UPDATE`; the responsibles left without products in use have the
+    inventory check and request cancelled. Returns the number of updated
+    products (not committed).
+
+    :param db_session: session of the transaction
+    :param product_ids: selected products
+    :param values: new values of `BULK_EDIT_COLUMNS`
+    """
+    if not (product_ids := set(product_ids)):
+        raise ValueError(Message.Product.BulkEdit.NoSelection())
+    values = _bulk_edit_values(values)
+    selected = Product.id.in_(product_ids)
+    prev_ids = []
+    if values.get("in_use") is False:
+        if db_session.scalar(
+                select(Product.id)
+                .filter(selected, Product.to_order)
+                .limit(1)) is not None:
+            raise ValueError(Message.Product.InUse.ToOrder())
+        prev_ids = db_session.scalars(
+            select(Product.responsible_id)
+            .filter(selected, Product.in_use)
+            .distinct()).all()
+    updated = db_session.execute(
+        update(Product)
+        .filter(selected)
+        .values(values)
+        .execution_options(synchronize_session=False)).rowcount
+    if prev_ids:
+        release_inventory(db_session, prev_ids)
+    return updated
+# endregion
+
+
+# region: interlocks on flush
+@event.listens_for(dbSession, "before_flush")
+def check_interlocks(db_session: Session, *args) -> None:
+    """Check the interlocks that need the database once per flush, for all
+    the new and changed elements (the validators check only the elements'
+    own state):
+    - the products responsibles, categories and suppliers exist and can
+        have products (one query for each referenced model)
+    - there is an admin in use left (only if admin rights were revoked)
+    A violation raises the validator `ValueError` before anything is
+    written. The previous responsibles of reassigned products are released
+    after flush by `release_responsibles`."""
+    # pylint: disable=unused-argument
+    references = {model: set() for model in PRODUCT_REFERENCES}
+    reassigned_ids = set()
+    users = []
+    for elem in (*db_session.new, *db_session.dirty):
+        if isinstance(elem, Product):
+            state = inspect(elem)
+            for model, product_column in PRODUCT_REFERENCES.items():
+                references[model].update(
+                    state.attrs[product_column.key].history.added)
+            if state.persistent and (
+                    state.attrs.responsible_id.history.has_changes() or
+                    state.attrs.responsible.history.has_changes()):
+                # identity: without loading an expired product
+                reassigned_ids.add(state.identity[0])
+        elif isinstance(elem, User):
+            users.append(elem)
+    with db_session.no_autoflush:
+        for model, elem_ids in references.items():
+            if elem_ids:
+                elements = {elem.id: elem for elem in db_session.scalars(
+                    select(model).filter(model.id.in_(elem_ids)))}
+                for elem_id in elem_ids:
+                    _check_referenced(model, elements.get(elem_id))
+        if (any(not user.admin and user not in db_session.new and
+                inspect(user).attrs.admin.history.has_changes()
+                for user in users)
+                and not any(user.admin and user.in_use for user in users)
+                and not db_session.scalar(
+                    select(User.id)
+                    .filter_by(admin=True, in_use=True)
+                    .filter(User.id.not_in([user.id for user in users
+                                            if user.id is not None]))
+                    .limit(1))):
+            raise ValueError(Message.User.Admin.LastAdmin())
+        if reassigned_ids:
+            # still the previous responsibles: nothing is written yet
+            db_session.info.setdefault("prev_responsibles", set()).update(
+                db_session.scalars(
+                    select(Product.responsible_id)
+                    .filter(Product.id.in_(reassigned_ids))
+                    .distinct()))
+
+
+@event.listens_for(dbSession, "after_flush")
+def release_responsibles(db_session: Session, *args) -> None:
+    """Cancel the inventory check and request of the previous responsibles
+    of the flushed products left without products in use."""
+    # pylint: disable=unused-argument
+    if prev_ids := db_session.info.pop("prev_responsibles", None):
+        release_inventory(db_session, prev_ids)
+# endregion
+
+
+# region: bulk state transitions
+def start_inventory_check(db_session: Session) -> int:
+    """Trigger the inventory check of all the users that can check inventory
+    (in use, not requesting registration, with products in use) with one
+    `UPDATE`; their inventory requests are cancelled. Returns the number of
+    users that started checking (not committed).
+
+    :param db_session: session of the transaction
+    """
+    return db_session.execute(
+        update(User)
+        .filter(User.in_use,
+                ~User.reg_req,
+                User.done_inv,
+                select(Product.id)
+                .filter(Product.responsible_id == User.id,
+                        Product.in_use)
+                .exists())
+        .values(done_inv=False, req_inv=False)
+        .execution_options(synchronize_session=False)).rowcount
+
+
+def _update_to_order(db_session: Session,
+                     changes: dict[int, bool],
+                     *criteria: ColumnElement[bool]) -> int:
+    """Set the products `to_order` with one `UPDATE ... CASE`.
+
+    :param db_session: session of the transaction
+    :param changes: new `to_order` state by product id
+    :param criteria: extra products filter
+    """
+    if not changes:
+        return 0
+    return db_session.execute(
+        update(Product)
+        .filter(Product.id.in_(changes), *criteria)
+        .values(to_order=case(changes, value=Product.id))
+        .execution_options(synchronize_session=False)).rowcount
+
+
+def submit_inventory(db_session: Session,
+                     user_id: int,
+                     changes: dict[int, bool],
+                     done: bool = True) -> int:
+    """Apply the `to_order` changes of a user's products in use with one
+    `UPDATE ... CASE` and end the user's inventory check. Returns the number
+    of changed products (not committed).
+
+    :param db_session: session of the transaction
+    :param user_id: the inventorying user
+    :param changes: new `to_order` state by product id
+    :param done: end the inventory check (only when all the user's products
+        were listed)
+    """
+    changed = _update_to_order(db_session, changes,
+                               Product.responsible_id == user_id,
+                               Product.in_use)
+    if done:
+        db_session.get(User, user_id).done_inv = True
+    return changed
+
+
+def clear_order_list(db_session: Session) -> int:
+    """Remove all the products from the order list with one `UPDATE`.
+    Returns the number of ordered products (not committed).
+
+    :param db_session: session of the transaction
+    """
+    return db_session.execute(
+        update(Product)
+        .filter(Product.to_order)
+        .values(to_order=False)
+        .execution_options(synchronize_session=False)).rowcount
+# endregion
+
+
+# region: scanner inventory
+class ScanResult(NamedTuple):
+    """Result of a scanned product observation.
+
+    :param code: product code (name)
+    :param status: `updated` | `unchanged` | `error`
+    :param message: error message
+    """
+    code: str
+    status: str
+    message: str = ""
+
+
+def apply_scans(db_session: Session,
+                observations: Sequence[dict[str, Any]],
+                complete: bool = False) -> list[ScanResult]:
+    """Apply a batch of scanned `{code, to_order}` observations: the codes
+    are resolved with one query and the valid observations are applied
+    with one `UPDATE ... CASE` (the last observation of a code wins).
+    Returns a result for each observation (not committed).
+
+    :param db_session: session of the transaction
+    :param observations: scanned products
+    :param complete: end the inventory check of the scanned products
+        responsibles
+    """
+    codes = {obs.get("code") for obs in observations
+             if isinstance(obs, dict) and isinstance(obs.get("code"), str)}
+    products = {row.name: row for row in db_session.execute(
+        select(Product.id, Product.name, Product.to_order, Product.in_use,
+               Product.responsible_id)
+        .filter(Product.name.in_(codes)))} if codes else {}
+    results = []
+    changes = {}
+    for obs in observations:
+        if (not isinstance(obs, dict)
+                or not isinstance(code := obs.get("code"), str)
+                or not isinstance(to_order := obs.get("to_order"), bool)):
+            results.append(ScanResult(
+                str(obs.get("code", "")) if isinstance(obs, dict) else "",
+                "error", str(Message.UI.Api.Observation())))
+        elif (product := products.get(code)) is None:
+            results.append(ScanResult(
+                code, "error", str(Message.Product.NotExists(code))))
+        elif to_order and not product.in_use:
+            results.append(ScanResult(
+                code, "error", str(Message.Product.ToOrder.Retired())))
+        else:
+            changes[product.id] = to_order
+            results.append(ScanResult(
+                code,
+                "unchanged" if product.to_order is to_order else "updated"))
+    stored = {product.id: product.to_order for product in products.values()}
+    _update_to_order(db_session, {
+        product_id: to_order for product_id, to_order in changes.items()
+        if stored[product_id] is not to_order})
+    if complete and changes:
+        db_session.execute(
+            update(User)
+            .filter(User.id.in_(
+                        select(Product.responsible_id)
+                        .filter(Product.id.in_(changes))),
+                    ~User.done_inv)
+            .values(done_inv=True)
+            .execution_options(synchronize_session=False))
+    return results
+# endregion
+
+
+# region: products import
+class ImportIssue(NamedTuple):
+    """Products import error.
+
+    :param line: file line of the product (`0` - whole file)
+    :param name: product code
+    :param message: error message
+    """
+    line: int
+    name: str
+    message: str
+
+
+# import file columns -> product attributes
+IMPORT_COLUMNS = {
+    "code": "name",
+    "description": "description",
+    "responsible": "responsible_id",
+    "category": "category_id",
+    "supplier": "supplier_id",
+    "measuring_unit": "meas_unit",
+    "minimum_stock": "min_stock",
+    "order_quantity": "ord_qty",
+    "critical_product": "critical",
+}
+# values of the optional critical column
+IMPORT_BOOLS = {"": False, "0": False, "no": False, "false": False,
+                "1": True, "yes": True, "true": True, "x": True}
+
+
+def _import_references(model: type[Base],
+                       names: set[str]) -> dict[str, Row]:
+    """Users, categories or suppliers state by name, in one query.
+
+    :param model: `User`, `Category` or `Supplier`
+    :param names: looked up names
+    """
+    columns = [model.id, model.name, model.in_use]
+    if model is User:
+        columns.append(User.reg_req)
+    with dbSession() as db_session:
+        return {row.name: row for row in db_session.execute(
+            select(*columns).filter(model.name.in_(names)))}
+
+
+def _import_reference(name: str,
+                      references: dict[str, Row],
+                      model: type[Base]) -> int:
+    """Id of an in use user, category or supplier; raise `ValueError` with
+    the product validators messages otherwise."""
+    messages = {User: Message.User,
+                Category: Message.Category,
+                Supplier: Message.Supplier}[model]
+    if (row := references.get(name)) is None:
+        raise ValueError(messages.NotExists(name))
+    if not row.in_use:
+        raise ValueError(messages.Products.Retired() if model is User
+                         else messages.Products.Disabled())
+    if model is User and row.reg_req:
+        raise ValueError(Message.User.Products.PendReg())
+    return row.id
+
+
+def _import_product(record: dict[str, str],
+                    references: dict[type[Base], dict[str, Row]]
+                    ) -> dict[str, Any]:
+    """Product values of an import file record; raise `ValueError` with
+    the product form and validators messages if not valid."""
+    values = {attr: (record.get(column) or "").strip()
+              for column, attr in IMPORT_COLUMNS.items()}
+    if not values["name"]:
+        raise ValueError(Message.Product.Name.Required())
+    if not (Constant.Product.Name.min_length <= len(values["name"])
+            <= Constant.Product.Name.max_length):
+        raise ValueError(Message.Product.Name.LenLimit())
+    if not values["description"]:
+        raise ValueError(Message.Product.Description.Required())
+    if not (Constant.Product.Description.min_length
+            <= len(values["description"])
+            <= Constant.Product.Description.max_length):
+        raise ValueError(Message.Product.Description.LenLimit())
+    for attr, model in (("responsible_id", User),
+                        ("category_id", Category),
+                        ("supplier_id", Supplier)):
+        values[attr] = _import_reference(
+            values[attr], references[model], model)
+    if not values["meas_unit"]:
+        raise ValueError(Message.Product.MeasUnit.Required())
+    for attr, limits, message in (
+            ("min_stock", Constant.Product.MinStock, Message.Product.MinStock),
+            ("ord_qty", Constant.Product.OrdQty, Message.Product.OrdQty)):
+        try:
+            values[attr] = int(values[attr])
+        except ValueError as err:
+            raise ValueError(message.Invalid()) from err
+        if not limits.min_value <= values[attr] <= Constant.SQLite.Int.max_value:
+            raise ValueError(message.Invalid())
+    if (critical := IMPORT_BOOLS.get(values["critical"].lower())) is None:
+        raise ValueError(Message.Product.Import.Critical())
+    values["critical"] = critical
+    return values
+
+
+@dataclass
+class ProductsImport:
+    """Import products from the records of a CSV file.
+
+    Iterating the import yields the errors of each record, then inserts all
+    the products if there were none: the responsible, category and supplier
+    names and the existing codes are read in a few set-based queries and the
+    products are inserted in `batch_size` `executemany` chunks inside one
+    transaction.
+
+    :param records: file records by column (see `IMPORT_COLUMNS`);
+        the lines are numbered from 2 (after the header)
+    :param batch_size: products inserted by one statement
+    :param inserted: number of products inserted
+    :param failed: number of records with errors
+    """
+    records: Iterable[dict[str, str]]
+    batch_size: int = Constant.Product.Import.batch_size
+    inserted: int = field(default=0, init=False)
+    failed: int = field(default=0, init=False)
+
+    @classmethod
+    def from_csv(cls, file: TextIO, **kwargs) -> ProductsImport:
+        """Import of a CSV file with a header row (column names are case and
+        spaces insensitive, the other columns are ignored); raise
+        `ValueError` if the file can't be read or has missing columns.
+
+        :param file: the text file
+        """
+        try:
+            reader = csv.DictReader(file)
+            columns = {key: name for name in reader.fieldnames or ()
+                       if (key := "_".join(name.lower().split()))
+                       in IMPORT_COLUMNS}
+            if missing := [key for key in IMPORT_COLUMNS
+                           if key not in columns
+                           and key != "critical_product"]:
+                raise ValueError(
+                    Message.Product.Import.Columns(", ".join(missing)))
+            records = [{key: record[name]
+                        for key, name in columns.items()}
+                       for record in reader]
+        except (UnicodeDecodeError, csv.Error) as err:
+            raise ValueError(Message.Product.Import.File()) from err
+        return cls(records, **kwargs)
+
+    def __iter__(self) -> Iterator[ImportIssue]:
+        records = list(self.records)
+        codes = [(record.get("code") or "").strip() for record in records]
+        references = {
+            model: _import_references(
+                model, {(record.get(column) or "").strip()
+                        for record in records})
+            for model, column in ((User, "responsible"),
+                                  (Category, "category"),
+                                  (Supplier, "supplier"))}
+        existing = set()
+        with dbSession() as db_session:
+            for start in range(0, len(codes), self.batch_size):
+                existing.update(db_session.scalars(
+                    select(Product.name).filter(
+                        Product.name.in_(
+                            codes[start:start + self.batch_size]))))
+        products = []
+        first_lines: dict[str, int] = {}
+        for line, (record, code) in enumerate(zip(records, codes), start=2):
+            try:
+                product = _import_product(record, references)
+                if code in existing:
+                    raise ValueError(Message.Product.Name.Exists(code))
+                if code in first_lines:
+                    raise ValueError(Message.Product.Import.Duplicate(
+                        code, first_lines[code]))
+            except ValueError as error:
+                self.failed += 1
+                yield ImportIssue(line, code, str(error))
+            else:
+                products.append(product)
+            first_lines.setdefault(code, line)
+        if self.failed or not products:
+            return
+        try:
+            with dbSession() as db_session, db_session.begin():
+                for start in range(0, len(products), self.batch_size):
+                    db_session.execute(
+                        insert(Product.__table__),
+                        products[start:start + self.batch_size])
+        except IntegrityError as error:
+            # created meanwhile by another request
+            self.failed = len(products)
+            with dbSession() as db_session:
+                violation = _unique_violation(
+                    db_session, error,
+                    [(Product, product["name"]) for product in products])
+            yield ImportIssue(0, "", str(violation or error.orig))
+            return
+        self.inserted = len(products)
+        logger.info("%d products imported", self.inserted)
+# endregion
+
+
 # region: database init
 # Optional creation of hidden admin (replace password)
 # from sqlalchemy import event
@@ -925,4 +2362,95 @@ class Schedule(Base):
 
 # Database creation (uncomment on first run)
 # Base.metadata.create_all(bind=engine)
+
+# indexes replaced by composite indexes with the same leading columns
+OBSOLETE_INDEXES = (
+    "idx_user_in_use",
+    "idx_category_in_use",
+    "idx_supplier_in_use",
+    "idx_product_to_order",
+    "idx_product_in_use",
+    "idx_schedule_name",
+)
+
+
+def migrate_columns(target_engine: Engine) -> bool:
+    """Add the columns missing from the tables of an existing database
+    (with their server defaults for the existing rows).
+
+    :param target_engine: engine of the database to migrate
+    :return: `True` if the database was migrated
+    """
+    with target_engine.begin() as connection:
+        migrated = False
+        for model_table in Base.metadata.sorted_tables:
+            existing = {row.name for row in connection.execute(
+                text(f"PRAGMA table_info({model_table.name})"))}
+            if not existing:
+                continue
+            for table_column in model_table.columns:
+                if table_column.name not in existing:
+                    connection.execute(text(
+                        f"ALTER TABLE {model_table.name} ADD COLUMN "
+                        f"{CreateColumn(table_column).compile(connection)}"))
+                    logger.debug("Column '%s.%s' created",
+                                 model_table.name, table_column.name)
+                    migrated = True
+    return migrated
+
+
+def migrate_indexes(target_engine: Engine) -> bool:
+    """Bring the indexes of an existing database in line with the models:
+    create missing indexes, drop obsolete ones and refresh the planner
+    statistics.
+
+    :param target_engine: engine of the database to migrate
+    :return: `True` if the database was migrated
+    """
+    with target_engine.begin() as connection:
+        existing = set(connection.scalars(
+            text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+        migrated = False
+        for model_table in Base.metadata.sorted_tables:
+            for index in sorted(model_table.indexes,
+                                key=lambda idx: idx.name):
+                if index.name not in existing:
+                    index.create(connection)
+                    logger.debug("Index '%s' created", index.name)
+                    migrated = True
+        for index_name in OBSOLETE_INDEXES:
+            if index_name in existing:
+                connection.execute(text(f"DROP INDEX {index_name}"))
+                logger.debug("Index '%s' dropped", index_name)
+                migrated = True
+        if migrated:
+            connection.execute(text("ANALYZE"))
+    return migrated
+
+
+def migrate_stats(target_engine: Engine) -> bool:
+    """Create the `stats` summary table of an existing database and bring
+    its triggers in line with `STATS_COUNTERS`; the counters are recounted
+    when anything changed.
+
+    :param target_engine: engine of the database to migrate
+    :return: `True` if the database was migrated
+    """
+    with target_engine.begin() as connection:
+        Stat.__table__.create(connection, checkfirst=True)
+        existing = dict(connection.execute(
+            text("SELECT name, sql FROM sqlite_master "
+                 "WHERE type = 'trigger'")).tuples().all())
+        migrated = False
+        for trigger, ddl in stats_triggers().items():
+            if existing.get(trigger) != ddl:
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+                connection.execute(text(ddl))
+                logger.debug("Trigger '%s' created", trigger)
+                migrated = True
+        names = set(connection.scalars(select(Stat.name)))
+        if migrated or names != STATS_COUNTERS.keys() | {DATA_VERSION}:
+            seed_stats(connection)
+            migrated = True
+    return migrated
 # endregion
@@ -1,13 +1,27 @@
 """Helpers module."""
 
+import csv
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
-from functools import wraps
+from functools import cached_property, wraps
+from io import RawIOBase, StringIO
 from logging.handlers import TimedRotatingFileHandler
 from os import path
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Iterable, Iterator, Sequence
+from unicodedata import normalize
+from urllib.parse import quote
+from xml.sax.saxutils import escape as xml_escape
+from zipfile import ZIP_DEFLATED, ZipFile
 from zoneinfo import ZoneInfo
 
-from flask import flash, redirect, session, url_for
+from flask import (Config, Response, flash, redirect, session,
+                   stream_with_context, url_for)
+from werkzeug.security import check_password_hash, generate_password_hash
 
 from constants import Constant
 from messages import Message
@@ -74,6 +88,310 @@ def admin_required(f):
 # endregion
 
 
+# region: password hashing
+@dataclass
+class PasswordHasher:
+    """Password hashing with a configurable method and cost.
+
+    Verification runs in a bounded thread pool (PBKDF2 and scrypt release
+    the GIL) so a burst of logins can't take all the workers CPU. Hash and
+    verification durations are kept in order to size the cost to the
+    hardware (see `metrics`).
+
+    :param method: werkzeug hash method with its cost
+        (ex: `pbkdf2:sha256:600000` or `scrypt:32768:8:1`)
+    :param workers: maximum concurrent verifications
+    :param timeout: seconds to wait for a verification
+    """
+
+    method: str
+    workers: int
+    timeout: float
+    _executor: ThreadPoolExecutor = field(init=False, repr=False)
+    _timings: dict[str, dict[str, float]] = field(init=False, repr=False)
+    _lock: Lock = field(init=False, repr=False, default_factory=Lock)
+
+    def __post_init__(self):
+        """Validate class data."""
+        if self.method.split(":")[0] not in {"pbkdf2", "scrypt"}:
+            raise ValueError(f"Invalid password hash method '{self.method}'")
+        if not isinstance(self.workers, int) or self.workers < 1:
+            raise ValueError(f"Invalid password hash workers '{self.workers}'")
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="password_hash")
+        self._timings = {
+            operation: {"count": 0, "total": 0.0, "max": 0.0}
+            for operation in ("hash", "verify")}
+
+    @classmethod
+    def from_env(cls) -> "PasswordHasher":
+        """Hasher from `Constant.User.Password.Hash` overridden by the
+        `FLASK_PASSWORD_HASH_*` prefixed environment config."""
+        env_config = Config(Constant.Basic.current_dir)
+        env_config.from_prefixed_env()
+        return cls(**{
+            setting: env_config.get(f"PASSWORD_HASH_{setting.upper()}",
+                                    getattr(Constant.User.Password.Hash,
+                                            setting))
+            for setting in ("method", "workers", "timeout")})
+
+    @cached_property
+    def hash_prefix(self) -> str:
+        """Method and cost prefix of the hashes (normalized by werkzeug,
+        ex: `pbkdf2` -> `pbkdf2:sha256:600000`)."""
+        return generate_password_hash("", self.method).split("$", 1)[0]
+
+    def _timed(self, operation: str, func: Callable, *args) -> Any:
+        """Run `func` and record its duration."""
+        start = perf_counter()
+        try:
+            return func(*args)
+        finally:
+            duration = perf_counter() - start
+            with self._lock:
+                timings = self._timings[operation]
+                timings["count"] += 1
+                timings["total"] += duration
+                timings["max"] = max(timings["max"], duration)
+
+    def hash(self, password: str) -> str:
+        """Hash `password` with the configured method."""
+        return self._timed(
+            "hash", generate_password_hash, password, self.method)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        """Check `password` against `pwhash` in the hashing thread pool.
+
+        A verification that doesn't get a slot in `timeout` fails."""
+        future = self._executor.submit(
+            self._timed, "verify", check_password_hash, pwhash, password)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            logger.warning("Password verification timed out")
+            return False
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """Check if `pwhash` was made with other method or cost."""
+        return pwhash.split("$", 1)[0] != self.hash_prefix
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        """Count, mean and max duration (milliseconds) for each operation."""
+        with self._lock:
+            return {
+                operation: {
+                    "count": timings["count"],
+                    "mean_ms": (1000 * timings["total"] / timings["count"]
+                                if timings["count"] else 0.0),
+                    "max_ms": 1000 * timings["max"],
+                }
+                for operation, timings in self._timings.items()}
+
+
+password_hasher = PasswordHasher.from_env()
+# endregion
+
+
+# region: exports
+EXPORT_MIMETYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+# rows written between two flushes of the exported file
+EXPORT_FLUSH_ROWS = 100
+# characters not allowed in xml documents
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+# first characters of the text cells spreadsheet apps read as formulas
+_FORMULA_PREFIXES = ("=", "+", "-", "@")
+# characters not allowed in worksheet names
+_SHEET_ILLEGAL = re.compile(r"[\[\]:*?/\\]")
+
+
+class _Chunks(RawIOBase):
+    """Write only stream collecting the written bytes until drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        """Bytes written since the last drain."""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _cell_text(value: Any) -> str:
+    """Text cell value, quoted (`'`) if it would be read as a formula."""
+    text = str(value)
+    return "'" + text if text.startswith(_FORMULA_PREFIXES) else text
+
+
+def _csv_row(values: Sequence[Any]) -> list[Any]:
+    """CSV row values (text values as `_cell_text`)."""
+    return [_cell_text(value) if isinstance(value, str) else value
+            for value in values]
+
+
+def csv_stream(header: Sequence[str],
+               rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """CSV file (utf-8 with BOM for spreadsheet apps), chunk by chunk.
+
+    :param header: columns names
+    :param rows: rows values
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(_csv_row(header))
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(_csv_row(row))
+        if count % EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _xlsx_row(values: Sequence[Any]) -> str:
+    """Worksheet row xml."""
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append("<c/>")
+        elif isinstance(value, bool):
+            cells.append(f'<c t="b"><v>{int(value)}</v></c>')
+        elif isinstance(value, (int, float)):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            text = xml_escape(_XML_ILLEGAL.sub("", _cell_text(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">'
+                         f'{text}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>"
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/'
+        'content-types">'
+        '<Default Extension="rels" ContentType="application/'
+        'vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/'
+        'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+        '2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+        '2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'),
+}
+
+
+def xlsx_stream(sheet: str,
+                header: Sequence[str],
+                rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
+    """Single worksheet XLSX file, chunk by chunk.
+
+    The zip archive is written to a non seekable stream (data descriptors
+    after each member) so nothing but the current chunk is kept in memory.
+
+    :param sheet: worksheet name (without the characters not allowed and
+        cut to 31 characters)
+    :param header: columns names
+    :param rows: rows values
+    """
+    sheet = _SHEET_ILLEGAL.sub("", sheet)[:31] or "Sheet1"
+    stream = _Chunks()
+    with ZipFile(stream, "w", compression=ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/'
+            'spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats'
+            '.org/officeDocument/2006/relationships"><sheets>'
+            f'<sheet name="{xml_escape(sheet, {chr(34): "&quot;"})}" '
+            'sheetId="1" r:id="rId1"/></sheets></workbook>')
+        yield stream.drain()
+        with archive.open("xl/worksheets/sheet1.xml", "w") as worksheet:
+            worksheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/'
+                b'spreadsheetml/2006/main"><sheetData>')
+            worksheet.write(_xlsx_row(header).encode())
+            for count, row in enumerate(rows, start=1):
+                worksheet.write(_xlsx_row(row).encode())
+                if count % EXPORT_FLUSH_ROWS == 0 and (chunk := stream.drain()):
+                    yield chunk
+            worksheet.write(b"</sheetData></worksheet>")
+    yield stream.drain()
+
+
+def attachment_disposition(file_name: str) -> str:
+    """`Content-Disposition` header value of a downloaded file: a quoted
+    ASCII `filename` for old clients and the RFC 5987 `filename*` with the
+    UTF-8 name.
+
+    :param file_name: downloaded file name (with extension)
+    """
+    ascii_name = "".join(
+        char for char in normalize("NFKD", file_name)
+        if char.isascii() and char.isprintable())
+    ascii_name = ascii_name.replace("\\", "\\\\").replace('"', '\\"')
+    return (f'attachment; filename="{ascii_name}"; '
+            f"filename*=UTF-8''{quote(file_name, safe='')}")
+
+
+def export_response(file_name: str,
+                    file_format: str,
+                    header: Sequence[str],
+                    rows: Iterable[Sequence[Any]]) -> Response:
+    """Streamed file download response.
+
+    :param file_name: downloaded file name (without extension)
+    :param file_format: `csv` | `xlsx`
+    :param header: columns names
+    :param rows: rows values, consumed while the response is sent
+    """
+    if file_format == "csv":
+        content = csv_stream(header, rows)
+    else:
+        content = xlsx_stream(file_name, header, rows)
+    response = Response(stream_with_context(content),
+                        mimetype=EXPORT_MIMETYPES[file_format])
+    response.headers["Content-Disposition"] = \
+        attachment_disposition(f"{file_name}.{file_format}")
+    response.cache_control.no_store = True
+    return response
+# endregion
+
+
 def flash_errors(form_errors: dict) -> None:
     """Flash all errors from form."""
     errors = [error for errors in form_errors.values() for error in errors]
@@ -690,6 +690,34 @@ class Message:
                 message=lambda : lazy_gettext(
                     "You have to select a new responsible first")
             )
+        class Merge:
+            """Category merge messages"""
+            Default = _Msg(
+                description="Default option for HTML select",
+                tested=True,
+                category=None,
+                message=lambda : lazy_gettext(
+                    "Select a category to merge into")
+            )
+            Invalid = _Msg(
+                tested=True,
+                category=_Color.RED.value,
+                message=lambda : lazy_gettext(
+                    "You have to select a category to merge into first")
+            )
+            Same = _Msg(
+                tested=True,
+                category=_Color.RED.value,
+                message=lambda : lazy_gettext(
+                    "A category can't be merged into itself")
+            )
+            Merged = _Msg(
+                tested=True,
+                category=_Color.GREEN.value,
+                message=lambda name, target: lazy_gettext(
+                    "The category '%(name)s' was merged into '%(target)s'",
+                    name=name, target=target)
+            )
         NotExists = _Msg(
             description=":param name: could be empty - ''",
             tested=True,
@@ -788,6 +816,34 @@ class Message:
                 message=lambda : lazy_gettext(
                     "You have to select a new responsible first")
             )
+        class Merge:
+            """Supplier merge messages"""
+            Default = _Msg(
+                description="Default option for HTML select",
+                tested=True,
+                category=None,
+                message=lambda : lazy_gettext(
+                    "Select a supplier to merge into")
+            )
+            Invalid = _Msg(
+                tested=True,
+                category=_Color.RED.value,
+                message=lambda : lazy_gettext(
+                    "You have to select a supplier to merge into first")
+            )
+            Same = _Msg(
+                tested=True,
+                category=_Color.RED.value,
+                message=lambda : lazy_gettext(
+                    "A supplier can't be merged into itself")
+            )
+            Merged = _Msg(
+                tested=True,
+                category=_Color.GREEN.value,
+                message=lambda name, target: lazy_gettext(
+                    "The supplier '%(name)s' was merged into '%(target)s'",
+                    name=name, target=target)
+            )
         NotExists = _Msg(
             description=":param name: could be empty - ''",
             tested=True,
@@ -983,6 +1039,84 @@ class Message:
                 "Cannot sort products by '%(attribute)s'",
                 attribute=attribute)
         )
+        NoPage = _Msg(
+            tested=True,
+            category=_Color.YELLOW.value,
+            message=lambda : lazy_gettext(
+                "The products page is not valid")
+        )
+        class Import:
+            """Products import messages"""
+            File = _Msg(
+                tested=True,
+                category=_Color.RED.value,
+                message=lambda : lazy_gettext(
+                    "Select a CSV file (UTF-8) to import")
+            )
+            Columns = _Msg(
+                tested=True,
+                category=_Color.RED.value,
+                message=lambda columns: lazy_gettext(
+                    "The file has no '%(columns)s' column(s)",
+                    columns=columns)
+            )
+            Critical = _Msg(
+                tested=True,
+                category=_Color.RED.value,
+                message=lambda : lazy_gettext(
+                    "The critical product value must be yes or no")
+            )
+            Duplicate = _Msg(
+                tested=True,
+                category=_Color.RED.value,
+                message=lambda name, line: lazy_gettext(
+                    "The product '%(name)s' is also on line %(line)s",
+                    name=name, line=line)
+            )
+            Imported = _Msg(
+                description="Could be one or more products",
+                tested=True,
+                category=_Color.GREEN.value,
+                message=lambda number: lazy_ngettext(
+                    "%(number)s product was imported",
+                    "%(number)s products were imported",
+                    number,
+                    number=number)
+            )
+            Failed = _Msg(
+                description="Could be one or more rows",
+                tested=True,
+                category=_Color.RED.value,
+                message=lambda number: lazy_ngettext(
+                    "Nothing was imported: %(number)s row has errors",
+                    "Nothing was imported: %(number)s rows have errors",
+                    number,
+                    number=number)
+            )
+        class BulkEdit:
+            """Products bulk edit messages"""
+            NoSelection = _Msg(
+                tested=True,
+                category=_Color.YELLOW.value,
+                message=lambda : lazy_gettext(
+                    "Select the products to edit first")
+            )
+            NoChanges = _Msg(
+                tested=True,
+                category=_Color.YELLOW.value,
+                message=lambda : lazy_gettext(
+                    "Fill in at least one field to change")
+            )
+            Updated = _Msg(
+                description="Could be one or more products",
+                tested=True,
+                category=_Color.GREEN.value,
+                message=lambda number: lazy_ngettext(
+                    "%(number)s product was updated",
+                    "%(number)s products were updated",
+                    number,
+                    number=number)
+            )
         NoOrder = _Msg(
             tested=True,
             category=_Color.YELLOW.value,
@@ -1025,6 +1159,13 @@ class Message:
             message=lambda : lazy_gettext(
                 "The schedule was updated")
         )
+        FeedReset = _Msg(
+            tested=True,
+            category=_Color.GREEN.value,
+            message=lambda : lazy_gettext(
+                "The calendar feed link was reset, the previous link " +
+                "no longer works")
+        )
     class UI:
         """Interface messages"""
         class Basic:
@@ -1063,12 +1204,67 @@ class Message:
                 message=lambda : lazy_gettext(
                     "The inventory has been submitted")
             )
+            Saved = _Msg(
+                tested=True,
+                category=_Color.GREEN.value,
+                message=lambda : lazy_gettext(
+                    "The inventory changes have been saved")
+            )
             NotReq = _Msg(
                 tested=True,
                 category=_Color.BLUE.value,
                 message=lambda : lazy_gettext(
                     "Inventorying is not necessary")
             )
+            Invalid = _Msg(
+                tested=True,
+                category=_Color.RED.value,
+                message=lambda : lazy_gettext(
+                    "The inventory changes are not valid")
+            )
+        class Api:
+            """JSON API responses"""
+            Body = _Msg(
+                tested=None,
+                category=None,
+                message=lambda : lazy_gettext(
+                    "The request must be a JSON object with a list of "
+                    "observations")
+            )
+            TooMany = _Msg(
+                tested=None,
+                category=None,
+                message=lambda limit: lazy_gettext(
+                    "A batch can have at most %(limit)s observations",
+                    limit=limit)
+            )
+            Observation = _Msg(
+                tested=None,
+                category=None,
+                message=lambda : lazy_gettext(
+                    "An observation needs a product code and a true or "
+                    "false to_order")
+            )
+            Fields = _Msg(
+                tested=None,
+                category=None,
+                message=lambda fields: lazy_gettext(
+                    "Unknown field(s): %(fields)s",
+                    fields=fields)
+            )
+            Limit = _Msg(
+                tested=None,
+                category=None,
+                message=lambda limit: lazy_gettext(
+                    "The limit must be a number between 1 and %(limit)s",
+                    limit=limit)
+            )
+            Cursor = _Msg(
+                tested=None,
+                category=None,
+                message=lambda : lazy_gettext(
+                    "The cursor is not valid")
+            )
         class Main:
             """Main blueprint"""
             LoggedInAs = _Msg(
@@ -1190,6 +1386,21 @@ class Message:
                     "*Select to order a product if current stock is less " +
                     "then minimum stock.")
             )
+            SearchResults = _Msg(
+                description="Products search results HTML message",
+                tested=False,
+                category=None,
+                message=lambda : lazy_gettext(
+                    "*Search results are ranked by relevance.")
+            )
+            InvSearch = _Msg(
+                description="Searched inventory HTML message",
+                tested=True,
+                category=None,
+                message=lambda : lazy_gettext(
+                    "*Clear the search to submit the inventory; only the " +
+                    "changes of the listed products are saved.")
+            )
             BoldUsers = _Msg(
                 description="Bolded users HTML message",
                 tested=True,
@@ -1,10 +1,14 @@
 """Tests constants and helpers."""
 
+import csv
 from dataclasses import dataclass
 from datetime import date, timedelta
+from io import BytesIO, StringIO
 from os import getenv
 from pathlib import Path
 from urllib.parse import quote
+from xml.etree import ElementTree
+from zipfile import ZipFile
 
 from werkzeug.test import TestResponse
 
@@ -39,6 +43,22 @@ def redirected_to(final_url: str,
     assert response.status_code == 200
     assert quote(response.request.path) == final_url
     return True
+
+
+def exported_rows(response: TestResponse) -> list[list[str]]:
+    """Rows (header included) of a CSV or XLSX download, as text.
+
+    :param response: the client response
+    """
+    if response.mimetype == "text/csv":
+        return list(csv.reader(StringIO(response.data.decode("utf-8-sig"))))
+    namespace = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+    with ZipFile(BytesIO(response.data)) as archive:
+        assert archive.testzip() is None
+        sheet = ElementTree.fromstring(
+            archive.read("xl/worksheets/sheet1.xml"))
+    return [["".join(cell.itertext()) for cell in row.findall("x:c", namespace)]
+            for row in sheet.iterfind("x:sheetData/x:row", namespace)]
 # endregion
 
 
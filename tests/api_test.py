@@ -0,0 +1,330 @@
+"""JSON API blueprint tests."""
+
+import pytest
+from flask import url_for
+from flask.testing import FlaskClient
+from sqlalchemy import event, select, update
+
+from constants import Constant
+from database import (Category, Product, Schedule, Supplier, User,
+                      data_version, dbSession)
+from helpers import password_hasher
+from messages import Message
+from tests import test_categories, test_products, test_suppliers, test_users
+
+pytestmark = pytest.mark.api
+
+
+# region: inventory scans
+def _credentials(user: dict) -> tuple[str, str]:
+    """HTTP basic credentials of a test user."""
+    return (user["name"], user["password"])
+
+
+admin = [user for user in test_users if user["admin"] and user["active"]][0]
+not_admin = [user for user in test_users
+             if not user["admin"] and user["active"]][0]
+
+
+@pytest.mark.parametrize("auth", [
+    pytest.param(None, id="no_credentials"),
+    pytest.param(_credentials(not_admin), id="not_admin"),
+    pytest.param((admin["name"], "wrong_password"), id="wrong_password"),
+])
+def test_failed_inventory_scans_auth(client: FlaskClient, auth):
+    """Only admins can send scans"""
+    with client:
+        client.get("/")
+        response = client.post(
+            url_for("api.inventory_scans"),
+            json={"observations": [{"code": test_products[0]["name"],
+                                    "to_order": True}]},
+            auth=auth)
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"].startswith("Basic")
+    assert response.json["error"] == str(Message.UI.Auth.AdminReq())
+    with dbSession() as db_session:
+        assert not db_session.get(Product, test_products[0]["id"]).to_order
+
+
+def test_inventory_scans(client: FlaskClient):
+    """A batch is resolved with one query and applied with one UPDATE"""
+    products = [product for product in test_products if product["in_use"]]
+    retired = [product for product in test_products
+               if not product["in_use"]][0]
+    to_order = products[:3]
+    observations = (
+        [{"code": product["name"], "to_order": True}
+         for product in to_order] +
+        [{"code": products[3]["name"], "to_order": False},
+         {"code": "not_existing_product", "to_order": True},
+         {"code": retired["name"], "to_order": True},
+         {"code": products[4]["name"], "to_order": "yes"},
+         "not_an_observation"])
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        with client:
+            client.get("/")
+            response = client.post(url_for("api.inventory_scans"),
+                                   json={"observations": observations},
+                                   auth=_credentials(admin))
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    try:
+        assert response.status_code == 200
+        assert (response.json["updated"], response.json["unchanged"],
+                response.json["errors"]) == (3, 1, 4)
+        assert [result["status"] for result in response.json["results"]] \
+            == ["updated"] * 3 + ["unchanged"] + ["error"] * 4
+        assert response.json["results"][4]["message"] \
+            == str(Message.Product.NotExists("not_existing_product"))
+        assert response.json["results"][5]["message"] \
+            == str(Message.Product.ToOrder.Retired())
+        assert response.json["results"][6]["message"] \
+            == str(Message.UI.Api.Observation())
+        assert len([statement for statement in statements
+                    if statement.startswith("SELECT products.id")]) == 1
+        assert len([statement for statement in statements
+                    if statement.startswith("UPDATE products")]) == 1
+        with dbSession() as db_session:
+            assert sorted(db_session.scalars(
+                select(Product.id).filter_by(to_order=True))) \
+                == [product["id"] for product in to_order]
+    finally:
+        with dbSession() as db_session:
+            db_session.execute(update(Product).values(to_order=False))
+            db_session.commit()
+
+
+def test_inventory_scans_complete(client: FlaskClient):
+    """The scanned products responsibles end their inventory check"""
+    user = [user for user in test_users
+            if user["active"] and user["has_products"]][-1]
+    product = [product for product in test_products
+               if product["responsible_id"] == user["id"]
+               and product["in_use"]][0]
+    with dbSession() as db_session:
+        db_session.get(User, user["id"]).done_inv = False
+        db_session.commit()
+    try:
+        with client:
+            client.get("/")
+            response = client.post(
+                url_for("api.inventory_scans"),
+                json={"observations": [{"code": product["name"],
+                                        "to_order": True}],
+                      "complete": True},
+                auth=_credentials(admin))
+        assert response.status_code == 200
+        assert response.json["updated"] == 1
+        with dbSession() as db_session:
+            assert db_session.get(User, user["id"]).done_inv
+            assert db_session.get(Product, product["id"]).to_order
+    finally:
+        with dbSession() as db_session:
+            db_session.get(Product, product["id"]).to_order = False
+            db_session.get(User, user["id"]).done_inv = True
+            db_session.commit()
+
+
+@pytest.mark.parametrize(("body", "status_code", "error"), [
+    pytest.param(None, 400, Message.UI.Api.Body(), id="no_body"),
+    pytest.param([], 400, Message.UI.Api.Body(), id="list"),
+    pytest.param({"observations": {}}, 400, Message.UI.Api.Body(),
+                 id="no_list"),
+    pytest.param({"observations":
+                  [{}] * (Constant.Basic.scan_batch_size + 1)},
+                 413,
+                 Message.UI.Api.TooMany(Constant.Basic.scan_batch_size),
+                 id="too_many"),
+])
+def test_failed_inventory_scans(client: FlaskClient, body, status_code, error):
+    """Malformed batches are rejected"""
+    with client:
+        client.get("/")
+        response = client.post(url_for("api.inventory_scans"),
+                               json=body,
+                               auth=_credentials(admin))
+        assert response.status_code == status_code
+        assert response.json["error"] == str(error)
+# endregion
+
+
+# region: read-only listings
+def _listed_ids(client: FlaskClient, url: str) -> list[int]:
+    """Ids of all the elements, following the `next` urls."""
+    ids = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        ids.extend(element["id"] for element in response.json["data"])
+        url = response.json["next"]
+    return ids
+
+
+@pytest.mark.parametrize(("resource", "model", "expected"), [
+    pytest.param("products", Product,
+                 [product["id"] for product in test_products], id="products"),
+    pytest.param("products-to-order", Product, [], id="products-to-order"),
+    pytest.param("users", User,
+                 [user["id"] for user in test_users
+                  if user["name"] != "Admin"],
+                 id="users"),
+    pytest.param("categories", Category,
+                 [category["id"] for category in test_categories],
+                 id="categories"),
+    pytest.param("suppliers", Supplier,
+                 [supplier["id"] for supplier in test_suppliers],
+                 id="suppliers"),
+    pytest.param("schedules", Schedule, None, id="schedules"),
+])
+def test_api_elements(
+        client: FlaskClient, admin_logged_in: User, resource, model, expected):
+    """Walking the keyset pages lists every element once, in order"""
+    # pylint: disable=unused-argument
+    if expected is None:
+        with dbSession() as db_session:
+            expected = list(db_session.scalars(
+                select(model.id).order_by(model.id)))
+    with client:
+        client.get("/")
+        response = client.get(url_for("api.elements", resource=resource))
+        assert response.status_code == 200
+        assert response.headers["ETag"]
+        assert "password" not in response.text
+        assert _listed_ids(
+            client,
+            url_for("api.elements", resource=resource, limit=3)) \
+            == sorted(expected)
+
+
+def test_api_elements_fields(
+        client: FlaskClient, admin_logged_in: User):
+    """Only the selected fields (and the id) are returned"""
+    # pylint: disable=unused-argument
+    with client:
+        client.get("/")
+        response = client.get(
+            url_for("api.elements", resource="products",
+                    fields="name,min_stock,name", limit=2))
+        assert response.status_code == 200
+        assert [list(product) for product in response.json["data"]] \
+            == [["id", "min_stock", "name"]] * 2
+        assert response.json["data"][0]["name"] == test_products[0]["name"]
+        assert "fields=name" in response.json["next"]
+        response = client.get(
+            url_for("api.elements", resource="schedules",
+                    fields="next_date"))
+        assert all(len(schedule["next_date"]) == len("2023-05-06")
+                   for schedule in response.json["data"])
+
+
+def test_api_elements_not_modified(
+        client: FlaskClient, admin_logged_in: User):
+    """A matching ETag gets a 304 without reading the rows"""
+    # pylint: disable=unused-argument
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    with client:
+        client.get("/")
+        url = url_for("api.elements", resource="products")
+        response = client.get(url)
+        etag = response.headers["ETag"]
+        event.listen(bind, "before_cursor_execute", count_statements)
+        try:
+            response = client.get(url, headers={"If-None-Match": etag})
+        finally:
+            event.remove(bind, "before_cursor_execute", count_statements)
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert not [statement for statement in statements
+                    if "FROM products" in statement]
+        # any change gives a new version
+        with dbSession() as db_session:
+            db_session.get(Category, test_categories[0]["id"]).details = "x"
+            db_session.commit()
+        try:
+            response = client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.headers["ETag"] != etag
+        finally:
+            with dbSession() as db_session:
+                db_session.get(Category, test_categories[0]["id"]).details \
+                    = test_categories[0]["details"]
+                db_session.commit()
+
+
+def test_api_elements_not_modified_basic_auth(
+        client: FlaskClient, monkeypatch: pytest.MonkeyPatch):
+    """A matching ETag gets a 304 before the credentials are hashed; only
+    the signed data version matches"""
+    verified = []
+    verify = password_hasher.verify
+    def count_verify(*args):
+        verified.append(args)
+        return verify(*args)
+    monkeypatch.setattr(password_hasher, "verify", count_verify)
+    with client:
+        client.get("/")
+        url = url_for("api.elements", resource="products")
+        response = client.get(url, auth=_credentials(admin))
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert len(verified) == 1
+        response = client.get(url, auth=_credentials(admin),
+                              headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert len(verified) == 1
+        # the unsigned version doesn't match
+        with dbSession() as db_session:
+            version = data_version(db_session)
+        response = client.get(url, headers={"If-None-Match": f'"{version}"'})
+        assert response.status_code == 401
+        assert "ETag" not in response.headers
+
+
+@pytest.mark.parametrize(("query", "error"), [
+    pytest.param({"fields": "name,password"},
+                 Message.UI.Api.Fields("password"), id="fields"),
+    pytest.param({"limit": "0"},
+                 Message.UI.Api.Limit(Constant.Basic.api_max_page_size),
+                 id="limit_zero"),
+    pytest.param({"limit": str(Constant.Basic.api_max_page_size + 1)},
+                 Message.UI.Api.Limit(Constant.Basic.api_max_page_size),
+                 id="limit_max"),
+    pytest.param({"limit": "all"},
+                 Message.UI.Api.Limit(Constant.Basic.api_max_page_size),
+                 id="limit_text"),
+    pytest.param({"after": "first"}, Message.UI.Api.Cursor(), id="after"),
+])
+def test_failed_api_elements(
+        client: FlaskClient, admin_logged_in: User, query, error):
+    """Invalid fields, limit or cursor"""
+    # pylint: disable=unused-argument
+    with client:
+        client.get("/")
+        response = client.get(
+            url_for("api.elements", resource="users", **query))
+        assert response.status_code == 400
+        assert response.json["error"] == str(error)
+
+
+def test_failed_api_elements_auth(client: FlaskClient):
+    """Only admins can read the API"""
+    with client:
+        client.get("/")
+        response = client.get(url_for("api.elements", resource="users"),
+                              auth=_credentials(not_admin))
+        assert response.status_code == 401
+        assert client.get("/api/not-a-resource",
+                          auth=_credentials(admin)).status_code == 404
+# endregion
@@ -2,6 +2,7 @@
 
 import re
 from html import unescape
+from threading import Event
 
 import pytest
 from flask import g, session, url_for
@@ -9,12 +10,13 @@ from flask.testing import FlaskClient
 from hypothesis import assume, example, given
 from hypothesis import strategies as st
 from pytest import LogCaptureFixture
-from sqlalchemy import select
-from werkzeug.security import check_password_hash
+from sqlalchemy import select, update
+from werkzeug.security import check_password_hash, generate_password_hash
 
 from app import app, babel, get_locale
 from constants import Constant
 from database import User, dbSession
+from helpers import PasswordHasher, password_hasher
 from messages import Message
 from tests import InvalidUser, ValidUser, redirected_to, test_users
 
@@ -473,6 +475,34 @@ def test_login_and_logout(client: FlaskClient, user: dict):
         assert not session.get("user_name")
 
 
+def test_login_rehash_password(client: FlaskClient, caplog: LogCaptureFixture):
+    """Outdated password hashes are rehashed on login."""
+    user = [user for user in test_users if user["active"]][1]
+    with dbSession() as db_session:
+        db_session.execute(
+            update(User)
+            .filter_by(id=user["id"])
+            .values(password=generate_password_hash(
+                user["password"], "pbkdf2:sha256:1000")))
+        db_session.commit()
+    for _ in range(2):
+        with client:
+            client.get("/")
+            client.get(url_for("auth.login"))
+            data = {
+                "csrf_token": g.csrf_token,
+                "name": user["name"],
+                "password": user["password"]}
+            response = client.post("/auth/login", data=data,
+                                   follow_redirects=True)
+            assert redirected_to(url_for("main.index"), response)
+            client.get(url_for("auth.logout"))
+    assert caplog.messages.count("Password rehashed") == 1
+    with dbSession() as db_session:
+        pwhash = db_session.get(User, user["id"]).password
+    assert pwhash.startswith(password_hasher.hash_prefix + "$")
+    assert check_password_hash(pwhash, user["password"])
+
 @given(csrf=st.text(min_size=1),
        user=st.sampled_from([user for user in test_users if user["active"]]))
 @example(csrf=None, user=test_users[1])
@@ -498,6 +528,55 @@ def test_failed_login_wrong_csrf(client: FlaskClient, csrf, user):
 # endregion
 
 
+# region: password hashing service
+def test_password_hasher(monkeypatch: pytest.MonkeyPatch):
+    """test_password_hasher"""
+    monkeypatch.setenv("FLASK_PASSWORD_HASH_METHOD", "scrypt:1024:8:1")
+    monkeypatch.setenv("FLASK_PASSWORD_HASH_WORKERS", "1")
+    hasher = PasswordHasher.from_env()
+    assert hasher.method == "scrypt:1024:8:1"
+    assert hasher.workers == 1
+    assert hasher.timeout == Constant.User.Password.Hash.timeout
+    pwhash = hasher.hash(ValidUser.password)
+    assert pwhash.startswith("scrypt:1024:8:1$")
+    assert hasher.verify(pwhash, ValidUser.password)
+    assert not hasher.verify(pwhash, ValidUser.password + "x")
+    assert not hasher.needs_rehash(pwhash)
+    assert hasher.needs_rehash(
+        generate_password_hash(ValidUser.password, "pbkdf2:sha256:1000"))
+    metrics = hasher.metrics()
+    assert metrics["hash"]["count"] == 1
+    assert metrics["verify"]["count"] == 2
+    assert 0 < metrics["verify"]["mean_ms"] <= metrics["verify"]["max_ms"]
+
+
+@pytest.mark.parametrize(("method", "workers"), [
+    pytest.param("md5", 1, id="Invalid method"),
+    pytest.param("pbkdf2", 0, id="Invalid workers"),
+])
+def test_failed_password_hasher(method, workers):
+    """test_failed_password_hasher"""
+    with pytest.raises(ValueError, match="Invalid password hash"):
+        PasswordHasher(method=method, workers=workers, timeout=1)
+
+
+def test_password_hasher_verify_timeout(caplog: LogCaptureFixture):
+    """Verification fails if it doesn't get a worker in time."""
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000",
+                            workers=1,
+                            timeout=0.05)
+    pwhash = hasher.hash(ValidUser.password)
+    busy = Event()
+    hasher._executor.submit(busy.wait, 5) # pylint: disable=protected-access
+    try:
+        assert not hasher.verify(pwhash, ValidUser.password)
+    finally:
+        busy.set()
+    assert "Password verification timed out" in caplog.messages
+    assert hasher.verify(pwhash, ValidUser.password)
+# endregion
+
+
 # region: change password
 def test_change_password_landing_page_if_not_logged_in(client: FlaskClient):
     """test_change_password_landing_page_if_not_logged_in"""
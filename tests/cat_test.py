@@ -535,4 +535,116 @@ def test_failed_reassign_category_bad_name(
             follow_redirects=True)
         assert redirected_to(url_for("cat.categories"), response)
         assert str(Message.Category.NotExists(cat_name)) in response.text
+
+def test_merge_category(client: FlaskClient, admin_logged_in: User):
+    """All the products are moved and the category is deleted"""
+    with dbSession() as db_session:
+        target = db_session.get(Category, ValidProduct.category_id)
+        source = Category(name=ValidCategory.name)
+        db_session.add(source)
+        db_session.commit()
+        for ind in range(3):
+            db_session.add(Product(
+                name="_".join([ValidProduct.name, str(ind)]),
+                description=ValidProduct.description,
+                responsible=db_session.get(User, ValidProduct.responsible_id),
+                category=db_session.get(Category, source.id),
+                supplier=db_session.get(Supplier, ValidProduct.supplier_id),
+                meas_unit=ValidProduct.meas_unit,
+                min_stock=ValidProduct.min_stock,
+                ord_qty=ValidProduct.ord_qty))
+        db_session.commit()
+        source_id = source.id
+        product_ids = db_session.scalars(
+            select(Product.id).filter_by(category_id=source_id)).all()
+        assert len(product_ids) == 3
+        with client:
+            client.get("/")
+            assert session["admin"]
+            response = client.get(
+                url_for("cat.reassign_category", category=source.name))
+            assert str(Message.Category.Merge.Default()) in response.text
+            assert target.name in response.text
+            data = {
+                "csrf_token": g.csrf_token,
+                "target_id": str(target.id),
+                "merge": True,
+                }
+            response = client.post(
+                url_for("cat.merge_category", category=source.name),
+                data=data,
+                follow_redirects=True)
+            assert redirected_to(url_for("cat.categories"), response)
+            assert str(Message.Category.Merge.Merged(
+                source.name, target.name)) \
+                in unescape(response.text)
+    # check and teardown
+    with dbSession() as db_session:
+        assert not db_session.get(Category, source_id)
+        for product_id in product_ids:
+            product = db_session.get(Product, product_id)
+            assert product.category_id == target.id
+            db_session.delete(product)
+        db_session.commit()
+
+
+@pytest.mark.parametrize(("target_id", "flash_message"), [
+    pytest.param(0, str(Message.Category.Merge.Invalid()), id="no_target"),
+    pytest.param(ValidProduct.category_id, str(Message.Category.Merge.Same()),
+                 id="same"),
+    pytest.param(-1, "Not a valid choice.", id="invalid_target"),
+])
+def test_failed_merge_category(
+        client: FlaskClient, admin_logged_in: User,
+        target_id: int, flash_message: str):
+    """test_failed_merge_category"""
+    with dbSession() as db_session:
+        category = db_session.get(Category, ValidProduct.category_id)
+        products = db_session.scalars(
+            select(Product.id).filter_by(category_id=category.id)).all()
+    with client:
+        client.get("/")
+        assert session["user_name"] == admin_logged_in.name
+        assert session["admin"]
+        client.get(url_for("cat.reassign_category", category=category.name))
+        data = {
+            "csrf_token": g.csrf_token,
+            "target_id": str(target_id),
+            "merge": True,
+            }
+        response = client.post(
+            url_for("cat.merge_category", category=category.name),
+            data=data,
+            follow_redirects=True)
+        assert redirected_to(
+            url_for("cat.reassign_category", category=category.name),
+            response)
+        assert flash_message in unescape(response.text)
+    with dbSession() as db_session:
+        assert db_session.get(Category, category.id)
+        assert db_session.scalars(
+            select(Product.id).filter_by(category_id=category.id)).all() \
+            == products
+
+
+def test_failed_merge_category_bad_name(
+        client: FlaskClient, admin_logged_in: User):
+    """test_failed_merge_category_bad_name"""
+    category_name = "not_existing_category"
+    with client:
+        client.get("/")
+        assert session["user_name"] == admin_logged_in.name
+        client.get(url_for("cat.reassign_category",
+                           category=test_categories[0]["name"]))
+        data = {
+            "csrf_token": g.csrf_token,
+            "target_id": str(ValidProduct.category_id),
+            "merge": True,
+            }
+        response = client.post(
+            url_for("cat.merge_category", category=category_name),
+            data=data,
+            follow_redirects=True)
+        assert redirected_to(url_for("cat.categories"), response)
+        assert str(Message.Category.NotExists(category_name)) in response.text
 # endregion
@@ -10,13 +10,13 @@ from freezegun import freeze_time
 from hypothesis import given
 from hypothesis import strategies as st
 from pytest import LogCaptureFixture
-from sqlalchemy import select
+from sqlalchemy import delete, event, insert, select, text
 
 from app import mail
 from blueprints.sch.sch import IndivSchedule, update_schedules
-from daily_task import (db_backup, db_reinit, main, send_admins_notif,
-                        send_log, send_users_notif)
-from database import Product, Schedule, User, dbSession
+from daily_task import (db_backup, db_migrate, db_reinit, main,
+                        send_admins_notif, send_log, send_users_notif)
+from database import OBSOLETE_INDEXES, Product, Schedule, User, dbSession
 from tests import BACKUP_DB, LOG_FILE, ORIG_DB, PROD_DB, TEMP_DB, test_users
 
 pytestmark = pytest.mark.daily
@@ -261,6 +261,41 @@ def test_failed_db_reinit(caplog: LogCaptureFixture):
     TEMP_DB.rename(PROD_DB)
     ORIG_DB.unlink()
 # endregion
+
+
+# region: migrate
+def test_db_migrate(caplog: LogCaptureFixture):
+    """Test migrating the columns, indexes and stats of an existing
+    database"""
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    # setup - previous schema columns and indexes
+    with bind.begin() as connection:
+        connection.execute(text("ALTER TABLE users DROP COLUMN feed_version"))
+        connection.execute(text("DROP INDEX idx_product_inventory"))
+        connection.execute(
+            text("CREATE INDEX idx_product_in_use ON products (in_use)"))
+        connection.execute(text("DROP TRIGGER trg_stats_products_update"))
+    # run test
+    db_migrate()
+    assert "Column 'users.feed_version' created" in caplog.messages
+    assert "Database columns migrated" in caplog.messages
+    assert "Index 'idx_product_inventory' created" in caplog.messages
+    assert "Index 'idx_product_in_use' dropped" in caplog.messages
+    assert "Database indexes migrated" in caplog.messages
+    assert "Trigger 'trg_stats_products_update' created" in caplog.messages
+    assert "Database stats migrated" in caplog.messages
+    caplog.clear()
+    db_migrate()
+    assert "Database columns are up to date" in caplog.messages
+    assert "Database indexes are up to date" in caplog.messages
+    assert "Database stats are up to date" in caplog.messages
+    assert "Database search tables are up to date" in caplog.messages
+    with bind.connect() as connection:
+        indexes = set(connection.scalars(
+            text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+    assert "idx_product_inventory" in indexes
+    assert not indexes.intersection(OBSOLETE_INDEXES)
+# endregion
 # endregion
 
 
@@ -397,6 +432,60 @@ def test_update_group_schedules_1(caplog: LogCaptureFixture):
         db_session.commit()
 
 
+@freeze_time("2013-05-06")
+def test_update_schedules_catch_up(caplog: LogCaptureFixture):
+    """Many schedule rows years behind are updated by a few statements"""
+    # constants
+    name = "test_catch_up"
+    rows = 500
+    # setup
+    with dbSession() as db_session:
+        db_session.execute(insert(Schedule), [
+            {"name": name,
+             "type": "individual",
+             "elem_id": elem_id,
+             "next_date": date.today() + timedelta(weeks=elem_id - 1),
+             "update_date": date.today() + timedelta(weeks=elem_id - 1, days=2),
+             "update_interval": 7}
+            for elem_id in range(1, rows + 1)])
+        db_session.commit()
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    # run test
+    with freeze_time(date(2023, 5, 9)):
+        event.listen(bind, "before_cursor_execute", count_statements)
+        try:
+            update_schedules()
+        finally:
+            event.remove(bind, "before_cursor_execute", count_statements)
+        assert f"{rows} schedules updated" in caplog.messages
+        assert len(statements) <= 3
+        with dbSession() as db_session:
+            schedules: list[Schedule] = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=name)
+                .order_by(Schedule.next_date)).all()
+        # the order is rotated and the first update date is this week
+        first_id = schedules[0].elem_id
+        assert [schedule.elem_id for schedule in schedules] == \
+            [*range(first_id, rows + 1), *range(1, first_id)]
+        assert date.today() < schedules[0].update_date <= \
+            date.today() + timedelta(weeks=1)
+        for prev_sch, sch in zip(schedules, schedules[1:]):
+            assert sch.next_date - prev_sch.next_date == timedelta(weeks=1)
+            assert sch.update_date - sch.next_date == timedelta(days=2)
+        caplog.clear()
+        update_schedules()
+        assert "No need to update schedules" in caplog.messages
+    # teardown
+    with dbSession() as db_session:
+        db_session.execute(delete(Schedule).filter_by(name=name))
+        db_session.commit()
+
+
 @freeze_time("2023-09-01")
 def test_update_group_schedules_2(caplog: LogCaptureFixture):
     """Explicit date checking 2 groups 1 weeks interval"""
@@ -3,18 +3,33 @@
 
 import re
 from datetime import date, timedelta
+from pathlib import Path
 from typing import Optional
 
 import pytest
 from freezegun import freeze_time
 from hypothesis import assume, example, given
 from hypothesis import strategies as st
-from sqlalchemy import insert, select
+from flask import g
+from sqlalchemy import (URL, create_engine, event, func, insert, select,
+                        text, update)
+from sqlalchemy.orm import Session, undefer
 from werkzeug.security import check_password_hash
 
 from blueprints.sch import clean_sch_info, sat_sch_info
 from constants import Constant
-from database import Category, Product, Schedule, Supplier, User, dbSession
+from database import (DATA_VERSION, STATS_COUNTERS, Base, Category, Product,
+                      Schedule, Stat, Supplier, User, bulk_edit_products,
+                      clear_order_list, clear_reference_cache,
+                      clear_schedule_status, close_request_session,
+                      data_version, dbSession, global_stats,
+                      load_products_counters, memo_scalar, merge_into,
+                      migrate_columns, migrate_search, migrate_stats,
+                      reassign_responsible, reference_choices,
+                      register_sqlite_profile, request_session,
+                      schedule_status, search_products, search_query,
+                      session_scope, sqlite_profile, start_inventory_check,
+                      stats_aggregate, unique_by_constraint)
 from messages import Message
 from tests import (ValidCategory, ValidProduct, ValidSchedule, ValidSupplier,
                    ValidUser, test_categories, test_products, test_schedules,
@@ -23,6 +38,57 @@ from tests import (ValidCategory, ValidProduct, ValidSchedule, ValidSupplier,
 pytestmark = pytest.mark.db
 
 
+# region: sqlite engine profile
+def test_sqlite_profile_defaults():
+    """test_sqlite_profile_defaults"""
+    profile = sqlite_profile()
+    assert profile["journal_mode"] == Constant.SQLite.Pragma.journal_mode
+    assert profile["synchronous"] == Constant.SQLite.Pragma.synchronous
+    assert profile["busy_timeout"] == Constant.SQLite.Pragma.busy_timeout
+    assert profile["mmap_size"] == Constant.SQLite.Pragma.mmap_size
+    assert profile["cache_size"] == Constant.SQLite.Pragma.cache_size
+    assert profile["temp_store"] == Constant.SQLite.Pragma.temp_store
+
+
+def test_sqlite_profile_env_config(
+        monkeypatch: pytest.MonkeyPatch, tmp_path: Path,
+        caplog: pytest.LogCaptureFixture):
+    """Override the profile with prefixed env vars and apply it."""
+    monkeypatch.setenv("FLASK_SQLITE_BUSY_TIMEOUT", "1234")
+    monkeypatch.setenv("FLASK_SQLITE_SYNCHRONOUS", "full")
+    monkeypatch.setenv("FLASK_SQLITE_MMAP_SIZE", "null")
+    profile = sqlite_profile()
+    assert profile["busy_timeout"] == 1234
+    assert profile["synchronous"] == "FULL"
+    assert "mmap_size" not in profile
+    test_engine = create_engine(
+        URL.create(drivername="sqlite",
+                   database=str(tmp_path / "profile.db")))
+    register_sqlite_profile(test_engine, profile)
+    with test_engine.connect() as connection:
+        assert connection.execute(
+            text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(
+            text("PRAGMA busy_timeout")).scalar() == 1234
+    test_engine.dispose()
+    assert ("SQLite engine profile: journal_mode=wal, synchronous=2, " +
+            "busy_timeout=1234") in caplog.text
+
+
+@pytest.mark.parametrize(("env_var", "value"), [
+    pytest.param("FLASK_SQLITE_JOURNAL_MODE", "wrong", id="Journal mode"),
+    pytest.param("FLASK_SQLITE_BUSY_TIMEOUT", "true", id="Busy timeout"),
+    pytest.param("FLASK_SQLITE_CACHE_SIZE", "big", id="Cache size"),
+])
+def test_failed_sqlite_profile_env_config(
+        monkeypatch: pytest.MonkeyPatch, env_var: str, value: str):
+    """test_failed_sqlite_profile_env_config"""
+    monkeypatch.setenv(env_var, value)
+    with pytest.raises(ValueError, match="Invalid SQLite pragma"):
+        sqlite_profile()
+# endregion
+
+
 # region: test "users" table
 @pytest.fixture(name="default_user_attr")
 def default_user_attr_fixture() -> dict[str]:
@@ -240,6 +306,305 @@ def test_user_products(user: dict[str]):
         db_session.commit()
 
 
+@pytest.mark.parametrize(("model", "test_elements", "foreign_key"), [
+    pytest.param(User, test_users, "responsible_id", id="Users"),
+    pytest.param(Category, test_categories, "category_id", id="Categories"),
+    pytest.param(Supplier, test_suppliers, "supplier_id", id="Suppliers"),
+])
+def test_load_products_counters(model, test_elements, foreign_key):
+    """Test bulk loading of in_use_products and all_products counters."""
+    with dbSession() as db_session:
+        elements = db_session.scalars(select(model)).all()
+        load_products_counters(db_session, elements)
+        for element in elements:
+            assert "all_products_count" in element.__dict__
+            assert "in_use_products_count" in element.__dict__
+        # counters are loaded; no more queries after the session is closed
+    for element in elements:
+        test_element = [elem for elem in test_elements
+                        if elem["id"] == element.id][0]
+        assert element.all_products == len(
+            [product for product in test_products
+             if product[foreign_key] == test_element["id"]])
+        assert element.in_use_products == len(
+            [product for product in test_products
+             if product[foreign_key] == test_element["id"]
+             and product["in_use"]])
+    with dbSession() as db_session:
+        element = db_session.scalar(
+            select(model)
+            .filter_by(id=test_elements[1]["id"])
+            .options(undefer(model.in_use_products_count)))
+        assert element.in_use_products_count == element.in_use_products
+
+
+def test_request_session_memo(client):
+    """Test the request scoped session and its memoized reads."""
+    statement = select(func.count(Product.id)).filter_by(in_use=True)
+    with client.application.test_request_context():
+        db_session = request_session()
+        with session_scope() as scoped_session:
+            assert scoped_session is db_session
+        assert memo_scalar(db_session, statement) == len(
+            [product for product in test_products if product["in_use"]])
+        assert len(db_session.info["memo"]) == 1
+        # a commit from another session clears the request memo
+        with dbSession() as other_session:
+            other_session.commit()
+        assert "memo" not in db_session.info
+        close_request_session()
+        assert "db_session" not in g
+    with session_scope() as scoped_session:
+        assert scoped_session is not db_session
+
+@pytest.mark.parametrize(("statement", "index"), [
+    pytest.param(
+        select(Product)
+        .filter_by(responsible_id=test_users[1]["id"], in_use=True)
+        .order_by(Product.category_id, Product.name),
+        "idx_product_inventory",
+        id="Inventory"),
+    pytest.param(
+        select(Product).order_by(func.lower(Product.name)),
+        "idx_product_lower_name",
+        id="Products sorted by name"),
+    pytest.param(
+        select(func.count(Product.id)).filter_by(in_use=True, to_order=True),
+        "idx_product_to_order_in_use",
+        id="Products to order"),
+    pytest.param(
+        select(User)
+        .filter_by(in_use=True, reg_req=False)
+        .order_by(func.lower(User.name)),
+        "idx_user_in_use_reg_req",
+        id="Users choices"),
+    pytest.param(
+        select(Category)
+        .order_by(Category.in_use.desc(), func.lower(Category.name)),
+        "idx_category_in_use_lower_name",
+        id="Categories"),
+    pytest.param(
+        select(Schedule)
+        .filter_by(name=test_schedules[0]["name"])
+        .order_by(Schedule.next_date),
+        "idx_schedule_name_next_date",
+        id="Schedule"),
+])
+def test_query_plan_indexes(statement, index):
+    """Test hot queries are searched or sorted using an index."""
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    with bind.connect() as connection:
+        plan = connection.execute(
+            text("EXPLAIN QUERY PLAN " + str(statement.compile(
+                bind, compile_kwargs={"literal_binds": True})))).all()
+    details = [row[-1] for row in plan]
+    assert any(index in detail for detail in details)
+    assert not any("TEMP B-TREE" in detail for detail in details)
+
+@pytest.mark.parametrize(("model", "test_elements"), [
+    pytest.param(User, [user for user in test_users
+                        if user["in_use"] and not user["reg_req"]],
+                 id="Users"),
+    pytest.param(Category, [cat for cat in test_categories if cat["in_use"]],
+                 id="Categories"),
+    pytest.param(Supplier, [sup for sup in test_suppliers if sup["in_use"]],
+                 id="Suppliers"),
+])
+def test_reference_choices(model, test_elements):
+    """Test cached select fields choices and their invalidation."""
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    clear_reference_cache()
+    choices = reference_choices(model)
+    assert sorted(choices) == sorted(
+        (elem["id"], elem["name"]) for elem in test_elements)
+    assert [name.lower() for _, name in choices] == \
+        sorted(name.lower() for _, name in choices)
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        assert reference_choices(model) == choices
+        assert not statements
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    elem_id, name = choices[0]
+    # rolled back changes keep the cache
+    with dbSession() as db_session:
+        db_session.get(model, elem_id).name = "Zzz renamed"
+        db_session.flush()
+        db_session.rollback()
+    assert reference_choices(model) == choices
+    # committed changes clear it
+    with dbSession() as db_session:
+        db_session.get(model, elem_id).name = "Zzz renamed"
+        db_session.commit()
+    assert reference_choices(model)[-1] == (elem_id, "Zzz renamed")
+    # bulk statements too
+    with dbSession() as db_session:
+        db_session.execute(
+            update(model).filter_by(id=elem_id).values(name=name))
+        db_session.commit()
+    assert reference_choices(model) == choices
+
+
+def _expected_stats() -> dict[str, int]:
+    """Global stats computed from the test elements."""
+    test_elements = {User: test_users, Category: test_categories,
+                     Supplier: test_suppliers, Product: test_products}
+    return {name: sum(all(elem[column] == value
+                          for column, value in criteria.items())
+                      for elem in test_elements[model])
+            for name, (model, criteria) in STATS_COUNTERS.items()}
+
+
+def test_global_stats():
+    """Test the stats summary table and the aggregate query."""
+    with dbSession() as db_session:
+        assert global_stats(db_session) == _expected_stats()
+        assert dict(db_session.execute(stats_aggregate()).one()._mapping) \
+            == _expected_stats()
+
+
+def test_global_stats_triggers():
+    """Test the stats triggers on insert, update, bulk update and delete."""
+    with dbSession() as db_session:
+        product = Product(
+            name="Stats product",
+            description="Some description",
+            responsible=db_session.get(User, 1),
+            category=db_session.get(Category, 1),
+            supplier=db_session.get(Supplier, 1),
+            meas_unit="pc",
+            min_stock=1,
+            ord_qty=1,
+            critical=True)
+        db_session.add(product)
+        db_session.flush()
+        stats = global_stats(db_session)
+        assert stats == dict(db_session.execute(stats_aggregate()).one()
+                             ._mapping)
+        assert stats["all_products"] == _expected_stats()["all_products"] + 1
+        assert stats["in_use_critical_products"] == \
+            _expected_stats()["in_use_critical_products"] + 1
+        product.to_order = True
+        db_session.flush()
+        assert global_stats(db_session)["products_to_order"] == \
+            _expected_stats()["products_to_order"] + 1
+        db_session.execute(update(Product).values(in_use=False))
+        db_session.execute(update(Category).values(in_use=False))
+        stats = global_stats(db_session)
+        assert stats == dict(db_session.execute(stats_aggregate()).one()
+                             ._mapping)
+        assert stats["in_use_products"] == stats["products_to_order"] == \
+            stats["in_use_categories"] == 0
+        db_session.delete(product)
+        db_session.flush()
+        assert global_stats(db_session)["all_products"] == \
+            _expected_stats()["all_products"]
+        db_session.rollback()
+        assert global_stats(db_session) == _expected_stats()
+
+
+def test_global_stats_without_summary_table():
+    """Test the stats of a database without the stats summary table."""
+    test_engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        test_engine,
+        tables=[table for table in Base.metadata.sorted_tables
+                if table is not Stat.__table__])
+    with test_engine.begin() as connection:
+        connection.execute(insert(Category).values(name="cat", in_use=True))
+    with Session(test_engine) as db_session:
+        stats = global_stats(db_session)
+    assert stats["all_categories"] == stats["in_use_categories"] == 1
+    assert not stats["all_products"]
+    assert migrate_stats(test_engine)
+    assert not migrate_stats(test_engine)
+    with test_engine.begin() as connection:
+        connection.execute(update(Category).values(in_use=False))
+    with Session(test_engine) as db_session:
+        assert db_session.scalar(
+            select(Stat.value).filter_by(name="in_use_categories")) == 0
+        assert global_stats(db_session)["all_categories"] == 1
+
+
+def test_data_version():
+    """Any change of the versioned tables increments the data version."""
+    with dbSession() as db_session:
+        version = data_version(db_session)
+        assert version
+        db_session.get(Category, 1).details = "New details"
+        db_session.flush()
+        assert data_version(db_session) == version + 1
+        db_session.execute(update(Product).values(min_stock=1))
+        assert data_version(db_session) == version + 1 + len(test_products)
+        db_session.rollback()
+        assert data_version(db_session) == version
+    # not migrated and migrated database
+    test_engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        test_engine,
+        tables=[table for table in Base.metadata.sorted_tables
+                if table is not Stat.__table__])
+    with Session(test_engine) as db_session:
+        assert data_version(db_session) is None
+    assert migrate_stats(test_engine)
+    with test_engine.begin() as connection:
+        connection.execute(insert(Category).values(name="cat", in_use=True))
+        assert connection.scalar(
+            select(Stat.value).filter_by(name=DATA_VERSION)) == 2
+
+
+def test_schedule_status():
+    """Test the cached this week schedule status."""
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    clear_schedule_status()
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        status = schedule_status()
+        assert len(statements) == 1
+        with dbSession() as db_session:
+            users = db_session.scalars(select(User)).all()
+            statements.clear()
+            flags = [(user.sat_group_this_week, user.clean_this_week)
+                     for user in users]
+        assert not statements
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    assert status == {(sat_sch_info.en_name, 1),
+                      (clean_sch_info.en_name,
+                       [user["id"] for user in test_users
+                        if user["active"]][0])}
+    assert flags == [((sat_sch_info.en_name, user.sat_group) in status,
+                      (clean_sch_info.en_name, user.id) in status)
+                     for user in users]
+    # changes made outside the app sessions are seen after the next
+    # schedules update date
+    with dbSession() as db_session:
+        next_update = db_session.scalar(select(func.min(Schedule.update_date)))
+    with bind.begin() as connection:
+        connection.execute(update(Schedule)
+                           .filter_by(name=sat_sch_info.en_name)
+                           .values(name="renamed"))
+    try:
+        assert schedule_status() == status
+        with freeze_time(next_update):
+            assert (sat_sch_info.en_name, 1) not in schedule_status()
+    finally:
+        with bind.begin() as connection:
+            connection.execute(update(Schedule)
+                               .filter_by(name="renamed")
+                               .values(name=sat_sch_info.en_name))
+        clear_schedule_status()
+    assert schedule_status() == status
+
+
 def test_sat_group_this_week_property():
     """test_sat_group_this_week_property"""
     with dbSession() as db_session:
@@ -347,6 +712,7 @@ def test_validate_user_last_admin():
         with pytest.raises(ValueError,
                            match=str(Message.User.Admin.LastAdmin())):
             db_user.admin = False
+            db_session.flush()
         db_session.refresh(db_user)
         assert db_user.admin
         # teardown
@@ -1377,6 +1743,7 @@ def test_validate_product_responsible_last_product():
         db_session.refresh(db_user)
         assert db_user.req_inv
         db_prod.responsible = db_session.get(User, product["responsible_id"])
+        db_session.flush()
         db_session.refresh(db_user)
         assert not db_user.req_inv
         # teardown
@@ -1427,6 +1794,7 @@ def _test_failed_product_edit_with_ids(
             db_prod.responsible_id = responsible_id
             db_prod.category_id = category_id
             db_prod.supplier_id = supplier_id
+            db_session.flush()
         db_session.rollback()
         assert db_prod.responsible_id == product["responsible_id"]
         assert db_prod.category_id == product["category_id"]
@@ -1707,3 +2075,509 @@ def test_failed_schedule_creation_invalid_update_interval(update_interval):
     )
 # endregion
 # endregion
+
+
+# region: unique constraint checks
+@pytest.mark.parametrize(("model", "test_elements", "message"), [
+    pytest.param(Category, test_categories, Message.Category.Name.Exists,
+                 id="Categories"),
+    pytest.param(Supplier, test_suppliers, Message.Supplier.Name.Exists,
+                 id="Suppliers"),
+])
+def test_unique_by_constraint(model, test_elements, message):
+    """Test bulk creation with uniqueness left to the unique constraints."""
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        # existing name
+        with pytest.raises(ValueError,
+                           match=re.escape(str(
+                               message(test_elements[0]["name"])))):
+            with dbSession() as db_session, unique_by_constraint(db_session):
+                elements = [model(name=f"New name {ind}")
+                            for ind in range(3)]
+                elements.append(model(name=test_elements[0]["name"]))
+                assert not statements
+                db_session.add_all(elements)
+                db_session.commit()
+        # duplicate in the same batch
+        with pytest.raises(ValueError,
+                           match=re.escape(str(message("New name")))):
+            with dbSession() as db_session, unique_by_constraint(db_session):
+                db_session.add_all(
+                    [model(name="New name"), model(name="New name")])
+                db_session.commit()
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    with dbSession() as db_session:
+        assert not db_session.scalar(
+            select(model).filter(model.name.like("New name%")))
+    # immediate validation outside the block
+    with pytest.raises(ValueError):
+        model(name=test_elements[0]["name"])
+
+
+def test_unique_by_constraint_schedule():
+    """Test duplicate name-elem_id combination with unique constraints."""
+    with pytest.raises(ValueError,
+                       match="Name-Elem_id combination must be unique"):
+        with dbSession() as db_session, unique_by_constraint(db_session):
+            db_session.add(
+                Schedule(
+                    name=test_schedules[0]["name"],
+                    type=test_schedules[0]["type"],
+                    elem_id=1,
+                    next_date=ValidSchedule.next_date,
+                    update_date=ValidSchedule.update_date,
+                    update_interval=ValidSchedule.update_interval))
+            db_session.commit()
+# endregion
+
+
+# region: bulk products changes
+def _bulk_products(db_session: Session, responsible: User,
+                   category: Category) -> list[Product]:
+    """Add 3 products of `responsible` in `category`."""
+    products = [
+        Product(name=f"{ValidProduct.name}_{ind}",
+                description=ValidProduct.description,
+                responsible=responsible,
+                category=category,
+                supplier=db_session.get(Supplier, ValidProduct.supplier_id),
+                meas_unit=ValidProduct.meas_unit,
+                min_stock=ValidProduct.min_stock,
+                ord_qty=ValidProduct.ord_qty)
+        for ind in range(3)]
+    db_session.add_all(products)
+    db_session.commit()
+    return products
+
+
+def test_reassign_responsible():
+    """Products are reassigned with one UPDATE and the previous responsible
+    left without products is released from the inventory check."""
+    new_resp_id = ValidProduct.responsible_id
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    with dbSession() as db_session:
+        user = User(name=ValidUser.name, password=ValidUser.password,
+                    reg_req=False)
+        cat = Category(name=ValidCategory.name)
+        db_session.add_all([user, cat])
+        db_session.commit()
+        products = _bulk_products(db_session, user, cat)
+        user.done_inv = False
+        db_session.commit()
+        user_id, cat_id = user.id, cat.id
+        event.listen(bind, "before_cursor_execute", count_statements)
+        try:
+            assert reassign_responsible(
+                db_session, new_resp_id, Product.category_id == cat_id) == 3
+            assert user.done_inv and not user.req_inv
+            db_session.commit()
+        finally:
+            event.remove(bind, "before_cursor_execute", count_statements)
+        assert len([statement for statement in statements
+                    if statement.startswith("UPDATE products")]) == 1
+        # already assigned products are not counted
+        assert reassign_responsible(
+            db_session, new_resp_id, Product.category_id == cat_id) == 0
+        product_ids = [product.id for product in products]
+    with dbSession() as db_session:
+        user = db_session.get(User, user_id)
+        assert user.done_inv and not user.req_inv
+        assert all(product.responsible_id == new_resp_id
+                   for product in db_session.scalars(
+                       select(Product).filter_by(category_id=cat_id)))
+        # teardown
+        for product_id in product_ids:
+            db_session.delete(db_session.get(Product, product_id))
+        db_session.delete(user)
+        db_session.delete(db_session.get(Category, cat_id))
+        db_session.commit()
+
+
+@pytest.mark.parametrize(
+    "user_id", [0, [user["id"] for user in test_users
+                    if not user["in_use"]][0]])
+def test_failed_reassign_responsible(user_id):
+    """The new responsible must be an active user."""
+    with dbSession() as db_session:
+        with pytest.raises(ValueError):
+            reassign_responsible(
+                db_session, user_id,
+                Product.category_id == ValidProduct.category_id)
+        db_session.rollback()
+        assert all(product.responsible_id == [
+                       prod["responsible_id"] for prod in test_products
+                       if prod["name"] == product.name][0]
+                   for product in db_session.scalars(
+                       select(Product)
+                       .filter_by(category_id=ValidProduct.category_id)))
+
+
+@pytest.mark.parametrize(("model", "column"), [
+    pytest.param(Category, "category_id", id="Categories"),
+    pytest.param(Supplier, "supplier_id", id="Suppliers"),
+])
+def test_merge_into(model, column):
+    """All products are moved to the target and the source is deleted."""
+    with dbSession() as db_session:
+        source = model(name=ValidCategory.name)
+        db_session.add(source)
+        db_session.commit()
+        target_id = getattr(ValidProduct, column)
+        cat = (source if model is Category
+               else db_session.get(Category, ValidProduct.category_id))
+        products = _bulk_products(
+            db_session, db_session.get(User, ValidProduct.responsible_id), cat)
+        if model is Supplier:
+            for product in products:
+                product.supplier = source
+            db_session.commit()
+        source_id = source.id
+        product_ids = [product.id for product in products]
+        assert merge_into(db_session, model, source_id, target_id) == 3
+        db_session.commit()
+    with dbSession() as db_session:
+        assert not db_session.get(model, source_id)
+        for product_id in product_ids:
+            product = db_session.get(Product, product_id)
+            assert getattr(product, column) == target_id
+            db_session.delete(product)
+        db_session.commit()
+
+
+@pytest.mark.parametrize(("model", "message"), [
+    pytest.param(Category, Message.Category, id="Categories"),
+    pytest.param(Supplier, Message.Supplier, id="Suppliers"),
+])
+def test_failed_merge_into(model, message):
+    """Merge into itself, into a missing or a retired element."""
+    with dbSession() as db_session:
+        source_id = db_session.scalar(select(func.min(model.id)))
+        with pytest.raises(ValueError,
+                           match=re.escape(str(message.Merge.Same()))):
+            merge_into(db_session, model, source_id, source_id)
+        with pytest.raises(ValueError):
+            merge_into(db_session, model, source_id, 0)
+        db_session.rollback()
+        assert db_session.get(model, source_id)
+
+
+def test_bulk_edit_products():
+    """Retiring all the products of a user releases the inventory check."""
+    with dbSession() as db_session:
+        user = User(name=ValidUser.name, password=ValidUser.password,
+                    reg_req=False)
+        cat = Category(name=ValidCategory.name)
+        db_session.add_all([user, cat])
+        db_session.commit()
+        products = _bulk_products(db_session, user, cat)
+        user.done_inv = False
+        db_session.commit()
+        user_id, cat_id = user.id, cat.id
+        product_ids = [product.id for product in products]
+        assert bulk_edit_products(
+            db_session, product_ids,
+            {"in_use": False, "min_stock": 7, "meas_unit": " box "}) == 3
+        assert user.done_inv
+        db_session.commit()
+    with dbSession() as db_session:
+        assert db_session.get(User, user_id).done_inv
+        for product_id in product_ids:
+            product = db_session.get(Product, product_id)
+            assert (product.in_use, product.min_stock, product.meas_unit) \
+                == (False, 7, "box")
+            db_session.delete(product)
+        db_session.delete(db_session.get(User, user_id))
+        db_session.delete(db_session.get(Category, cat_id))
+        db_session.commit()
+
+
+@pytest.mark.parametrize(("product_ids", "values", "message"), [
+    pytest.param([], {"critical": True},
+                 Message.Product.BulkEdit.NoSelection(), id="no_selection"),
+    pytest.param([1], {}, Message.Product.BulkEdit.NoChanges(),
+                 id="no_changes"),
+    pytest.param([1], {"meas_unit": " "}, Message.Product.MeasUnit.Required(),
+                 id="meas_unit"),
+    pytest.param([1], {"min_stock": -1}, Message.Product.MinStock.Invalid(),
+                 id="min_stock"),
+    pytest.param([1], {"ord_qty": "1"}, Message.Product.OrdQty.Invalid(),
+                 id="ord_qty"),
+])
+def test_failed_bulk_edit_products(product_ids, values, message):
+    """Invalid selection or values."""
+    with dbSession() as db_session:
+        with pytest.raises(ValueError, match=re.escape(str(message))):
+            bulk_edit_products(db_session, product_ids, values)
+# endregion
+
+
+# region: interlocks on flush
+def test_interlocks_on_flush_reassign():
+    """Products reassigned one by one are checked once per flush with the
+    same queries whatever their number, and the previous responsible left
+    without products is released in the same transaction."""
+    new_resp_id = ValidProduct.responsible_id
+    statements = []
+    commits = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    def count_commits(conn):
+        commits.append(conn)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    with dbSession() as db_session:
+        user = User(name=ValidUser.name, password=ValidUser.password,
+                    reg_req=False)
+        cat = Category(name=ValidCategory.name)
+        db_session.add_all([user, cat])
+        db_session.commit()
+        products = _bulk_products(db_session, user, cat)
+        user.done_inv = False
+        db_session.commit()
+        user_id, cat_id = user.id, cat.id
+        product_ids = [product.id for product in products]
+        event.listen(bind, "before_cursor_execute", count_statements)
+        event.listen(bind, "commit", count_commits)
+        try:
+            for product in products:
+                product.responsible_id = new_resp_id
+            # the validators don't query
+            assert not statements
+            db_session.flush()
+            assert not commits
+        finally:
+            event.remove(bind, "before_cursor_execute", count_statements)
+            event.remove(bind, "commit", count_commits)
+        # new responsible and previous responsibles
+        assert len([statement for statement in statements
+                    if statement.startswith("SELECT")]) == 2
+        assert len([statement for statement in statements
+                    if statement.startswith("UPDATE products")]) == 1
+        assert len([statement for statement in statements
+                    if statement.startswith("UPDATE users")]) == 1
+        assert user.done_inv and not user.req_inv
+        db_session.commit()
+    with dbSession() as db_session:
+        user = db_session.get(User, user_id)
+        assert user.done_inv and not user.req_inv
+        # teardown
+        for product_id in product_ids:
+            db_session.delete(db_session.get(Product, product_id))
+        db_session.delete(user)
+        db_session.delete(db_session.get(Category, cat_id))
+        db_session.commit()
+
+
+def test_failed_interlocks_on_flush():
+    """A violation found on flush raises the validator message before
+    anything is written and the session can be used further."""
+    retired_id = [user for user in test_users if not user["in_use"]][0]["id"]
+    with dbSession() as db_session:
+        products = db_session.scalars(
+            select(Product).filter(Product.id.in_([1, 2]))).all()
+        products[0].responsible_id = ValidProduct.responsible_id
+        products[1].responsible_id = retired_id
+        with pytest.raises(ValueError,
+                           match=str(Message.User.Products.Retired())):
+            db_session.flush()
+        db_session.rollback()
+        assert [product.responsible_id for product in products] == \
+            [test_products[0]["responsible_id"],
+             test_products[1]["responsible_id"]]
+# endregion
+
+# region: bulk state transitions
+def test_start_inventory_check():
+    """Only the users with products in use start checking, with one UPDATE
+    and their inventory requests are cancelled."""
+    eligible = {product["responsible_id"] for product in test_products
+                if product["in_use"]}
+    requesting = [user["id"] for user in test_users
+                  if user["id"] in eligible and not user["admin"]][0]
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    with dbSession() as db_session:
+        db_session.get(User, requesting).req_inv = True
+        db_session.commit()
+        event.listen(bind, "before_cursor_execute", count_statements)
+        try:
+            assert start_inventory_check(db_session) == len(eligible)
+            db_session.commit()
+        finally:
+            event.remove(bind, "before_cursor_execute", count_statements)
+        assert statements == [statements[0]]
+        assert statements[0].startswith("UPDATE users")
+        # already checking users are not counted
+        assert start_inventory_check(db_session) == 0
+        db_session.rollback()
+    with dbSession() as db_session:
+        for user in test_users:
+            db_user = db_session.get(User, user["id"])
+            assert db_user.done_inv is (user["id"] not in eligible)
+            assert not db_user.req_inv
+        # teardown
+        db_session.execute(update(User).values(done_inv=True))
+        db_session.commit()
+
+
+def test_clear_order_list():
+    """All the products are removed from the order list with one UPDATE."""
+    product_ids = [product["id"] for product in test_products
+                   if product["in_use"]][:5]
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    with dbSession() as db_session:
+        for product_id in product_ids:
+            db_session.get(Product, product_id).to_order = True
+        db_session.commit()
+        event.listen(bind, "before_cursor_execute", count_statements)
+        try:
+            assert clear_order_list(db_session) == len(product_ids)
+            db_session.commit()
+        finally:
+            event.remove(bind, "before_cursor_execute", count_statements)
+        assert statements == [statements[0]]
+        assert statements[0].startswith("UPDATE products")
+        assert not db_session.scalar(
+            select(func.count(Product.id)).filter_by(to_order=True))
+        assert clear_order_list(db_session) == 0
+# endregion
+
+
+# region: products search
+def _search(db_session: Session, terms: str) -> list[str]:
+    """Names of the products matching the search `terms` (ranked)."""
+    return db_session.scalars(
+        search_products(terms, select(Product.name))).all()
+
+
+@pytest.mark.parametrize("terms, query", [
+    ("", ""),
+    ("  cleaner ", '"cleaner"*'),
+    ("kitchen clean", '"kitchen"* "clean"*'),
+    ('ki"tchen OR', '"ki"* "tchen"* "OR"*'),
+    ('"', ""),
+    ('"" - ... *', ""),
+    ("- kitchen.", '"kitchen."*'),
+    ])
+def test_search_query(terms, query):
+    """The user search text becomes quoted prefix terms."""
+    assert search_query(terms) == query
+
+
+def test_search_products():
+    """Test the products search ranking and matching."""
+    with dbSession() as db_session:
+        names = _search(db_session, "cleaner")
+        assert set(names) == {
+            prod["name"] for prod in test_products
+            if "cleaner" in prod["name"].lower()
+            or "cleaner" in prod["description"].lower()}
+        # name matches rank first
+        assert names.index("BathroomCleaner") > names.index("Glass cleaner")
+        assert _search(db_session, "kitch clean")[0] == "Kitchen cleaner"
+        # category and supplier names, case and diacritics insensitive
+        assert "Cat food" in _search(db_session, "PÉT")
+        assert "Bread" in _search(db_session, "groceries")
+        assert "Cat food" in _search(db_session, '"cat')
+        assert _search(db_session, "no such product") == []
+        # no words: no search
+        for terms in ('"', '"" - ...'):
+            assert len(_search(db_session, terms)) == len(test_products)
+        plan = db_session.execute(text(
+            "EXPLAIN QUERY PLAN " + str(search_products(
+                "cat", select(Product.name)).compile(
+                    compile_kwargs={"literal_binds": True})))).all()
+        assert any("VIRTUAL TABLE INDEX" in row[-1] for row in plan)
+
+
+def test_search_products_sync():
+    """The search index follows the products, categories and suppliers
+    changes."""
+    with dbSession() as db_session:
+        product = db_session.get(Product, 1)
+        product.name = "Soft tissue"
+        product.description = "Soft tissue"
+        db_session.flush()
+        assert "Soft tissue" in _search(db_session, "soft")
+        assert "Soft tissue" not in _search(db_session, "toilet")
+        product.category_id = 2
+        db_session.flush()
+        assert "Soft tissue" in _search(db_session, "personal")
+        db_session.get(Supplier, 3).name = "Local market"
+        db_session.flush()
+        assert "Soft tissue" in _search(db_session, "local market")
+        db_session.delete(db_session.get(Product, 2))
+        db_session.flush()
+        assert "Paper towels" not in _search(db_session, "towels")
+        db_session.rollback()
+        assert "Toilet paper" in _search(db_session, "toilet")
+        assert "Paper towels" in _search(db_session, "towels")
+
+
+def test_migrate_search():
+    """Test the search index creation of an existing database and the search
+    before it."""
+    test_engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        test_engine,
+        tables=[table for table in Base.metadata.sorted_tables
+                if table not in {Product.__table__, Stat.__table__}])
+    # created on its own: without the search index and triggers
+    Product.__table__.create(test_engine)
+    with test_engine.begin() as connection:
+        connection.execute(
+            insert(Category).values(id=1, name="Fruits", in_use=True))
+        connection.execute(
+            insert(Supplier).values(id=1, name="Market", in_use=True))
+        connection.execute(insert(User).values(
+            id=1, name="user", password="password", in_use=True))
+        connection.execute(insert(Product).values(
+            id=1, name="Apples", description="Red apples", responsible_id=1,
+            category_id=1, supplier_id=1, meas_unit="kg", min_stock=1,
+            ord_qty=1))
+    with Session(test_engine) as db_session:
+        # unranked search without the search index
+        for terms, names in (("fruit", ["Apples"]), ("red market", ["Apples"]),
+                             ("apples%", []), ("pears", [])):
+            assert db_session.scalars(search_products(
+                terms, select(Product.name), test_engine)).all() == names
+    assert migrate_search(test_engine)
+    assert not migrate_search(test_engine)
+    with Session(test_engine) as db_session:
+        assert _search(db_session, "fruit") == ["Apples"]
+# endregion
+
+
+# region: database init
+def test_migrate_columns():
+    """Test adding the missing columns of an existing database."""
+    test_engine = create_engine("sqlite://")
+    Base.metadata.create_all(test_engine)
+    with test_engine.begin() as connection:
+        connection.execute(insert(User).values(
+            id=1, name="user", password="password", in_use=True))
+        # previous schema: users without the feed version
+        connection.execute(text("ALTER TABLE users DROP COLUMN feed_version"))
+    assert migrate_columns(test_engine)
+    assert not migrate_columns(test_engine)
+    with Session(test_engine) as db_session:
+        assert db_session.get(User, 1).feed_version == 0
+# endregion
@@ -8,11 +8,11 @@ from flask import g, session, url_for
 from flask.testing import FlaskClient
 from hypothesis import example, given
 from hypothesis import strategies as st
-from sqlalchemy import select
+from sqlalchemy import event, select, update
 
 from database import Product, User, dbSession
 from messages import Message
-from tests import redirected_to, test_products, test_users
+from tests import exported_rows, redirected_to, test_products, test_users
 
 pytestmark = pytest.mark.inv
 
@@ -246,6 +246,178 @@ def test_failed_send_inventory_no_check_inventory(
         assert db_session.get(User, user_logged_in.id).done_inv
         for product in users_products[::2]:
             assert not db_session.get(Product, product["id"]).to_order
+
+
+def test_send_inventory_changes(client: FlaskClient, user_logged_in: User):
+    """Send only the changed products, applied with one UPDATE."""
+    users_products = [product for product in test_products
+                      if product["responsible_id"] == user_logged_in.id
+                      and product["in_use"]]
+    ordered, to_order = users_products[0], users_products[1:3]
+    not_user_product = [product for product in test_products
+                        if product["responsible_id"] != user_logged_in.id][0]
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    with dbSession() as db_session:
+        db_session.get(Product, ordered["id"]).to_order = True
+        db_session.get(User, user_logged_in.id).done_inv = False
+        db_session.commit()
+    try:
+        with client:
+            client.get("/")
+            response = client.get(url_for("inv.inventory"))
+            assert "inventory_changes.js" in response.text
+            data = {
+                "csrf_token": g.csrf_token,
+                "delta": "1",
+                "changed": [f"{ordered['id']}:0",
+                            f"{not_user_product['id']}:1"] +
+                           [f"{product['id']}:1" for product in to_order],
+            }
+            event.listen(bind, "before_cursor_execute", count_statements)
+            try:
+                response = client.post(
+                    url_for("inv.inventory"), data=data,
+                    follow_redirects=True)
+            finally:
+                event.remove(bind, "before_cursor_execute", count_statements)
+            assert redirected_to(url_for("main.index"), response)
+            assert str(Message.UI.Inv.Submitted()) in response.text
+        products_updates = [statement for statement in statements
+                            if statement.startswith("UPDATE products")]
+        assert len(products_updates) == 1
+        assert "CASE" in products_updates[0]
+        with dbSession() as db_session:
+            assert db_session.get(User, user_logged_in.id).done_inv
+            assert not db_session.get(Product, not_user_product["id"]).to_order
+            for product in users_products:
+                assert db_session.get(Product, product["id"]).to_order \
+                    is (product in to_order)
+    finally:
+        with dbSession() as db_session:
+            db_session.execute(update(Product).values(to_order=False))
+            user = db_session.get(User, user_logged_in.id)
+            user.done_inv = True
+            db_session.commit()
+
+
+def test_send_inventory_no_changes(client: FlaskClient, user_logged_in: User):
+    """Sending an unchanged inventory updates only the user."""
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    with dbSession() as db_session:
+        db_session.get(User, user_logged_in.id).done_inv = False
+        db_session.commit()
+    with client:
+        client.get("/")
+        client.get(url_for("inv.inventory"))
+        event.listen(bind, "before_cursor_execute", count_statements)
+        try:
+            response = client.post(
+                url_for("inv.inventory"),
+                data={"csrf_token": g.csrf_token},
+                follow_redirects=True)
+        finally:
+            event.remove(bind, "before_cursor_execute", count_statements)
+        assert str(Message.UI.Inv.Submitted()) in response.text
+    assert not [statement for statement in statements
+                if statement.startswith("UPDATE products")]
+    with dbSession() as db_session:
+        assert db_session.get(User, user_logged_in.id).done_inv
+
+
+def test_send_inventory_search(client: FlaskClient, user_logged_in: User):
+    """Search the inventory page; submitting the searched page compares
+    only the listed products and doesn't end the inventory check."""
+    users_products = {product["name"]: product["id"]
+                      for product in test_products
+                      if product["responsible_id"] == user_logged_in.id
+                      and product["in_use"]}
+    drawing = [name for name in users_products if "Drawing" in name]
+    assert drawing and len(drawing) < len(users_products)
+    not_listed = [name for name in users_products if name not in drawing][0]
+    with dbSession() as db_session:
+        db_session.get(Product, users_products[not_listed]).to_order = True
+        db_session.get(User, user_logged_in.id).done_inv = False
+        db_session.commit()
+    try:
+        with client:
+            client.get("/")
+            response = client.get(
+                url_for("inv.inventory", search="drawing"))
+            assert response.status_code == 200
+            assert str(Message.UI.Captions.SearchResults()) in response.text
+            assert str(Message.UI.Captions.InvSearch()) in response.text
+            assert "Submit inventory" not in response.text
+            for name in users_products:
+                assert (name in response.text) is (name in drawing)
+            assert session["last_url"] == url_for(
+                "inv.inventory", search="drawing")
+            # a search without words lists all the products
+            for search in ('"', '"" - ...'):
+                response = client.get(url_for("inv.inventory", search=search))
+                assert response.status_code == 200
+                assert str(Message.UI.Captions.SearchResults()) \
+                    not in response.text
+                for name in users_products:
+                    assert name in response.text
+            response = client.post(
+                url_for("inv.inventory", search="drawing"),
+                data={"csrf_token": g.csrf_token,
+                      str(users_products[drawing[0]]): "on"},
+                follow_redirects=True)
+            assert redirected_to(url_for("inv.inventory"), response)
+            assert str(Message.UI.Inv.Saved()) in response.text
+            assert str(Message.UI.Inv.Submitted()) not in response.text
+        with dbSession() as db_session:
+            for name, product_id in users_products.items():
+                assert db_session.get(Product, product_id).to_order \
+                    is (name in {drawing[0], not_listed})
+            assert not db_session.get(User, user_logged_in.id).done_inv
+    finally:
+        with dbSession() as db_session:
+            db_session.execute(update(Product).values(to_order=False))
+            db_session.get(User, user_logged_in.id).done_inv = True
+            db_session.commit()
+
+
+@pytest.mark.parametrize("changed", [
+    pytest.param(["1"], id="no_state"),
+    pytest.param(["1:yes"], id="bad_state"),
+    pytest.param(["one:1"], id="bad_id"),
+])
+def test_failed_send_inventory_changes(
+        client: FlaskClient, user_logged_in: User, changed):
+    """Invalid changes are rejected and nothing is saved."""
+    with dbSession() as db_session:
+        db_session.get(User, user_logged_in.id).done_inv = False
+        db_session.commit()
+    try:
+        with client:
+            client.get("/")
+            client.get(url_for("inv.inventory"))
+            response = client.post(
+                url_for("inv.inventory"),
+                data={"csrf_token": g.csrf_token,
+                      "delta": "1",
+                      "changed": changed},
+                follow_redirects=True)
+            assert redirected_to(url_for("inv.inventory"), response)
+            assert str(Message.UI.Inv.Invalid()) in response.text
+        with dbSession() as db_session:
+            assert not db_session.get(User, user_logged_in.id).done_inv
+            assert not db_session.scalar(
+                select(Product.id).filter_by(to_order=True))
+    finally:
+        with dbSession() as db_session:
+            db_session.get(User, user_logged_in.id).done_inv = True
+            db_session.commit()
 # endregion
 
 
@@ -491,3 +663,118 @@ def test_inventory_request_user_logged_in_yes_check_inventory(
         db_session.get(User, user["id"]).done_inv = True
         db_session.commit()
 # endregion
+
+
+# region: exports
+def _inventory_codes(user_id: int) -> list[str]:
+    """Codes of a user's inventory list, in the inventory page order."""
+    return [prod["name"] for prod in sorted(
+        (prod for prod in test_products
+         if prod["responsible_id"] == user_id and prod["in_use"]),
+        key=lambda prod: (prod["category_id"], prod["name"]))]
+
+
+@pytest.mark.parametrize("file_format", ["csv", "xlsx"])
+def test_export_inventory(
+        client: FlaskClient, user_logged_in: User, file_format):
+    """Download the current user inventory list"""
+    with client:
+        client.get("/")
+        response = client.get(url_for("inv.inventory"))
+        assert url_for("inv.export_inventory", file_format=file_format) \
+            in response.text
+        response = client.get(url_for("inv.export_inventory",
+                                      file_format=file_format))
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == \
+        f'attachment; filename="inventory.{file_format}"; ' \
+        f"filename*=UTF-8''inventory.{file_format}"
+    rows = exported_rows(response)
+    assert rows[0][:2] == ["Category", "Code"]
+    assert [row[1] for row in rows[1:]] == _inventory_codes(user_logged_in.id)
+
+
+@pytest.mark.parametrize("file_format", ["csv", "xlsx"])
+def test_export_inventory_other_user(
+        client: FlaskClient, admin_logged_in: User, file_format):
+    """Download the inventory list of another user"""
+    # pylint: disable=unused-argument
+    user = [user for user in test_users
+            if user["has_products"] and not user["admin"]][0]
+    with client:
+        client.get("/")
+        response = client.get(
+            url_for("inv.inventory_user", username=user["name"]))
+        assert url_for("inv.export_inventory_user",
+                       username=user["name"],
+                       file_format=file_format) in response.text
+        response = client.get(url_for("inv.export_inventory_user",
+                                      username=user["name"],
+                                      file_format=file_format))
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == \
+        f'attachment; filename="inventory_{user["name"]}.{file_format}"; ' \
+        f"filename*=UTF-8''inventory_{user['name']}.{file_format}"
+    assert [row[1] for row in exported_rows(response)[1:]] == \
+        _inventory_codes(user["id"])
+
+
+def test_export_inventory_other_user_file_name(
+        client: FlaskClient, admin_logged_in: User):
+    """Download the inventory list of a user with a name that is not a
+    plain header token"""
+    # pylint: disable=unused-argument
+    user = [user for user in test_users
+            if user["has_products"] and not user["admin"]][0]
+    name = "Ana Maria; ș漢"
+    with dbSession() as db_session:
+        db_session.get(User, user["id"]).name = name
+        db_session.commit()
+    try:
+        with client:
+            client.get("/")
+            response = client.get(url_for("inv.export_inventory_user",
+                                          username=name,
+                                          file_format="csv"))
+        assert response.status_code == 200
+        assert response.headers["Content-Disposition"] == \
+            'attachment; filename="inventory_Ana Maria; s.csv"; ' \
+            "filename*=UTF-8''inventory_Ana%20Maria%3B%20%C8%99%E6%BC%A2.csv"
+        assert [row[1] for row in exported_rows(response)[1:]] == \
+            _inventory_codes(user["id"])
+    finally:
+        with dbSession() as db_session:
+            db_session.get(User, user["id"]).name = user["name"]
+            db_session.commit()
+
+
+def test_failed_export_inventory_other_user(
+        client: FlaskClient, user_logged_in: User):
+    """Fail to download the inventory list of another user as a user"""
+    # pylint: disable=unused-argument
+    with client:
+        client.get("/")
+        response = client.get(
+            url_for("inv.export_inventory_user",
+                    username=test_users[0]["name"],
+                    file_format="csv"),
+            follow_redirects=True)
+        assert redirected_to(url_for("auth.login"), response)
+        assert str(Message.UI.Auth.AdminReq()) in response.text
+
+
+def test_failed_export_inventory_not_existing_user(
+        client: FlaskClient, admin_logged_in: User):
+    """Fail to download the inventory list of a non existing user"""
+    # pylint: disable=unused-argument
+    with client:
+        client.get("/")
+        response = client.get(
+            url_for("inv.export_inventory_user",
+                    username="not_existing",
+                    file_format="xlsx"),
+            follow_redirects=True)
+        assert redirected_to(url_for("main.index"), response)
+        assert str(Message.User.NotExists("not_existing")) in response.text
+# endregion
+
@@ -4,18 +4,26 @@ import random
 import re
 import string
 from html import unescape
+from io import BytesIO, StringIO
+from xml.etree import ElementTree
+from zipfile import ZipFile
 
 import pytest
-from flask import g, session, url_for
+from flask import Response, g, session, url_for
 from flask.testing import FlaskClient
 from hypothesis import assume, example, given
 from hypothesis import strategies as st
-from sqlalchemy import select
+from itsdangerous import URLSafeSerializer
+from markupsafe import escape
+from sqlalchemy import delete, event, func, select, update
 
+from app import app
 from constants import Constant
-from database import Category, Product, Supplier, User, dbSession
+from database import (Category, Product, ProductsImport, Supplier, User,
+                      dbSession)
+from helpers import EXPORT_MIMETYPES, csv_stream, xlsx_stream
 from messages import Message
-from tests import (InvalidProduct, ValidProduct, redirected_to,
+from tests import (InvalidProduct, ValidProduct, exported_rows, redirected_to,
                    test_categories, test_products, test_suppliers, test_users)
 
 pytestmark = pytest.mark.prod
@@ -76,24 +84,25 @@ def test_products_page_admin_logged_in(
         disabled_product = re.compile(
             r'<span.*text-decoration-line-through.*<a.*href=".*</a>', re.S)
         assert disabled_product.search(response.text)
-        # users
+        # users (the filters list all of them)
+        table = response.text[response.text.index("<tbody>"):]
         for user in test_users:
             if user["has_products"]:
-                assert user["name"] in response.text
+                assert user["name"] in table
             else:
-                assert user["name"] not in response.text
+                assert user["name"] not in table
         # categories
         for cat in test_categories:
             if cat["has_products"]:
-                assert cat["name"] in response.text
+                assert cat["name"] in table
             else:
-                assert cat["name"] not in response.text
+                assert cat["name"] not in table
         # suppliers
         for sup in test_suppliers:
             if sup["has_products"]:
-                assert sup["name"] in response.text
+                assert sup["name"] in table
             else:
-                assert sup["name"] not in response.text
+                assert sup["name"] not in table
         # add a product
         with dbSession() as db_session:
             new_product = Product(
@@ -158,6 +167,285 @@ def test_products_page_admin_logged_in(
         assert redirected_to(url_for("prod.products", ordered_by="code"),
                              response)
         assert str(Message.Product.NoSort("not_existing")) in response.text
+
+
+def _listed_products(text: str) -> list[str]:
+    """Names of the products listed on a products page."""
+    return [unescape(name) for name in re.findall(
+        r'href="/product/edit/[^"]*">([^<]*)</a>', text)]
+
+
+@pytest.mark.parametrize("ordered_by, sort_key", [
+    pytest.param("code", None, id="Code"),
+    pytest.param("responsible", ("responsible_id", test_users), id="Resp"),
+    pytest.param("category", ("category_id", test_categories), id="Category"),
+    pytest.param("supplier", ("supplier_id", test_suppliers), id="Supplier"),
+])
+def test_products_page_pagination(
+        client: FlaskClient, admin_logged_in: User,
+        monkeypatch: pytest.MonkeyPatch, ordered_by, sort_key):
+    """Walking the products pages lists every product once, in order"""
+    # pylint: disable=unused-argument
+    monkeypatch.setattr(Constant.Product.Listing, "page_size", 7)
+    def sorting(product: dict) -> tuple:
+        if not sort_key:
+            return (product["name"].lower(), product["id"])
+        attr, elements = sort_key
+        elem_name = [elem["name"] for elem in elements
+                     if elem["id"] == product[attr]][0]
+        return (elem_name.lower(), product["name"].lower(), product["id"])
+    expected = [product["name"]
+                for product in sorted(test_products, key=sorting)]
+    with client:
+        client.get("/")
+        url = url_for("prod.products", ordered_by=ordered_by)
+        listed = []
+        pages = 0
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200
+            page = _listed_products(response.text)
+            assert 0 < len(page) <= 7
+            listed.extend(page)
+            pages += 1
+            if pages > 1:
+                assert "First page" in response.text
+            next_link = re.search(r'href="([^"]*after=[^"]*)"', response.text)
+            url = unescape(next_link.group(1)) if next_link else None
+        assert listed == expected
+        assert pages == -(-len(test_products) // 7)
+
+
+@pytest.mark.parametrize("filters", [
+    pytest.param({"in_use": "0"}, id="Not in use"),
+    pytest.param({"in_use": "1", "critical": "1"}, id="In use critical"),
+    pytest.param({"responsible": "2"}, id="Responsible"),
+    pytest.param({"category": "1", "supplier": "3"}, id="Category supplier"),
+])
+def test_products_page_filters(
+        client: FlaskClient, admin_logged_in: User, filters):
+    """The products page lists only the filtered products"""
+    # pylint: disable=unused-argument
+    attributes = {"in_use": "in_use", "critical": "critical",
+                  "responsible": "responsible_id",
+                  "category": "category_id", "supplier": "supplier_id"}
+    expected = sorted(
+        (product["name"] for product in test_products
+         if all(str(int(product[attributes[name]])) == value
+                for name, value in filters.items())),
+        key=str.lower)
+    assert expected
+    with client:
+        client.get("/")
+        response = client.get(
+            url_for("prod.products", ordered_by="code", **filters))
+        assert response.status_code == 200
+        assert _listed_products(response.text) == expected
+        # sorting links keep the filters
+        assert unescape(url_for("prod.products", ordered_by="supplier",
+                                **filters)) in unescape(response.text)
+
+
+def test_products_page_search(client: FlaskClient, admin_logged_in: User,
+                              monkeypatch: pytest.MonkeyPatch):
+    """The products page lists the matching products ranked by relevance"""
+    # pylint: disable=unused-argument
+    monkeypatch.setattr(Constant.Product.Listing, "page_size", 3)
+    with client:
+        client.get("/")
+        response = client.get(url_for(
+            "prod.products", ordered_by="supplier", search=" Cleaner "))
+        assert response.status_code == 200
+        assert str(Message.UI.Captions.SearchResults()) in response.text
+        listed = _listed_products(response.text)
+        # name matches first, limited to one page, without further pages
+        assert len(listed) == 3
+        assert all("cleaner" in name.lower() for name in listed)
+        assert "Next page" not in response.text
+        assert session["last_url"] == url_for(
+            "prod.products", ordered_by="supplier", search="Cleaner")
+        # search within the filters
+        response = client.get(url_for(
+            "prod.products", ordered_by="code", search="groceries",
+            responsible="4"))
+        assert _listed_products(response.text) == ["Cereals", "Chocolate"]
+        response = client.get(url_for(
+            "prod.products", ordered_by="code", search="no such product",
+            after="ignored-cursor"))
+        assert response.status_code == 200
+        assert _listed_products(response.text) == []
+        assert str(Message.Product.NoPage()) not in response.text
+        # a search without words lists the products as usual
+        for search in ('"', '"" - ...'):
+            response = client.get(url_for(
+                "prod.products", ordered_by="code", search=search))
+            assert response.status_code == 200
+            assert str(Message.UI.Captions.SearchResults()) \
+                not in response.text
+            assert len(_listed_products(response.text)) == 3
+            assert "Next page" in response.text
+
+
+def test_failed_products_page(client: FlaskClient, admin_logged_in: User,
+                              monkeypatch: pytest.MonkeyPatch):
+    """Invalid products page filters or cursor"""
+    # pylint: disable=unused-argument
+    monkeypatch.setattr(Constant.Product.Listing, "page_size", 7)
+    with client:
+        client.get("/")
+        response = client.get(
+            url_for("prod.products", ordered_by="code", category="999"),
+            follow_redirects=True)
+        assert redirected_to(url_for("prod.products", ordered_by="code"),
+                             response)
+        assert "Not a valid choice" in response.text
+        response = client.get(
+            url_for("prod.products", ordered_by="code",
+                    in_use="1", after="not-a-cursor"),
+            follow_redirects=True)
+        assert redirected_to(url_for("prod.products", ordered_by="code"),
+                             response)
+        assert response.request.args.to_dict() == {"in_use": "1"}
+        assert str(Message.Product.NoPage()) in response.text
+        response = client.get(
+            url_for("prod.products", ordered_by="code",
+                    search="x" * (
+                        Constant.Product.Listing.search_max_length + 1)),
+            follow_redirects=True)
+        assert redirected_to(url_for("prod.products", ordered_by="code"),
+                             response)
+        assert "Field cannot be longer than" in response.text
+        # cursor of another sorting
+        response = client.get(url_for("prod.products", ordered_by="code"))
+        cursor = re.search(r'href="[^"]*after=([^"&]*)"', response.text)
+        for ordered_by in ("responsible", "category", "supplier"):
+            response = client.get(
+                url_for("prod.products", ordered_by=ordered_by,
+                        after=unescape(cursor.group(1))),
+                follow_redirects=True)
+            assert response.status_code == 200
+            assert redirected_to(
+                url_for("prod.products", ordered_by=ordered_by), response)
+            assert str(Message.Product.NoPage()) in response.text
+        # signed cursor with the wrong number of sorting values
+        serializer = URLSafeSerializer(app.secret_key, salt="products-page")
+        for data in ({"ordered_by": "category", "after": ["a", 1]},
+                     ["a", "b", 1]):
+            response = client.get(
+                url_for("prod.products", ordered_by="category",
+                        after=serializer.dumps(data)),
+                follow_redirects=True)
+            assert redirected_to(
+                url_for("prod.products", ordered_by="category"), response)
+            assert str(Message.Product.NoPage()) in response.text
+# endregion
+
+
+# region: bulk edit products
+def _products_columns(product_ids: list[int]) -> dict[int, tuple]:
+    """Bulk editable columns of the products."""
+    with dbSession() as db_session:
+        return {row.id: tuple(row[1:]) for row in db_session.execute(
+            select(Product.id, Product.meas_unit, Product.min_stock,
+                   Product.ord_qty, Product.critical, Product.in_use)
+            .filter(Product.id.in_(product_ids)))}
+
+
+def test_bulk_edit_products(client: FlaskClient, admin_logged_in: User):
+    """The selected products are changed with one UPDATE"""
+    products = [product for product in test_products
+                if product["in_use"]][:4]
+    product_ids = [product["id"] for product in products]
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    with client:
+        client.get("/")
+        assert session["admin"]
+        response = client.get(url_for("prod.products", ordered_by="code"))
+        assert 'form="bulkEditForm" name="product_id"' in response.text
+        data = {
+            "csrf_token": g.csrf_token,
+            "product_id": [str(product_id) for product_id in product_ids],
+            "meas_unit": " box ",
+            "min_stock": "3",
+            "ord_qty": "",
+            "critical": "1",
+            "in_use": "",
+            "submit": True,
+            }
+        event.listen(bind, "before_cursor_execute", count_statements)
+        try:
+            response = client.post(url_for("prod.edit_products"),
+                                   data=data,
+                                   follow_redirects=True)
+        finally:
+            event.remove(bind, "before_cursor_execute", count_statements)
+        try:
+            assert redirected_to(url_for("prod.products", ordered_by="code"),
+                                 response)
+            assert str(Message.Product.BulkEdit.Updated(len(product_ids))) \
+                in response.text
+            assert len([statement for statement in statements
+                        if statement.startswith("UPDATE products")]) == 1
+            assert _products_columns(product_ids) == {
+                product["id"]: ("box", 3, product["ord_qty"], True, True)
+                for product in products}
+        finally:
+            with dbSession() as db_session:
+                for product in products:
+                    db_session.execute(
+                        update(Product)
+                        .filter_by(id=product["id"])
+                        .values(meas_unit=product["meas_unit"],
+                                min_stock=product["min_stock"],
+                                critical=product["critical"]))
+                db_session.commit()
+
+
+@pytest.mark.parametrize(("data", "flash_message"), [
+    pytest.param({"min_stock": "1"},
+                 str(Message.Product.BulkEdit.NoSelection()),
+                 id="no_selection"),
+    pytest.param({"product_id": "1"},
+                 str(Message.Product.BulkEdit.NoChanges()),
+                 id="no_changes"),
+    pytest.param({"product_id": "1",
+                  "min_stock": str(Constant.Product.MinStock.min_value - 1)},
+                 str(Message.Product.MinStock.Invalid()),
+                 id="min_stock"),
+    pytest.param({"product_id": "1", "ord_qty": "not_a_number"},
+                 "Not a valid integer value.",
+                 id="ord_qty"),
+    pytest.param({"product_id": ["1", "2"], "in_use": "0"},
+                 str(Message.Product.InUse.ToOrder()),
+                 id="retire_to_order"),
+])
+def test_failed_bulk_edit_products(
+        client: FlaskClient, admin_logged_in: User, data, flash_message):
+    """Nothing is changed on invalid bulk edits"""
+    # pylint: disable=unused-argument
+    before = _products_columns([1, 2])
+    with dbSession() as db_session:
+        db_session.get(Product, 2).to_order = True
+        db_session.commit()
+    try:
+        with client:
+            client.get("/")
+            client.get(url_for("prod.products", ordered_by="code"))
+            response = client.post(url_for("prod.edit_products"),
+                                   data={"csrf_token": g.csrf_token, **data},
+                                   follow_redirects=True)
+            assert redirected_to(url_for("prod.products", ordered_by="code"),
+                                 response)
+            assert flash_message in unescape(response.text)
+        assert _products_columns([1, 2]) == before
+    finally:
+        with dbSession() as db_session:
+            db_session.get(Product, 2).to_order = False
+            db_session.commit()
 # endregion
 
 
@@ -1193,3 +1481,352 @@ def test_order_page_no_csrf(client: FlaskClient, admin_logged_in: User):
         db_session.get(Product, test_products[0]["id"]).to_order = False
         db_session.commit()
 # endregion
+
+
+# region: exports
+def _cell(value) -> str:
+    """Exported text of a value."""
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
+
+@pytest.mark.parametrize("file_format", ["csv", "xlsx"])
+def test_export_products(
+        client: FlaskClient, admin_logged_in: User, file_format):
+    """Download the product catalog"""
+    # pylint: disable=unused-argument
+    names = {attr: {elem["id"]: elem["name"] for elem in elements}
+             for attr, elements in (("responsible_id", test_users),
+                                    ("category_id", test_categories),
+                                    ("supplier_id", test_suppliers))}
+    with client:
+        client.get("/")
+        response = client.get(url_for("prod.export_products",
+                                      file_format=file_format))
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers["Content-Disposition"] == \
+        f'attachment; filename="products.{file_format}"; ' \
+        f"filename*=UTF-8''products.{file_format}"
+    rows = exported_rows(response)
+    assert rows[0][0] == "Code"
+    assert len(rows) == len(test_products) + 1
+    for row, product in zip(rows[1:],
+                            sorted(test_products,
+                                   key=lambda prod: prod["name"].lower())):
+        values = [product["name"], product["description"],
+                  names["responsible_id"][product["responsible_id"]],
+                  names["category_id"][product["category_id"]],
+                  names["supplier_id"][product["supplier_id"]],
+                  product["meas_unit"], product["min_stock"],
+                  product["ord_qty"], product["to_order"],
+                  product["critical"], product["in_use"]]
+        if file_format == "csv":
+            assert row == [str(value) for value in values]
+        else:
+            assert row == [_cell(value) for value in values]
+
+
+@pytest.mark.parametrize("file_format", ["csv", "xlsx"])
+def test_export_products_to_order(
+        client: FlaskClient, admin_logged_in: User, file_format):
+    """Download the products to order grouped by supplier"""
+    # pylint: disable=unused-argument
+    suppliers = {sup["id"]: sup["name"] for sup in test_suppliers}
+    with dbSession() as db_session:
+        db_session.execute(
+            update(Product)
+            .filter(Product.id.in_((1, 2, 3, 4, 5, 6)))
+            .values(to_order=True))
+        db_session.commit()
+    try:
+        with client:
+            client.get("/")
+            response = client.get(url_for("prod.export_products_to_order",
+                                          file_format=file_format))
+        assert response.status_code == 200
+        rows = exported_rows(response)
+    finally:
+        with dbSession() as db_session:
+            db_session.execute(
+                update(Product)
+                .filter(Product.id.in_((1, 2, 3, 4, 5, 6)))
+                .values(to_order=False))
+            db_session.commit()
+    expected = sorted(
+        ((suppliers[prod["supplier_id"]], prod["name"])
+         for prod in test_products if prod["id"] in (1, 2, 3, 4, 5, 6)),
+        key=lambda item: (item[0].lower(), item[1].lower()))
+    assert [tuple(row[:2]) for row in rows[1:]] == expected
+    assert rows[0][:2] == ["Supplier", "Code"]
+
+
+def test_export_products_user_logged_in(
+        client: FlaskClient, user_logged_in: User):
+    """The product exports require an admin"""
+    # pylint: disable=unused-argument
+    with client:
+        client.get("/")
+        for endpoint in ("prod.export_products",
+                         "prod.export_products_to_order"):
+            response = client.get(url_for(endpoint, file_format="csv"),
+                                  follow_redirects=True)
+            assert redirected_to(url_for("auth.login"), response)
+        response = client.get("/product/export/products.pdf")
+        assert response.status_code == 404
+
+
+@pytest.mark.parametrize("writer", [
+    pytest.param(lambda rows: csv_stream(["a", "b"], rows), id="CSV"),
+    pytest.param(lambda rows: xlsx_stream("sheet", ["a", "b"], rows),
+                 id="XLSX"),
+])
+def test_export_streams(writer):
+    """The exports start before the rows are read and read them lazily"""
+    consumed = []
+    def rows():
+        for number in range(100_000):
+            consumed.append(number)
+            yield [number, f"name <{number}>"]
+    chunks = writer(rows())
+    assert next(chunks)
+    assert len(consumed) <= 100
+    size = len(next(chunks))
+    assert len(consumed) < 100_000
+    for chunk in chunks:
+        size += len(chunk)
+    assert len(consumed) == 100_000
+    assert size > 0
+
+
+@pytest.mark.parametrize("file_format", ["csv", "xlsx"])
+def test_export_formulas(file_format):
+    """Text cells read as formulas by spreadsheet apps are quoted"""
+    rows = [["=1+1", "+1", "-1", "@SUM(A1)", "a=b", -1, 1.5, None]]
+    header = ["=Code", "Description", "", "", "", "", "", ""]
+    if file_format == "csv":
+        stream = csv_stream(header, rows)
+    else:
+        stream = xlsx_stream("sheet", header, rows)
+    exported = exported_rows(Response(b"".join(stream),
+                                      mimetype=EXPORT_MIMETYPES[file_format]))
+    assert exported[0][0] == "'=Code"
+    assert exported[1][:7] == ["'=1+1", "'+1", "'-1", "'@SUM(A1)", "a=b",
+                               "-1", "1.5"]
+
+
+@pytest.mark.parametrize("sheet, name", [
+    ("Products: 2024/01 [draft]?*\\", "Products 202401 draft"),
+    ("x" * 40, "x" * 31),
+    ("[]", "Sheet1"),
+])
+def test_export_sheet_name(sheet, name):
+    """The worksheet name is stripped of the characters not allowed and
+    cut to 31 characters"""
+    with ZipFile(BytesIO(b"".join(xlsx_stream(sheet, ["a"], [])))) as archive:
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    assert [elem.get("name") for elem in workbook.iter()
+            if elem.tag.endswith("}sheet")] == [name]
+# endregion
+
+
+# region: import products
+IMPORT_HEADER = ("Code,Description,Responsible,Category,Supplier,"
+                 "Measuring unit,Minimum stock,Order quantity,Critical product")
+
+
+def _import_file(products: int, start: int = 0) -> str:
+    """CSV import file of valid products."""
+    lines = [IMPORT_HEADER]
+    for number in range(start, start + products):
+        lines.append(f"Imp{number:05},Imported product {number},user1,"
+                     f"Household,Amazon,pc,{number % 10},1,"
+                     f"{'yes' if number % 7 == 0 else ''}")
+    return "\n".join(lines) + "\n"
+
+
+def _delete_imported() -> None:
+    """Delete the imported products."""
+    with dbSession() as db_session:
+        db_session.execute(
+            delete(Product).filter(Product.name.like("Imp%")))
+        db_session.commit()
+
+
+def test_products_import_batched(monkeypatch: pytest.MonkeyPatch):
+    """A large import reads the references in bulk and inserts in batches"""
+    monkeypatch.setattr(Constant.Product.Import, "batch_size", 500)
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    products_import = ProductsImport.from_csv(StringIO(_import_file(1200)))
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        assert not list(products_import)
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    try:
+        assert products_import.inserted == 1200
+        assert not products_import.failed
+        # 3 references, 3 existing codes and 3 insert batches
+        assert len([statement for statement in statements
+                    if statement.startswith("SELECT")]) == 6
+        assert len([statement for statement in statements
+                    if statement.startswith("INSERT")]) == 3
+        with dbSession() as db_session:
+            product = db_session.scalar(
+                select(Product).filter_by(name="Imp00007"))
+            assert product.responsible.name == "user1"
+            assert product.critical
+            assert product.in_use
+            assert not product.to_order
+            assert product.min_stock == 7
+            assert db_session.scalar(
+                select(func.count(Product.id))
+                .filter(Product.name.like("Imp%"))) == 1200
+    finally:
+        _delete_imported()
+
+
+@pytest.mark.parametrize("row, message", [
+    pytest.param(",Description,user1,Household,Amazon,pc,1,1,",
+                 Message.Product.Name.Required(), id="Code required"),
+    pytest.param("Ix,Description,user1,Household,Amazon,pc,1,1,",
+                 Message.Product.Name.LenLimit(), id="Code length"),
+    pytest.param("Imp99999,,user1,Household,Amazon,pc,1,1,",
+                 Message.Product.Description.Required(), id="No description"),
+    pytest.param("Imp99999,Description,nobody,Household,Amazon,pc,1,1,",
+                 Message.User.NotExists("nobody"), id="No responsible"),
+    pytest.param("Imp99999,Description,user6,Household,Amazon,pc,1,1,",
+                 Message.User.Products.Retired(), id="Retired responsible"),
+    pytest.param("Imp99999,Description,user5,Household,Amazon,pc,1,1,",
+                 Message.User.Products.PendReg(), id="Registering responsible"),
+    pytest.param("Imp99999,Description,user1,Other category,Amazon,pc,1,1,",
+                 Message.Category.Products.Disabled(), id="Category"),
+    pytest.param("Imp99999,Description,user1,Household,Nowhere,pc,1,1,",
+                 Message.Supplier.NotExists("Nowhere"), id="Supplier"),
+    pytest.param("Imp99999,Description,user1,Household,Amazon,,1,1,",
+                 Message.Product.MeasUnit.Required(), id="Meas unit"),
+    pytest.param("Imp99999,Description,user1,Household,Amazon,pc,-1,1,",
+                 Message.Product.MinStock.Invalid(), id="Min stock"),
+    pytest.param("Imp99999,Description,user1,Household,Amazon,pc,1,x,",
+                 Message.Product.OrdQty.Invalid(), id="Order quantity"),
+    pytest.param("Imp99999,Description,user1,Household,Amazon,pc,1,1,maybe",
+                 Message.Product.Import.Critical(), id="Critical"),
+    pytest.param(f"{test_products[0]['name']},Description,user1,Household,"
+                 "Amazon,pc,1,1,",
+                 Message.Product.Name.Exists(test_products[0]["name"]),
+                 id="Existing code"),
+    pytest.param("Imp00001,Description,user1,Household,Amazon,pc,1,1,",
+                 Message.Product.Import.Duplicate("Imp00001", 3),
+                 id="Duplicate code"),
+])
+def test_failed_products_import(row, message):
+    """Rows with errors are reported and nothing is imported"""
+    products_import = ProductsImport.from_csv(
+        StringIO(_import_file(3) + row + "\n"))
+    issues = list(products_import)
+    assert [(issue.line, str(issue.message)) for issue in issues] == \
+        [(5, str(message))]
+    assert products_import.failed == 1
+    assert products_import.inserted == 0
+    with dbSession() as db_session:
+        assert not db_session.scalar(
+            select(Product).filter(Product.name.like("Imp%")))
+
+
+def test_failed_products_import_columns():
+    """A file without the required columns is rejected"""
+    with pytest.raises(ValueError,
+                       match="The file has no 'supplier, order_quantity'"):
+        ProductsImport.from_csv(StringIO(
+            "code,description,responsible,category,measuring unit,"
+            "minimum stock\n"))
+
+
+def test_products_import_cli(client: FlaskClient, tmp_path):
+    """Import products with the command line interface"""
+    file = tmp_path / "products.csv"
+    file.write_text(_import_file(5), encoding="utf-8-sig")
+    runner = client.application.test_cli_runner()
+    try:
+        result = runner.invoke(args=["import-products", str(file)])
+        assert result.exit_code == 0
+        assert str(Message.Product.Import.Imported(5)) in result.output
+        # importing again fails on every row
+        result = runner.invoke(args=["import-products", str(file)])
+        assert result.exit_code == 1
+        assert str(Message.Product.Name.Exists("Imp00000")) in result.output
+        assert str(Message.Product.Import.Failed(5)) in result.output
+    finally:
+        _delete_imported()
+    file.write_text("name,description\n")
+    result = runner.invoke(args=["import-products", str(file)])
+    assert result.exit_code == 1
+    assert "The file has no 'code" in result.output
+
+
+def test_products_import_page(client: FlaskClient, admin_logged_in: User):
+    """Import products by uploading a file"""
+    # pylint: disable=unused-argument
+    with client:
+        client.get("/")
+        response = client.get(url_for("prod.products", ordered_by="code"))
+        assert url_for("prod.import_products") in response.text
+        response = client.get(url_for("prod.import_products"))
+        assert response.status_code == 200
+        assert "multipart/form-data" in response.text
+        try:
+            response = client.post(
+                url_for("prod.import_products"),
+                data={"csrf_token": g.csrf_token,
+                      "file": (BytesIO(_import_file(4).encode("utf-8-sig")),
+                               "products.csv")})
+            assert response.status_code == 200
+            assert response.is_streamed
+            assert str(Message.Product.Import.Imported(4)) in response.text
+            response = client.post(
+                url_for("prod.import_products"),
+                data={"csrf_token": g.csrf_token,
+                      "file": (BytesIO(_import_file(2, start=3).encode()),
+                               "products.csv")})
+            assert escape(str(Message.Product.Name.Exists("Imp00003"))) \
+                in response.text
+            assert str(Message.Product.Import.Failed(1)) in response.text
+            with dbSession() as db_session:
+                assert not db_session.scalar(
+                    select(Product).filter_by(name="Imp00004"))
+        finally:
+            _delete_imported()
+
+
+@pytest.mark.parametrize("file, message", [
+    pytest.param(None, Message.Product.Import.File(), id="No file"),
+    pytest.param((BytesIO(b"code"), "products.txt"),
+                 Message.Product.Import.File(), id="Not CSV"),
+    pytest.param((BytesIO(b"\xff\xfe\x00code"), "products.csv"),
+                 Message.Product.Import.File(), id="Not UTF-8"),
+    pytest.param((BytesIO(b"code,description\n"), "products.csv"),
+                 Message.Product.Import.Columns(
+                     "responsible, category, supplier, measuring_unit, "
+                     "minimum_stock, order_quantity"),
+                 id="Missing columns"),
+])
+def test_failed_products_import_page(
+        client: FlaskClient, admin_logged_in: User, file, message):
+    """Fail to upload a products import file"""
+    # pylint: disable=unused-argument
+    with client:
+        client.get("/")
+        client.get(url_for("prod.import_products"))
+        data = {"csrf_token": g.csrf_token}
+        if file:
+            data["file"] = file
+        response = client.post(url_for("prod.import_products"), data=data)
+        assert response.status_code == 200
+        assert escape(str(message)) in response.text
+# endregion
+
@@ -2,22 +2,27 @@
 
 import re
 import string
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone
 
 import pytest
-from flask import session, url_for
+from flask import g, session, url_for
 from flask.testing import FlaskClient
 from freezegun import freeze_time
 from hypothesis import assume, example, given
 from hypothesis import strategies as st
+from itsdangerous import URLSafeSerializer
 from pytest import LogCaptureFixture
-from sqlalchemy import select
+from sqlalchemy import delete, event, insert, select
 
+from app import app
+from blueprints.sch import SCHEDULES, clean_sch_info, sat_sch_info
 from blueprints.sch.sch import (BaseSchedule, GroupSchedule, IndivSchedule,
-                                cleaning_sch, saturday_sch)
+                                Occurrence, Projection, ScheduleRegistry,
+                                cleaning_sch, feed_token, saturday_sch)
 from constants import Constant
 from database import Schedule, User, dbSession
-from tests import ValidSchedule, test_schedules, test_users
+from messages import Message
+from tests import ValidSchedule, redirected_to, test_schedules, test_users
 
 pytestmark = pytest.mark.sch
 
@@ -35,6 +40,29 @@ def test_base_schedule():
         test_sch.register()
     with pytest.raises(NotImplementedError):
         test_sch.data()
+    with pytest.raises(NotImplementedError):
+        test_sch.build_data([])
+
+
+@given(sch_day=st.integers(min_value=1, max_value=7),
+       sch_day_update=st.integers(min_value=1, max_value=7),
+       days=st.integers(min_value=0, max_value=400))
+def test_base_schedule_dates(sch_day, sch_day_update, days):
+    """Test first and update dates are the first matching weekdays"""
+    # pylint: disable=protected-access
+    start_date = date.today() + timedelta(days=days)
+    test_sch = BaseSchedule(
+        name=ValidSchedule.name,
+        sch_day=sch_day,
+        sch_day_update=sch_day_update,
+        switch_interval=ValidSchedule.switch_interval,
+        start_date=start_date)
+    first_date = test_sch._determine_first_date()
+    assert first_date.isoweekday() == sch_day
+    assert timedelta(0) <= first_date - start_date < timedelta(weeks=1)
+    update_date = test_sch._determine_update_date(first_date)
+    assert update_date.isoweekday() == sch_day_update
+    assert timedelta(0) < update_date - first_date <= timedelta(weeks=1)
 # endregion
 
 
@@ -522,137 +550,144 @@ def test_explicit_individual_schedule_creation_1(caplog: LogCaptureFixture):
         switch_interval=timedelta(weeks=1),
         start_date=date.today())
     users_ids = [4, 2, 1, 7, 3]
-    # test register in the past and order
-    indiv_schedule.register(users_ids, date(2023, 10, 9))
-    assert f"Schedule '{indiv_schedule.name}' registered" in caplog.text
-    with dbSession() as db_session:
-        schedules = db_session.scalars(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name)).all()
-    # user 4
-    schedule = schedules[0]
-    assert schedule.elem_id == 4
-    assert schedule.next_date == date(2023, 10, 9)
-    assert schedule.update_date == date(2023, 10, 16)
-    assert schedule.update_interval == 7
-    # user 2
-    schedule = schedules[1]
-    assert schedule.elem_id == 2
-    assert schedule.next_date == date(2023, 10, 16)
-    assert schedule.update_date == date(2023, 10, 23)
-    assert schedule.update_interval == 7
-    # user 1
-    schedule = schedules[2]
-    assert schedule.elem_id == 1
-    assert schedule.next_date == date(2023, 10, 23)
-    assert schedule.update_date == date(2023, 10, 30)
-    assert schedule.update_interval == 7
-    # user 7
-    schedule = schedules[3]
-    assert schedule.elem_id == 7
-    assert schedule.next_date == date(2023, 10, 30)
-    assert schedule.update_date == date(2023, 11, 6)
-    assert schedule.update_interval == 7
-    # user 3
-    schedule = schedules[4]
-    assert schedule.elem_id == 3
-    assert schedule.next_date == date(2023, 11, 6)
-    assert schedule.update_date == date(2023, 11, 13)
-    assert schedule.update_interval == 7
-    # test data
-    assert indiv_schedule.data() == [
-        ["user4", date(2023, 10, 9).strftime("%d.%m.%Y")],
-        ["user2", date(2023, 10, 16).strftime("%d.%m.%Y")],
-        ["user1", date(2023, 10, 23).strftime("%d.%m.%Y")],
-        ["user7", date(2023, 10, 30).strftime("%d.%m.%Y")],
-        ["user3", date(2023, 11, 6).strftime("%d.%m.%Y")]
-    ]
-    # add user
     user = [user for user in test_users if user["reg_req"]][0]
-    with dbSession() as db_session:
-        db_session.get(User, user["id"]).reg_req = False
-        db_session.commit()
-        indiv_schedule.add_user(user["id"])
-        schedules = db_session.scalars(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name)).all()
-    assert f"Schedule '{indiv_schedule.name}' added '{user['name']}'" \
-        in caplog.text
-    schedule = schedules[-1]
-    assert schedule.elem_id == user["id"]
-    assert schedule.next_date == date(2023, 11, 13)
-    assert schedule.update_date == date(2023, 11, 20)
-    assert schedule.update_interval == 7
-    # remove user
-    with dbSession() as db_session:
-        db_session.get(User, user["id"]).reg_req = True
-        db_session.commit()
-        indiv_schedule.remove_user(user["id"])
-        schedules = db_session.scalars(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name)).all()
-        assert not db_session.scalar(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name, elem_id=user["id"]))
-    assert (f"Schedule '{indiv_schedule.name}' " +
-            f"removed user with id '{user['id']}'") in caplog.text
-    schedule = schedules[0]
-    assert schedule.elem_id == 4
-    assert schedule.next_date == date(2023, 10, 9)
-    assert schedule.update_date == date(2023, 10, 16)
-    assert schedule.update_interval == 7
-    schedule = schedules[-1]
-    assert schedule.elem_id == 3
-    assert schedule.next_date == date(2023, 11, 6)
-    assert schedule.update_date == date(2023, 11, 13)
-    assert schedule.update_interval == 7
-    # change user position
-    assert indiv_schedule.current_order() == [4, 2, 1, 7, 3]
-    indiv_schedule.change_user_pos(7, 0)
-    assert (f"Schedule '{indiv_schedule.name}' changed " +
-            "user with id '7' position to '0'") in caplog.text
-    assert indiv_schedule.current_order() == [7, 4, 2, 1, 3]
-    with dbSession() as db_session:
-        schedules = db_session.scalars(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name)).all()
-    schedule = schedules[0]
-    assert schedule.elem_id == 7
-    assert schedule.next_date == date(2023, 10, 9)
-    assert schedule.update_date == date(2023, 10, 16)
-    schedule = schedules[2]
-    assert schedule.elem_id == 2
-    assert schedule.next_date == date(2023, 10, 23)
-    assert schedule.update_date == date(2023, 10, 30)
-    schedule = schedules[4]
-    assert schedule.elem_id == 3
-    assert schedule.next_date == date(2023, 11, 6)
-    assert schedule.update_date == date(2023, 11, 13)
-    indiv_schedule.change_user_pos(2, 4)
-    assert (f"Schedule '{indiv_schedule.name}' changed " +
-            "user with id '2' position to '4'") in caplog.text
-    assert indiv_schedule.current_order() == [7, 4, 1, 3, 2]
-    with dbSession() as db_session:
-        schedules = db_session.scalars(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name)).all()
-    schedule = schedules[0]
-    assert schedule.elem_id == 7
-    assert schedule.next_date == date(2023, 10, 9)
-    assert schedule.update_date == date(2023, 10, 16)
-    schedule = schedules[2]
-    assert schedule.elem_id == 1
-    assert schedule.next_date == date(2023, 10, 23)
-    assert schedule.update_date == date(2023, 10, 30)
-    schedule = schedules[4]
-    assert schedule.elem_id == 2
-    assert schedule.next_date == date(2023, 11, 6)
-    assert schedule.update_date == date(2023, 11, 13)
-    # teardown
-    with dbSession() as db_session:
-        for schedule in schedules:
-            db_session.delete(schedule)
-        db_session.commit()
+    try:
+        # test register in the past and order
+        indiv_schedule.register(users_ids, date(2023, 10, 9))
+        assert f"Schedule '{indiv_schedule.name}' registered" in caplog.text
+        with dbSession() as db_session:
+            schedules = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name)
+                .order_by(Schedule.next_date)).all()
+        # user 4
+        schedule = schedules[0]
+        assert schedule.elem_id == 4
+        assert schedule.next_date == date(2023, 10, 9)
+        assert schedule.update_date == date(2023, 10, 16)
+        assert schedule.update_interval == 7
+        # user 2
+        schedule = schedules[1]
+        assert schedule.elem_id == 2
+        assert schedule.next_date == date(2023, 10, 16)
+        assert schedule.update_date == date(2023, 10, 23)
+        assert schedule.update_interval == 7
+        # user 1
+        schedule = schedules[2]
+        assert schedule.elem_id == 1
+        assert schedule.next_date == date(2023, 10, 23)
+        assert schedule.update_date == date(2023, 10, 30)
+        assert schedule.update_interval == 7
+        # user 7
+        schedule = schedules[3]
+        assert schedule.elem_id == 7
+        assert schedule.next_date == date(2023, 10, 30)
+        assert schedule.update_date == date(2023, 11, 6)
+        assert schedule.update_interval == 7
+        # user 3
+        schedule = schedules[4]
+        assert schedule.elem_id == 3
+        assert schedule.next_date == date(2023, 11, 6)
+        assert schedule.update_date == date(2023, 11, 13)
+        assert schedule.update_interval == 7
+        # test data
+        assert indiv_schedule.data() == [
+            ["user4", date(2023, 10, 9).strftime("%d.%m.%Y")],
+            ["user2", date(2023, 10, 16).strftime("%d.%m.%Y")],
+            ["user1", date(2023, 10, 23).strftime("%d.%m.%Y")],
+            ["user7", date(2023, 10, 30).strftime("%d.%m.%Y")],
+            ["user3", date(2023, 11, 6).strftime("%d.%m.%Y")]
+        ]
+        # add user
+        with dbSession() as db_session:
+            db_session.get(User, user["id"]).reg_req = False
+            db_session.commit()
+            indiv_schedule.add_user(user["id"])
+            schedules = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name)
+                .order_by(Schedule.next_date)).all()
+        assert f"Schedule '{indiv_schedule.name}' added '{user['name']}'" \
+            in caplog.text
+        schedule = schedules[-1]
+        assert schedule.elem_id == user["id"]
+        assert schedule.next_date == date(2023, 11, 13)
+        assert schedule.update_date == date(2023, 11, 20)
+        assert schedule.update_interval == 7
+        # remove user
+        with dbSession() as db_session:
+            db_session.get(User, user["id"]).reg_req = True
+            db_session.commit()
+            indiv_schedule.remove_user(user["id"])
+            schedules = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name)
+                .order_by(Schedule.next_date)).all()
+            assert not db_session.scalar(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name, elem_id=user["id"]))
+        assert (f"Schedule '{indiv_schedule.name}' " +
+                f"removed user with id '{user['id']}'") in caplog.text
+        schedule = schedules[0]
+        assert schedule.elem_id == 4
+        assert schedule.next_date == date(2023, 10, 9)
+        assert schedule.update_date == date(2023, 10, 16)
+        assert schedule.update_interval == 7
+        schedule = schedules[-1]
+        assert schedule.elem_id == 3
+        assert schedule.next_date == date(2023, 11, 6)
+        assert schedule.update_date == date(2023, 11, 13)
+        assert schedule.update_interval == 7
+        # change user position
+        assert indiv_schedule.current_order() == [4, 2, 1, 7, 3]
+        indiv_schedule.change_user_pos(7, 0)
+        assert (f"Schedule '{indiv_schedule.name}' changed " +
+                "user with id '7' position to '0'") in caplog.text
+        assert indiv_schedule.current_order() == [7, 4, 2, 1, 3]
+        with dbSession() as db_session:
+            schedules = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name)
+                .order_by(Schedule.next_date)).all()
+        schedule = schedules[0]
+        assert schedule.elem_id == 7
+        assert schedule.next_date == date(2023, 10, 9)
+        assert schedule.update_date == date(2023, 10, 16)
+        schedule = schedules[2]
+        assert schedule.elem_id == 2
+        assert schedule.next_date == date(2023, 10, 23)
+        assert schedule.update_date == date(2023, 10, 30)
+        schedule = schedules[4]
+        assert schedule.elem_id == 3
+        assert schedule.next_date == date(2023, 11, 6)
+        assert schedule.update_date == date(2023, 11, 13)
+        indiv_schedule.change_user_pos(2, 4)
+        assert (f"Schedule '{indiv_schedule.name}' changed " +
+                "user with id '2' position to '4'") in caplog.text
+        assert indiv_schedule.current_order() == [7, 4, 1, 3, 2]
+        with dbSession() as db_session:
+            schedules = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name)
+                .order_by(Schedule.next_date)).all()
+        schedule = schedules[0]
+        assert schedule.elem_id == 7
+        assert schedule.next_date == date(2023, 10, 9)
+        assert schedule.update_date == date(2023, 10, 16)
+        schedule = schedules[2]
+        assert schedule.elem_id == 1
+        assert schedule.next_date == date(2023, 10, 23)
+        assert schedule.update_date == date(2023, 10, 30)
+        schedule = schedules[4]
+        assert schedule.elem_id == 2
+        assert schedule.next_date == date(2023, 11, 6)
+        assert schedule.update_date == date(2023, 11, 13)
+    finally:
+        with dbSession() as db_session:
+            db_session.execute(
+                delete(Schedule).filter_by(name=indiv_schedule.name))
+            db_session.get(User, user["id"]).reg_req = True
+            db_session.commit()
 
 
 @freeze_time("2023-10-04")
@@ -668,137 +703,144 @@ def test_explicit_individual_schedule_creation_2(caplog: LogCaptureFixture):
         switch_interval=timedelta(weeks=2),
         start_date=date.today())
     users_ids = [3, 7, 2, 4, 1]
-    # test register order
-    indiv_schedule.register(users_ids)
-    assert f"Schedule '{indiv_schedule.name}' registered" in caplog.text
-    with dbSession() as db_session:
-        schedules = db_session.scalars(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name)).all()
-    # user 3
-    schedule = schedules[0]
-    assert schedule.elem_id == 3
-    assert schedule.next_date == date(2023, 10, 9)
-    assert schedule.update_date == date(2023, 10, 14)
-    assert schedule.update_interval == 14
-    # user 7
-    schedule = schedules[1]
-    assert schedule.elem_id == 7
-    assert schedule.next_date == date(2023, 10, 23)
-    assert schedule.update_date == date(2023, 10, 28)
-    assert schedule.update_interval == 14
-    # user 2
-    schedule = schedules[2]
-    assert schedule.elem_id == 2
-    assert schedule.next_date == date(2023, 11, 6)
-    assert schedule.update_date == date(2023, 11, 11)
-    assert schedule.update_interval == 14
-    # user 4
-    schedule = schedules[3]
-    assert schedule.elem_id == 4
-    assert schedule.next_date == date(2023, 11, 20)
-    assert schedule.update_date == date(2023, 11, 25)
-    assert schedule.update_interval == 14
-    # user 1
-    schedule = schedules[4]
-    assert schedule.elem_id == 1
-    assert schedule.next_date == date(2023, 12, 4)
-    assert schedule.update_date == date(2023, 12, 9)
-    assert schedule.update_interval == 14
-    # test data
-    assert indiv_schedule.data() == [
-        ["user3", date(2023, 10, 9).strftime("%d.%m.%Y")],
-        ["user7", date(2023, 10, 23).strftime("%d.%m.%Y")],
-        ["user2", date(2023, 11, 6).strftime("%d.%m.%Y")],
-        ["user4", date(2023, 11, 20).strftime("%d.%m.%Y")],
-        ["user1", date(2023, 12, 4).strftime("%d.%m.%Y")]
-    ]
-    # add user
     user = [user for user in test_users if user["reg_req"]][0]
-    with dbSession() as db_session:
-        db_session.get(User, user["id"]).reg_req = False
-        db_session.commit()
-        indiv_schedule.add_user(user["id"])
-        schedules = db_session.scalars(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name)).all()
-    assert f"Schedule '{indiv_schedule.name}' added '{user['name']}'" \
-        in caplog.text
-    schedule = schedules[-1]
-    assert schedule.elem_id == user["id"]
-    assert schedule.next_date == date(2023, 12, 18)
-    assert schedule.update_date == date(2023, 12, 23)
-    assert schedule.update_interval == 14
-    # remove user
-    with dbSession() as db_session:
-        db_session.get(User, user["id"]).reg_req = True
-        db_session.commit()
-        indiv_schedule.remove_user(user["id"])
-        schedules = db_session.scalars(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name)).all()
-        assert not db_session.scalar(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name, elem_id=user["id"]))
-    assert (f"Schedule '{indiv_schedule.name}' " +
-            f"removed user with id '{user['id']}'") in caplog.text
-    schedule = schedules[0]
-    assert schedule.elem_id == 3
-    assert schedule.next_date == date(2023, 10, 9)
-    assert schedule.update_date == date(2023, 10, 14)
-    assert schedule.update_interval == 14
-    schedule = schedules[-1]
-    assert schedule.elem_id == 1
-    assert schedule.next_date == date(2023, 12, 4)
-    assert schedule.update_date == date(2023, 12, 9)
-    assert schedule.update_interval == 14
-    # change user position
-    assert indiv_schedule.current_order() == [3, 7, 2, 4, 1]
-    indiv_schedule.change_user_pos(7, 4)
-    assert (f"Schedule '{indiv_schedule.name}' changed " +
-            "user with id '7' position to '4'") in caplog.text
-    assert indiv_schedule.current_order() == [3, 2, 4, 1, 7]
-    with dbSession() as db_session:
-        schedules = db_session.scalars(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name)).all()
-    schedule = schedules[0]
-    assert schedule.elem_id == 3
-    assert schedule.next_date == date(2023, 10, 9)
-    assert schedule.update_date == date(2023, 10, 14)
-    schedule = schedules[2]
-    assert schedule.elem_id == 4
-    assert schedule.next_date == date(2023, 11, 6)
-    assert schedule.update_date == date(2023, 11, 11)
-    schedule = schedules[4]
-    assert schedule.elem_id == 7
-    assert schedule.next_date == date(2023, 12, 4)
-    assert schedule.update_date == date(2023, 12, 9)
-    indiv_schedule.change_user_pos(4, 1)
-    assert (f"Schedule '{indiv_schedule.name}' changed " +
-            "user with id '4' position to '1'") in caplog.text
-    assert indiv_schedule.current_order() == [3, 4, 2, 1, 7]
-    with dbSession() as db_session:
-        schedules = db_session.scalars(
-            select(Schedule)
-            .filter_by(name=indiv_schedule.name)).all()
-    schedule = schedules[0]
-    assert schedule.elem_id == 3
-    assert schedule.next_date == date(2023, 10, 9)
-    assert schedule.update_date == date(2023, 10, 14)
-    schedule = schedules[2]
-    assert schedule.elem_id == 2
-    assert schedule.next_date == date(2023, 11, 6)
-    assert schedule.update_date == date(2023, 11, 11)
-    schedule = schedules[4]
-    assert schedule.elem_id == 7
-    assert schedule.next_date == date(2023, 12, 4)
-    assert schedule.update_date == date(2023, 12, 9)
-    # teardown
-    with dbSession() as db_session:
-        for schedule in schedules:
-            db_session.delete(schedule)
-        db_session.commit()
+    try:
+        # test register order
+        indiv_schedule.register(users_ids)
+        assert f"Schedule '{indiv_schedule.name}' registered" in caplog.text
+        with dbSession() as db_session:
+            schedules = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name)
+                .order_by(Schedule.next_date)).all()
+        # user 3
+        schedule = schedules[0]
+        assert schedule.elem_id == 3
+        assert schedule.next_date == date(2023, 10, 9)
+        assert schedule.update_date == date(2023, 10, 14)
+        assert schedule.update_interval == 14
+        # user 7
+        schedule = schedules[1]
+        assert schedule.elem_id == 7
+        assert schedule.next_date == date(2023, 10, 23)
+        assert schedule.update_date == date(2023, 10, 28)
+        assert schedule.update_interval == 14
+        # user 2
+        schedule = schedules[2]
+        assert schedule.elem_id == 2
+        assert schedule.next_date == date(2023, 11, 6)
+        assert schedule.update_date == date(2023, 11, 11)
+        assert schedule.update_interval == 14
+        # user 4
+        schedule = schedules[3]
+        assert schedule.elem_id == 4
+        assert schedule.next_date == date(2023, 11, 20)
+        assert schedule.update_date == date(2023, 11, 25)
+        assert schedule.update_interval == 14
+        # user 1
+        schedule = schedules[4]
+        assert schedule.elem_id == 1
+        assert schedule.next_date == date(2023, 12, 4)
+        assert schedule.update_date == date(2023, 12, 9)
+        assert schedule.update_interval == 14
+        # test data
+        assert indiv_schedule.data() == [
+            ["user3", date(2023, 10, 9).strftime("%d.%m.%Y")],
+            ["user7", date(2023, 10, 23).strftime("%d.%m.%Y")],
+            ["user2", date(2023, 11, 6).strftime("%d.%m.%Y")],
+            ["user4", date(2023, 11, 20).strftime("%d.%m.%Y")],
+            ["user1", date(2023, 12, 4).strftime("%d.%m.%Y")]
+        ]
+        # add user
+        with dbSession() as db_session:
+            db_session.get(User, user["id"]).reg_req = False
+            db_session.commit()
+            indiv_schedule.add_user(user["id"])
+            schedules = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name)
+                .order_by(Schedule.next_date)).all()
+        assert f"Schedule '{indiv_schedule.name}' added '{user['name']}'" \
+            in caplog.text
+        schedule = schedules[-1]
+        assert schedule.elem_id == user["id"]
+        assert schedule.next_date == date(2023, 12, 18)
+        assert schedule.update_date == date(2023, 12, 23)
+        assert schedule.update_interval == 14
+        # remove user
+        with dbSession() as db_session:
+            db_session.get(User, user["id"]).reg_req = True
+            db_session.commit()
+            indiv_schedule.remove_user(user["id"])
+            schedules = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name)
+                .order_by(Schedule.next_date)).all()
+            assert not db_session.scalar(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name, elem_id=user["id"]))
+        assert (f"Schedule '{indiv_schedule.name}' " +
+                f"removed user with id '{user['id']}'") in caplog.text
+        schedule = schedules[0]
+        assert schedule.elem_id == 3
+        assert schedule.next_date == date(2023, 10, 9)
+        assert schedule.update_date == date(2023, 10, 14)
+        assert schedule.update_interval == 14
+        schedule = schedules[-1]
+        assert schedule.elem_id == 1
+        assert schedule.next_date == date(2023, 12, 4)
+        assert schedule.update_date == date(2023, 12, 9)
+        assert schedule.update_interval == 14
+        # change user position
+        assert indiv_schedule.current_order() == [3, 7, 2, 4, 1]
+        indiv_schedule.change_user_pos(7, 4)
+        assert (f"Schedule '{indiv_schedule.name}' changed " +
+                "user with id '7' position to '4'") in caplog.text
+        assert indiv_schedule.current_order() == [3, 2, 4, 1, 7]
+        with dbSession() as db_session:
+            schedules = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name)
+                .order_by(Schedule.next_date)).all()
+        schedule = schedules[0]
+        assert schedule.elem_id == 3
+        assert schedule.next_date == date(2023, 10, 9)
+        assert schedule.update_date == date(2023, 10, 14)
+        schedule = schedules[2]
+        assert schedule.elem_id == 4
+        assert schedule.next_date == date(2023, 11, 6)
+        assert schedule.update_date == date(2023, 11, 11)
+        schedule = schedules[4]
+        assert schedule.elem_id == 7
+        assert schedule.next_date == date(2023, 12, 4)
+        assert schedule.update_date == date(2023, 12, 9)
+        indiv_schedule.change_user_pos(4, 1)
+        assert (f"Schedule '{indiv_schedule.name}' changed " +
+                "user with id '4' position to '1'") in caplog.text
+        assert indiv_schedule.current_order() == [3, 4, 2, 1, 7]
+        with dbSession() as db_session:
+            schedules = db_session.scalars(
+                select(Schedule)
+                .filter_by(name=indiv_schedule.name)
+                .order_by(Schedule.next_date)).all()
+        schedule = schedules[0]
+        assert schedule.elem_id == 3
+        assert schedule.next_date == date(2023, 10, 9)
+        assert schedule.update_date == date(2023, 10, 14)
+        schedule = schedules[2]
+        assert schedule.elem_id == 2
+        assert schedule.next_date == date(2023, 11, 6)
+        assert schedule.update_date == date(2023, 11, 11)
+        schedule = schedules[4]
+        assert schedule.elem_id == 7
+        assert schedule.next_date == date(2023, 12, 4)
+        assert schedule.update_date == date(2023, 12, 9)
+    finally:
+        with dbSession() as db_session:
+            db_session.execute(
+                delete(Schedule).filter_by(name=indiv_schedule.name))
+            db_session.get(User, user["id"]).reg_req = True
+            db_session.commit()
 
 
 # region: failed schedule creation
@@ -947,6 +989,99 @@ def test_individual_schedule_unregister(caplog: LogCaptureFixture):
     assert f"Schedule '{ValidSchedule.name}' deleted" in caplog.text
 
 
+@pytest.mark.parametrize(("user_pos", "new_pos"), [
+    pytest.param(10, 13, id="Move later"),
+    pytest.param(400, 397, id="Move earlier"),
+    pytest.param(0, 499, id="First to last"),
+])
+def test_individual_schedule_reorder_in_place(user_pos, new_pos):
+    """Moving or removing a user rewrites only the rows in between"""
+    # constants
+    rows = 500
+    user_id = [user["id"] for user in test_users if user["active"]][0]
+    first_date = date.today() + timedelta(days=1)
+    indiv_schedule = IndivSchedule(
+        name="test_reorder",
+        sch_day=first_date.isoweekday(),
+        sch_day_update=(first_date + timedelta(days=1)).isoweekday(),
+        switch_interval=timedelta(weeks=1),
+        start_date=first_date)
+    order = [elem_id for elem_id in range(100, 100 + rows)
+             if elem_id != 100 + user_pos]
+    order.insert(user_pos, user_id)
+    # setup
+    with dbSession() as db_session:
+        db_session.execute(insert(Schedule), [
+            {"name": indiv_schedule.name,
+             "type": "individual",
+             "elem_id": elem_id,
+             "next_date": first_date + timedelta(weeks=pos),
+             "update_date": first_date + timedelta(weeks=pos, days=1),
+             "update_interval": 7}
+            for pos, elem_id in enumerate(order)])
+        db_session.commit()
+    changed_rows = []
+    def count_changed_rows(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        if statement.startswith(("UPDATE", "DELETE")):
+            changed_rows.append(cursor.rowcount)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    # run test
+    event.listen(bind, "after_cursor_execute", count_changed_rows)
+    try:
+        indiv_schedule.change_user_pos(user_id, new_pos)
+        assert sum(changed_rows) == abs(new_pos - user_pos) + 1
+        order.insert(new_pos, order.pop(user_pos))
+        assert indiv_schedule.current_order() == order
+        changed_rows.clear()
+        indiv_schedule.remove_user(user_id)
+        assert sum(changed_rows) == rows - new_pos
+        order.pop(new_pos)
+        assert indiv_schedule.current_order() == order
+    finally:
+        event.remove(bind, "after_cursor_execute", count_changed_rows)
+    with dbSession() as db_session:
+        schedules = db_session.scalars(
+            select(Schedule)
+            .filter_by(name=indiv_schedule.name)
+            .order_by(Schedule.next_date)).all()
+        for pos, schedule in enumerate(schedules):
+            assert schedule.next_date == first_date + timedelta(weeks=pos)
+            assert schedule.update_date == \
+                first_date + timedelta(weeks=pos, days=1)
+        # teardown
+        db_session.execute(
+            delete(Schedule).filter_by(name=indiv_schedule.name))
+        db_session.commit()
+
+
+def test_failed_individual_schedule_reorder_rollback():
+    """A failed reorder leaves the schedule unchanged"""
+    def fail_commit(db_session):
+        # pylint: disable=unused-argument
+        raise RuntimeError("Commit failed")
+    user_ids = cleaning_sch.current_order()
+    with dbSession() as db_session:
+        dates = db_session.execute(
+            select(Schedule.next_date, Schedule.update_date)
+            .filter_by(name=cleaning_sch.name)
+            .order_by(Schedule.next_date)).all()
+    event.listen(dbSession, "before_commit", fail_commit)
+    try:
+        with pytest.raises(RuntimeError):
+            cleaning_sch.change_user_pos(user_ids[0], len(user_ids) - 1)
+        with pytest.raises(RuntimeError):
+            cleaning_sch.remove_user(user_ids[0])
+    finally:
+        event.remove(dbSession, "before_commit", fail_commit)
+    assert cleaning_sch.current_order() == user_ids
+    with dbSession() as db_session:
+        assert db_session.execute(
+            select(Schedule.next_date, Schedule.update_date)
+            .filter_by(name=cleaning_sch.name)
+            .order_by(Schedule.next_date)).all() == dates
+
+
 def test_individual_schedule_update_date_in_the_past(caplog: LogCaptureFixture):
     """Test auto update schedule date on add_user, remove_user or change_pos"""
     # register a schedule in the past to force auto update
@@ -1250,10 +1385,199 @@ def test_failed_individual_schedule_change_user_position_alr_at_pos(
 # endregion
 
 
+# region: projection
+@pytest.mark.parametrize("schedule", [
+    pytest.param(saturday_sch, id="Group schedule"),
+    pytest.param(cleaning_sch, id="Individual schedule"),
+])
+@given(start_days=st.integers(min_value=-400, max_value=400),
+       span_days=st.integers(min_value=0, max_value=400))
+def test_schedule_occurrences(schedule, start_days, span_days):
+    """Projected occurrences match stepping every element by its cycle"""
+    start = date.today() + timedelta(days=start_days)
+    end = start + timedelta(days=span_days)
+    projections = schedule.projection()
+    assert len(projections) == len(schedule.projection(
+        [elem.elem_id for elem in projections]))
+    expected = []
+    for elem in projections:
+        occurrence_date = elem.next_date
+        while occurrence_date > start:
+            occurrence_date -= timedelta(days=elem.cycle)
+        while occurrence_date <= end:
+            if occurrence_date >= start:
+                expected.append(
+                    Occurrence(schedule.name, elem.elem_id, occurrence_date))
+            occurrence_date += timedelta(days=elem.cycle)
+    occurrences = list(schedule.occurrences(start, end))
+    assert [occurrence.date for occurrence in occurrences] == \
+        sorted(occurrence.date for occurrence in occurrences)
+    assert sorted(occurrences) == sorted(expected)
+
+
+def test_group_schedule_occurrences_match_data():
+    """The schedules page dates are the first projected occurrences"""
+    for group, group_data in enumerate(saturday_sch.data(), start=1):
+        start = datetime.strptime(group_data[1][0], "%d.%m.%Y").date()
+        occurrences = list(saturday_sch.occurrences(
+            start, start + timedelta(weeks=10), [group]))
+        assert [occurrence.date.strftime("%d.%m.%Y")
+                for occurrence in occurrences][:3] == group_data[1]
+# endregion
+
+
+# region: schedules registry
+def _db_only_schedules(count: int) -> list[dict]:
+    """Rows of `count` individual schedules missing from the configuration,
+    with all the active users in each."""
+    user_ids = [user["id"] for user in test_users
+                if user["active"] and not user["reg_req"]]
+    start = date.today() - timedelta(days=date.today().weekday())
+    return [{"name": f"Rotation {number}",
+             "type": "individual",
+             "elem_id": user_id,
+             "next_date": start + timedelta(weeks=pos),
+             "update_date": start + timedelta(weeks=pos, days=5),
+             "update_interval": 7}
+            for number in range(count)
+            for pos, user_id in enumerate(user_ids)]
+
+
+def test_schedule_registry():
+    """The registry holds the configured schedules"""
+    registry = ScheduleRegistry.from_config(SCHEDULES)
+    assert [entry.info for entry in registry] == list(SCHEDULES)
+    assert isinstance(registry[sat_sch_info.en_name], GroupSchedule)
+    assert registry[sat_sch_info.en_name].user_attr == \
+        sat_sch_info.user_attr
+    assert isinstance(registry[clean_sch_info.en_name], IndivSchedule)
+    with pytest.raises(ValueError, match="Invalid schedule type"):
+        registry.add(sat_sch_info._replace(type="other"))
+
+
+@pytest.mark.parametrize("extra_schedules", [0, 1, 25])
+def test_schedule_registry_page_data(extra_schedules):
+    """The schedules page data of any number of schedules is read by one
+    query and matches each schedule's own data"""
+    registry = ScheduleRegistry.from_config(SCHEDULES)
+    group_data = saturday_sch.data()
+    indiv_data = cleaning_sch.data()
+    extra_rows = _db_only_schedules(extra_schedules)
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    if extra_rows:
+        with dbSession() as db_session:
+            db_session.execute(insert(Schedule), extra_rows)
+            db_session.commit()
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        group_schedules, indiv_schedules = registry.page_data()
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+        with dbSession() as db_session:
+            db_session.execute(delete(Schedule).filter(
+                Schedule.name.like("Rotation %")))
+            db_session.commit()
+    assert len(statements) == 1
+    assert group_schedules == [[sat_sch_info.name, group_data]]
+    assert indiv_schedules[0] == [clean_sch_info.name, indiv_data]
+    assert len(indiv_schedules) == extra_schedules + 1
+    for name, data in indiv_schedules[1:]:
+        # listed without changing the shared registry
+        assert name not in registry
+        assert [row[0] for row in data] == [
+            user["name"] for user in test_users
+            if user["active"] and not user["reg_req"]]
+
+
+def test_schedule_registry_user_projections():
+    """A user's projections in all schedules are read by one query and match
+    each schedule's own projection"""
+    registry = ScheduleRegistry.from_config(SCHEDULES)
+    with dbSession() as db_session:
+        user = db_session.get(User, [user["id"] for user in test_users
+                                     if user["active"]][0])
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        projections = registry.user_projections(user)
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    assert len(statements) == 1
+    for _, schedule in registry:
+        assert projections[schedule.name] == \
+            schedule.projection([schedule.user_elem_id(user)])
+        assert projections[schedule.name]
+
+
+def test_schedule_registry_user_projections_db_only(
+        client: FlaskClient, user_logged_in: User):
+    """Individual schedules found only in the database are projected and
+    listed in the calendar feed without changing the registry"""
+    registry = ScheduleRegistry.from_config(SCHEDULES)
+    rows = _db_only_schedules(1)
+    feed_url = _feed_url(client, user_logged_in.id)
+    with dbSession() as db_session:
+        db_session.execute(insert(Schedule), rows)
+        db_session.execute(insert(Schedule), [
+            {**rows[0], "name": "Group rotation", "type": "group",
+             "elem_id": user_logged_in.id}])
+        db_session.commit()
+    try:
+        projections = registry.user_projections(user_logged_in)
+        with client:
+            response = client.get(feed_url)
+            assert response.status_code == 200
+            body = response.get_data(as_text=True)
+    finally:
+        with dbSession() as db_session:
+            db_session.execute(delete(Schedule).filter(
+                Schedule.name.in_(("Rotation 0", "Group rotation"))))
+            db_session.commit()
+    assert list(projections)[:len(SCHEDULES)] == [
+        info.en_name for info in SCHEDULES]
+    row = [row for row in rows if row["elem_id"] == user_logged_in.id][0]
+    assert projections["Rotation 0"] == [
+        Projection(user_logged_in.id, row["next_date"], 7 * len(rows))]
+    assert "Group rotation" not in projections
+    assert "Rotation 0" not in registry
+    assert "SUMMARY:Rotation 0\r\n" in body
+    assert "Group rotation" not in body
+# endregion
+
+
 # region: schedule page
 edit_user_link = re.compile(r'<a.*href="/user/edit/.*</a>')
 
 
+@pytest.mark.parametrize("schedule", [
+    pytest.param(saturday_sch, id="Group schedule"),
+    pytest.param(cleaning_sch, id="Individual schedule"),
+])
+def test_schedule_data_single_query(schedule):
+    """Schedule data is read by one query whatever the number of members"""
+    statements = []
+    def count_statements(conn, cursor, statement, *args):
+        # pylint: disable=unused-argument
+        statements.append(statement)
+    bind = dbSession.kw["bind"] # pylint: disable=no-member
+    data = schedule.data()
+    assert data
+    event.listen(bind, "before_cursor_execute", count_statements)
+    try:
+        assert schedule.data() == data
+    finally:
+        event.remove(bind, "before_cursor_execute", count_statements)
+    assert len(statements) == 1
+
+
 def test_schedule_page_user_logged_in(
         client: FlaskClient, user_logged_in: User):
     """test_schedule_page_user_logged_in"""
@@ -1412,3 +1736,133 @@ def test_schedule_page_individual_schedule_add_and_remove_user(
         assert (f"Schedule '{cleaning_sch.name}' removed user "
                 f"with id '{user['id']}'") in caplog.messages
 # endregion
+
+
+# region: calendar feed
+def _feed_url(client: FlaskClient, user_id: int) -> str:
+    """Calendar feed url of a user."""
+    with dbSession() as db_session:
+        user = db_session.get(User, user_id)
+    with client.application.test_request_context():
+        return url_for("sch.calendar_feed", token=feed_token(user))
+
+
+def test_calendar_feed(client: FlaskClient, user_logged_in: User):
+    """A user's calendar feed lists the user's schedules occurrences"""
+    feed_url = _feed_url(client, user_logged_in.id)
+    with client:
+        client.get("/")
+        response = client.get(url_for("sch.schedules"))
+        assert response.status_code == 200
+        assert feed_url in response.text
+        client.get("/auth/logout")
+        # no login needed
+        response = client.get(feed_url)
+        assert response.status_code == 200
+    assert response.mimetype == "text/calendar"
+    assert response.is_streamed
+    etag = response.get_etag()[0]
+    assert etag
+    before = datetime.now(timezone.utc).replace(microsecond=0)
+    body = response.get_data(as_text=True)
+    after = datetime.now(timezone.utc)
+    # the events are stamped with the generation time
+    stamps = set(re.findall(r"DTSTAMP:(\d{8}T\d{6}Z)\r\n", body))
+    assert len(stamps) == 1
+    assert before <= datetime.strptime(
+        stamps.pop(), "%Y%m%dT%H%M%S%z") <= after
+    assert body.startswith("BEGIN:VCALENDAR\r\n")
+    assert body.endswith("END:VCALENDAR\r\n")
+    assert body.count("BEGIN:VEVENT") == body.count("END:VEVENT") > 0
+    with dbSession() as db_session:
+        clean_date = db_session.scalar(
+            select(Schedule.next_date)
+            .filter_by(name=cleaning_sch.name, elem_id=user_logged_in.id))
+        sat_date = db_session.scalar(
+            select(Schedule.next_date)
+            .filter_by(name=saturday_sch.name,
+                       elem_id=user_logged_in.sat_group))
+    assert f"DTSTART;VALUE=DATE:{clean_date.strftime('%Y%m%d')}" in body
+    assert f"DTSTART;VALUE=DATE:{sat_date.strftime('%Y%m%d')}" in body
+    assert f"SUMMARY:{cleaning_sch.name}" in body
+    assert f"SUMMARY:{saturday_sch.name}" in body
+    # not modified
+    response = client.get(feed_url, headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 304
+    assert not response.data
+    # the etag changes with the schedule
+    user_pos = cleaning_sch.current_order().index(user_logged_in.id)
+    cleaning_sch.change_user_pos(user_logged_in.id, 0 if user_pos else 1)
+    response = client.get(feed_url, headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+    # teardown
+    cleaning_sch.change_user_pos(user_logged_in.id, user_pos)
+
+
+def test_calendar_feed_reset(client: FlaskClient, user_logged_in: User):
+    """Resetting the calendar feed revokes the previous feed url"""
+    feed_url = _feed_url(client, user_logged_in.id)
+    other_user_id = [user["id"] for user in test_users
+                     if user["active"] and user["id"] != user_logged_in.id][0]
+    other_feed_url = _feed_url(client, other_user_id)
+    try:
+        with client:
+            client.get("/")
+            client.get(url_for("sch.schedules"))
+            response = client.post(
+                url_for("sch.schedules"),
+                data={"csrf_token": g.csrf_token},
+                follow_redirects=True)
+            assert redirected_to(url_for("sch.schedules"), response)
+            assert str(Message.Schedule.FeedReset()) in response.text
+            new_feed_url = _feed_url(client, user_logged_in.id)
+            assert new_feed_url != feed_url
+            assert new_feed_url in response.text
+            assert feed_url not in response.text
+        assert client.get(feed_url).status_code == 404
+        assert client.get(new_feed_url).status_code == 200
+        # the other users' feeds still work
+        assert client.get(other_feed_url).status_code == 200
+    finally:
+        with dbSession() as db_session:
+            db_session.get(User, user_logged_in.id).feed_version = 0
+            db_session.commit()
+
+
+def test_failed_calendar_feed_reset(
+        client: FlaskClient, user_logged_in: User):
+    """The calendar feed is not reset without the csrf token"""
+    feed_url = _feed_url(client, user_logged_in.id)
+    with client:
+        client.get("/")
+        response = client.post(url_for("sch.schedules"), data={})
+        assert response.status_code == 200
+        assert str(Message.Schedule.FeedReset()) not in response.text
+    assert client.get(feed_url).status_code == 200
+
+
+def test_failed_calendar_feed(client: FlaskClient):
+    """Invalid feed tokens are not found"""
+    user_id = [user["id"] for user in test_users if user["active"]][0]
+    feed_url = _feed_url(client, user_id)
+    forged_token = URLSafeSerializer("not the secret key",
+                                     salt="schedule-feed").dumps([user_id, 0])
+    serializer = URLSafeSerializer(app.secret_key, salt="schedule-feed")
+    token = feed_url.split("/")[-1][:-4]
+    for url in (feed_url[:-5] + "x.ics",
+                feed_url.replace(token, forged_token),
+                # payloads without the feed version or with another one
+                *(feed_url.replace(token, serializer.dumps(payload))
+                  for payload in (user_id, [user_id], [user_id, 1],
+                                  [user_id, 0, 0]))):
+        response = client.get(url)
+        assert response.status_code == 404
+
+
+def test_failed_calendar_feed_retired_user(client: FlaskClient):
+    """Retired users have no calendar feed"""
+    user = [user for user in test_users if not user["in_use"]][0]
+    response = client.get(_feed_url(client, user["id"]))
+    assert response.status_code == 404
+# endregion
@@ -535,4 +535,116 @@ def test_failed_reassign_supplier_bad_name(
             follow_redirects=True)
         assert redirected_to(url_for("sup.suppliers"), response)
         assert str(Message.Supplier.NotExists(sup_name)) in response.text
+
+def test_merge_supplier(client: FlaskClient, admin_logged_in: User):
+    """All the products are moved and the supplier is deleted"""
+    with dbSession() as db_session:
+        target = db_session.get(Supplier, ValidProduct.supplier_id)
+        source = Supplier(name=ValidSupplier.name)
+        db_session.add(source)
+        db_session.commit()
+        for ind in range(3):
+            db_session.add(Product(
+                name="_".join([ValidProduct.name, str(ind)]),
+                description=ValidProduct.description,
+                responsible=db_session.get(User, ValidProduct.responsible_id),
+                category=db_session.get(Category, ValidProduct.category_id),
+                supplier=db_session.get(Supplier, source.id),
+                meas_unit=ValidProduct.meas_unit,
+                min_stock=ValidProduct.min_stock,
+                ord_qty=ValidProduct.ord_qty))
+        db_session.commit()
+        source_id = source.id
+        product_ids = db_session.scalars(
+            select(Product.id).filter_by(supplier_id=source_id)).all()
+        assert len(product_ids) == 3
+        with client:
+            client.get("/")
+            assert session["admin"]
+            response = client.get(
+                url_for("sup.reassign_supplier", supplier=source.name))
+            assert str(Message.Supplier.Merge.Default()) in response.text
+            assert target.name in response.text
+            data = {
+                "csrf_token": g.csrf_token,
+                "target_id": str(target.id),
+                "merge": True,
+                }
+            response = client.post(
+                url_for("sup.merge_supplier", supplier=source.name),
+                data=data,
+                follow_redirects=True)
+            assert redirected_to(url_for("sup.suppliers"), response)
+            assert str(Message.Supplier.Merge.Merged(
+                source.name, target.name)) \
+                in unescape(response.text)
+    # check and teardown
+    with dbSession() as db_session:
+        assert not db_session.get(Supplier, source_id)
+        for product_id in product_ids:
+            product = db_session.get(Product, product_id)
+            assert product.supplier_id == target.id
+            db_session.delete(product)
+        db_session.commit()
+
+
+@pytest.mark.parametrize(("target_id", "flash_message"), [
+    pytest.param(0, str(Message.Supplier.Merge.Invalid()), id="no_target"),
+    pytest.param(ValidProduct.supplier_id, str(Message.Supplier.Merge.Same()),
+                 id="same"),
+    pytest.param(-1, "Not a valid choice.", id="invalid_target"),
+])
+def test_failed_merge_supplier(
+        client: FlaskClient, admin_logged_in: User,
+        target_id: int, flash_message: str):
+    """test_failed_merge_supplier"""
+    with dbSession() as db_session:
+        supplier = db_session.get(Supplier, ValidProduct.supplier_id)
+        products = db_session.scalars(
+            select(Product.id).filter_by(supplier_id=supplier.id)).all()
+    with client:
+        client.get("/")
+        assert session["user_name"] == admin_logged_in.name
+        assert session["admin"]
+        client.get(url_for("sup.reassign_supplier", supplier=supplier.name))
+        data = {
+            "csrf_token": g.csrf_token,
+            "target_id": str(target_id),
+            "merge": True,
+            }
+        response = client.post(
+            url_for("sup.merge_supplier", supplier=supplier.name),
+            data=data,
+            follow_redirects=True)
+        assert redirected_to(
+            url_for("sup.reassign_supplier", supplier=supplier.name),
+            response)
+        assert flash_message in unescape(response.text)
+    with dbSession() as db_session:
+        assert db_session.get(Supplier, supplier.id)
+        assert db_session.scalars(
+            select(Product.id).filter_by(supplier_id=supplier.id)).all() \
+            == products
+
+
+def test_failed_merge_supplier_bad_name(
+        client: FlaskClient, admin_logged_in: User):
+    """test_failed_merge_supplier_bad_name"""
+    supplier_name = "not_existing_supplier"
+    with client:
+        client.get("/")
+        assert session["user_name"] == admin_logged_in.name
+        client.get(url_for("sup.reassign_supplier",
+                           supplier=test_suppliers[0]["name"]))
+        data = {
+            "csrf_token": g.csrf_token,
+            "target_id": str(ValidProduct.supplier_id),
+            "merge": True,
+            }
+        response = client.post(
+            url_for("sup.merge_supplier", supplier=supplier_name),
+            data=data,
+            follow_redirects=True)
+        assert redirected_to(url_for("sup.suppliers"), response)
+        assert str(Message.Supplier.NotExists(supplier_name)) in response.text
 # endregion